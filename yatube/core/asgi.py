@@ -0,0 +1,251 @@
+"""ASGI-адаптер для Django 2.2 и асинхронные виды поверх потоков.
+
+Django 2.2 не умеет ни ASGI, ни async-видов, а asgiref в зависимостях
+нет, поэтому здесь минимальная замена того и другого.
+
+ASGIHandler — приложение ASGI 3. Событийный цикл сервера только
+принимает запросы и отдаёт ответы, а сам Django (middleware, вид,
+шаблоны) выполняется в пуле из ASGI_THREADS потоков: медленный запрос
+занимает поток пула, а не процесс сервера, и запросов в работе не
+больше размера пула, сколько бы соединений ни было открыто. Потоковые
+ответы (SSE, файлы) читаются по кусочку в отдельном пуле
+ASGI_STREAM_THREADS, чтобы долгие потоки не забирали потоки у страниц.
+
+sync_to_async переносит синхронный вызов, обычно работу с ORM, в пул из
+ASYNC_THREADS потоков, так что async-вид может ждать несколько запросов
+к базе одновременно через asyncio.gather. У каждого потока пула своё
+соединение с базой, поэтому соединений не больше размера пула. Внутри
+транзакции (atomic) вызов выполняется на месте: в другом соединении её
+данные не видны. ASYNC_THREADS = 0 отключает пул совсем.
+
+async_view превращает корутину в обычный вид: она выполняется в
+событийном цикле текущего потока, свой цикл у каждого потока
+обработчика. Такой вид работает одинаково под WSGI и под ASGIHandler, а
+декораторы Django (login_required и другие) оборачивают его как
+обычно.
+"""
+import asyncio
+import functools
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import close_old_connections, connection
+
+from . import metrics
+
+_local = threading.local()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                settings.ASYNC_THREADS, thread_name_prefix='async')
+        return _executor
+
+
+def _call(sample, func, args, kwargs):
+    # Потоки пула не получают request_started и request_finished, поэтому
+    # сломанные и устаревшие (CONN_MAX_AGE) соединения закрываем сами, как
+    # их обработчики: иначе такое соединение достанется следующему вызову.
+    close_old_connections()
+    try:
+        if sample is None:
+            return func(*args, **kwargs)
+        with metrics.recording(sample):
+            return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+def sync_to_async(func):
+    """Асинхронная обёртка синхронной функции, выполняемой в пуле."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not settings.ASYNC_THREADS or connection.in_atomic_block:
+            return func(*args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(
+            _pool(), _call, metrics.current_sample(), func, args, kwargs)
+    return wrapper
+
+
+def _loop():
+    loop = getattr(_local, 'loop', None)
+    if loop is None:
+        loop = _local.loop = asyncio.new_event_loop()
+    return loop
+
+
+def async_view(view):
+    """Обычный вид из корутины: её выполняет цикл текущего потока."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return _loop().run_until_complete(view(request, *args, **kwargs))
+    return wrapper
+
+
+def _environ(scope, body, length):
+    """WSGI-окружение по scope ASGI."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # PEP 3333: путь — байты UTF-8, прочитанные как latin-1.
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1] or 80),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(length),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        # По этому ключу виды узнают, что запрос пришёл через ASGI.
+        'asgi.version': scope.get('asgi', {}).get('version', '3.0'),
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin-1')
+        if name in environ and name != 'CONTENT_LENGTH':
+            value = f'{environ[name]},{value}'
+        environ[name] = value
+    return environ
+
+
+class ASGIHandler:
+    """Приложение ASGI 3, выполняющее Django в пуле потоков."""
+
+    def __init__(self):
+        self.wsgi = WSGIHandler()
+        self.executor = ThreadPoolExecutor(
+            settings.ASGI_THREADS, thread_name_prefix='asgi')
+        self.stream_executor = ThreadPoolExecutor(
+            settings.ASGI_STREAM_THREADS, thread_name_prefix='asgi-stream')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self.http(scope, receive, send)
+        else:
+            raise ValueError(f'Тип соединения {scope["type"]} не поддержан')
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.stream_executor.shutdown(wait=False)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def http(self, scope, receive, send):
+        # Большие тела (загрузки картинок) уходят на диск, как у Django.
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        length = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return
+            chunk = message.get('body', b'')
+            body.write(chunk)
+            length += len(chunk)
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+        environ = _environ(scope, body, length)
+        loop = asyncio.get_running_loop()
+        try:
+            status, headers, response, content = await loop.run_in_executor(
+                self.executor, self.respond, environ)
+        finally:
+            body.close()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        if response is None:
+            if scope['method'] == 'HEAD':
+                content = b''
+            await send({'type': 'http.response.body', 'body': content})
+            return
+        await self.stream(response, receive, send)
+
+    def respond(self, environ):
+        """Ответ Django; обычный ответ читается и закрывается сразу."""
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+
+        response = self.wsgi(environ, start_response)
+        if getattr(response, 'streaming', False):
+            return started['status'], started['headers'], response, None
+        try:
+            content = b''.join(response)
+        finally:
+            response.close()
+        return started['status'], started['headers'], None, content
+
+    async def stream(self, response, receive, send):
+        """Отдаёт потоковый ответ, пока клиент не отключится."""
+        loop = asyncio.get_running_loop()
+        chunks = iter(response)
+        disconnected = asyncio.ensure_future(self.disconnect(receive))
+        try:
+            while True:
+                # Кусочек ждём до конца: закрывать генератор, пока он
+                # выполняется в другом потоке, нельзя.
+                chunk = await loop.run_in_executor(
+                    self.stream_executor, next, chunks, None)
+                if disconnected.done():
+                    return
+                if chunk is None:
+                    break
+                await send({
+                    'type': 'http.response.body',
+                    'body': chunk,
+                    'more_body': True,
+                })
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            disconnected.cancel()
+            await loop.run_in_executor(self.stream_executor, response.close)
+
+    async def disconnect(self, receive):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+
+def get_asgi_application():
+    """Точка входа ASGI, аналог get_wsgi_application."""
+    django.setup(set_prefix=False)
+    return ASGIHandler()
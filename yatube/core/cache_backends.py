@@ -0,0 +1,214 @@
+"""Кэш в отдельном файле SQLite, общий для всех процессов узла.
+
+LocMemCache у каждого воркера свой, поэтому прогретые фрагменты не
+переиспользуются между процессами. SQLiteCache хранит записи в одном
+файле в режиме WAL: читатели не блокируют писателя, а все воркеры на
+машине видят одни и те же ключи.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+# Чистка просроченных записей раз в столько записей на поток.
+CULL_EVERY = 100
+# Ограничение SQLite на число параметров в одном запросе.
+BATCH_SIZE = 500
+
+
+def _batches(items):
+    for start in range(0, len(items), BATCH_SIZE):
+        yield items[start:start + BATCH_SIZE]
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+            self._local.writes = 0
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _row(self, key):
+        row = self._db.execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires <= time.time():
+            return None
+        return value
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        with self._transaction():
+            if self._row(key) is not None:
+                return False
+            self._write(key, value, timeout)
+        return True
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        value = self._row(key)
+        if value is None:
+            return default
+        return pickle.loads(value)
+
+    def _write(self, key, value, timeout):
+        self._db.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+             self.get_backend_timeout(timeout))
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._write(key, value, timeout)
+        self._maybe_cull()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._transaction():
+            for key, value in data.items():
+                key = self.make_key(key, version=version)
+                self.validate_key(key)
+                self._write(key, value, timeout)
+        self._maybe_cull()
+        return []
+
+    def get_many(self, keys, version=None):
+        keys = {self.make_key(key, version=version): key for key in keys}
+        for key in keys:
+            self.validate_key(key)
+        found = {}
+        now = time.time()
+        for batch in _batches(list(keys)):
+            placeholders = ', '.join('?' * len(batch))
+            rows = self._db.execute(
+                f'SELECT key, value, expires FROM cache '
+                f'WHERE key IN ({placeholders})',
+                batch
+            )
+            found.update(
+                (keys[key], pickle.loads(value))
+                for key, value, expires in rows
+                if expires is None or expires > now
+            )
+        return found
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        cursor = self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_key(key, version=version) for key in keys]
+        for batch in _batches(keys):
+            placeholders = ', '.join('?' * len(batch))
+            self._db.execute(
+                f'DELETE FROM cache WHERE key IN ({placeholders})', batch)
+
+    def has_key(self, key, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._row(key) is not None
+
+    def incr(self, key, delta=1, version=None):
+        cache_key = self.make_key(key, version=version)
+        self.validate_key(cache_key)
+        with self._transaction() as db:
+            value = self._row(cache_key)
+            if value is None:
+                raise ValueError(f"Key '{key}' not found")
+            new_value = pickle.loads(value) + delta
+            db.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (pickle.dumps(new_value, pickle.HIGHEST_PROTOCOL), cache_key)
+            )
+        return new_value
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _maybe_cull(self):
+        self._local.writes += 1
+        if self._local.writes % CULL_EVERY:
+            return
+        db = self._db
+        now = time.time()
+        db.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            (now,)
+        )
+        count, = db.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count <= self._max_entries:
+            return
+        surplus = count
+        if self._cull_frequency:
+            surplus = count // self._cull_frequency
+        db.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY expires IS NULL, expires LIMIT ?)',
+            (surplus,)
+        )
+
+    def close(self, **kwargs):
+        # Соединение живёт всё время жизни потока: открывать файл и
+        # выполнять PRAGMA на каждый запрос дороже, чем держать его.
+        pass
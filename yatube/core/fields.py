@@ -0,0 +1,28 @@
+"""Поле JSON для любой базы: JSONField в Django 2.2 есть только в
+contrib.postgres."""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+
+
+class JSONTextField(models.TextField):
+    """Хранит dict или list как JSON-строку в обычной текстовой колонке."""
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+    def to_python(self, value):
+        if value is None or not isinstance(value, str):
+            return value
+        if not value:
+            return self.get_default()
+        return json.loads(value)
+
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        return json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+    def value_to_string(self, obj):
+        return self.get_prep_value(self.value_from_object(obj))
@@ -0,0 +1,40 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import tasks
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи фоновой очереди.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи и выйти.')
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.TASKS_BATCH_SIZE)
+        parser.add_argument(
+            '--sleep', type=float, default=settings.TASKS_POLL_INTERVAL,
+            help='Пауза в секундах, когда очередь пуста.')
+        parser.add_argument(
+            '--retry-failed', action='store_true',
+            help='Сначала вернуть в очередь задачи, исчерпавшие попытки.')
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            self.stdout.write(
+                f'Возвращено в очередь: {tasks.retry_failed()}')
+        if options['once']:
+            done = tasks.run_pending(options['batch_size'])
+            self.stdout.write(f'Выполнено задач: {done}')
+            return
+        try:
+            while True:
+                close_old_connections()
+                if not tasks.run_batch(options['batch_size']):
+                    time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            self.stdout.write('Остановлено')
@@ -0,0 +1,299 @@
+"""Метрики запросов в процессе и их выдача в формате Prometheus.
+
+MetricsMiddleware на каждый запрос собирает время ответа, число и время
+SQL-запросов (через connection.execute_wrapper, без DEBUG), попадания
+и промахи кэша и время рендера шаблонов. Всё это складывается в
+гистограммы с меткой view — именем URL вроде posts:index. Данные живут
+в памяти процесса, поэтому Prometheus должен опрашивать каждый воркер
+отдельно. Накладные расходы — несколько вызовов perf_counter и
+сложений под блокировкой на запрос. Запросы async-видов, ушедшие в пул
+потоков core.asgi, пишутся в замер своего запроса; замер прибавляет под
+своей блокировкой, потому что в него пишут сразу несколько потоков.
+
+Время шаблонов считает бэкенд DjangoTemplates из этого модуля: он
+отличается от стандартного только замером render() у шаблонов, которые
+отдаёт видам. Вложенные {% include %} входят во время внешнего шаблона.
+"""
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends import django as django_backend
+from django.urls import Resolver404, resolve
+
+DURATION_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+_local = threading.local()
+_MISSING = object()
+
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * len(self.buckets), 0, 0]
+        counts = series[0]
+        # Корзины накопленные: значение входит во все корзины, граница
+        # которых не меньше его.
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[index] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, observed) in sorted(self.series.items()):
+            for bound, count in zip(self.buckets, counts):
+                yield f'{self.name}_bucket', labels + (('le', bound),), count
+            yield f'{self.name}_bucket', labels + (('le', '+Inf'),), observed
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, observed
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.series = {}
+
+    def inc(self, labels, value=1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def samples(self):
+        for labels, value in sorted(self.series.items()):
+            yield self.name, labels, value
+
+
+class Registry:
+    """Метрики процесса; обновления идут под общей блокировкой."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter(
+            'yatube_requests_total', 'Запросы по виду и коду ответа.')
+        self.duration = Histogram(
+            'yatube_request_duration_seconds', 'Время ответа.',
+            DURATION_BUCKETS)
+        self.db_queries = Histogram(
+            'yatube_db_queries', 'SQL-запросов на запрос.', QUERY_BUCKETS)
+        self.db_duration = Histogram(
+            'yatube_db_duration_seconds', 'Время SQL-запросов на запрос.',
+            DURATION_BUCKETS)
+        self.template_duration = Histogram(
+            'yatube_template_duration_seconds',
+            'Время рендера шаблонов на запрос.', DURATION_BUCKETS)
+        self.cache = Counter(
+            'yatube_cache_requests_total',
+            'Чтения кэша по виду и результату (hit или miss).')
+
+    @property
+    def metrics(self):
+        return (self.requests, self.duration, self.db_queries,
+                self.db_duration, self.template_duration, self.cache)
+
+    def record(self, view, status, sample):
+        labels = (('view', view),)
+        with self.lock:
+            self.requests.inc(labels + (('status', str(status)),))
+            self.duration.observe(labels, sample.duration)
+            self.db_queries.observe(labels, sample.queries)
+            self.db_duration.observe(labels, sample.db_time)
+            if sample.templates:
+                self.template_duration.observe(labels, sample.template_time)
+            if sample.cache_hits:
+                self.cache.inc(labels + (('result', 'hit'),),
+                               sample.cache_hits)
+            if sample.cache_misses:
+                self.cache.inc(labels + (('result', 'miss'),),
+                               sample.cache_misses)
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus 0.0.4."""
+        lines = []
+        with self.lock:
+            for metric in self.metrics:
+                lines.append(f'# HELP {metric.name} {metric.help_text}')
+                lines.append(f'# TYPE {metric.name} {metric.kind}')
+                for name, labels, value in metric.samples():
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self.lock:
+            for metric in self.metrics:
+                metric.series = {}
+
+
+def _escape(value):
+    return (str(value).replace('\\', '\\\\')
+            .replace('"', '\\"').replace('\n', '\\n'))
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _number(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+registry = Registry()
+
+
+class Sample:
+    """Замеры одного запроса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.duration = 0
+        self.queries = 0
+        self.db_time = 0
+        self.templates = 0
+        self.template_time = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, **values):
+        with self.lock:
+            for name, value in values.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def __call__(self, execute, sql, params, many, context):
+        """execute_wrapper для всех соединений с базой."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add(db_time=time.perf_counter() - started, queries=1)
+
+
+def current_sample():
+    return getattr(_local, 'sample', None)
+
+
+@contextmanager
+def recording(sample):
+    """Пишет в sample запросы к базе и чтения кэша текущего потока."""
+    previous = current_sample()
+    _local.sample = sample
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(sample))
+            yield sample
+    finally:
+        _local.sample = previous
+
+
+def _instrument(cache):
+    """Подменяет get и get_many экземпляра кэша подсчётом попаданий.
+
+    Экземпляры кэшей свои в каждом потоке, поэтому подмена делается
+    один раз на поток и алиас.
+    """
+    if getattr(cache, '_metrics_instrumented', False):
+        return
+    get, get_many = cache.get, cache.get_many
+
+    def counted_get(key, default=None, version=None):
+        value = get(key, _MISSING, version=version)
+        sample = current_sample()
+        if sample is not None:
+            if value is _MISSING:
+                sample.add(cache_misses=1)
+            else:
+                sample.add(cache_hits=1)
+        return default if value is _MISSING else value
+
+    def counted_get_many(keys, version=None):
+        keys = list(keys)
+        sample = current_sample()
+        # BaseCache.get_many читает ключи через get: не считаем дважды.
+        _local.sample = None
+        try:
+            found = get_many(keys, version=version)
+        finally:
+            _local.sample = sample
+        if sample is not None:
+            sample.add(cache_hits=len(found),
+                       cache_misses=len(keys) - len(found))
+        return found
+
+    cache.get = counted_get
+    cache.get_many = counted_get_many
+    cache._metrics_instrumented = True
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        # Ответ отдан раньше разрешения URL, например из кэша страниц.
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return 'unmatched'
+    return match.view_name
+
+
+class MetricsMiddleware:
+    """Собирает метрики запроса; ставится первым в MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        for alias in settings.CACHES:
+            _instrument(caches[alias])
+        sample = Sample()
+        started = time.perf_counter()
+        with recording(sample):
+            response = self.get_response(request)
+        sample.duration = time.perf_counter() - started
+        registry.record(view_name(request), response.status_code, sample)
+        return response
+
+
+class Template(django_backend.Template):
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            sample = current_sample()
+            if sample is not None:
+                sample.add(templates=1,
+                           template_time=time.perf_counter() - started)
+
+
+class DjangoTemplates(django_backend.DjangoTemplates):
+    """Стандартный бэкенд шаблонов с замером времени рендера."""
+
+    def from_string(self, template_code):
+        return Template(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return Template(template.template, self)
@@ -1,4 +1,8 @@
 from django.db import models
+from django.db.models.constraints import UniqueConstraint
+from django.utils import timezone
+
+from .fields import JSONTextField
 
 
 class CreatedModel(models.Model):
@@ -11,3 +15,53 @@ class CreatedModel(models.Model):
     class Meta:
         # Это абстрактная модель:
         abstract = True
+
+
+class Task(models.Model):
+    """Задача фоновой очереди core.tasks."""
+    PENDING = 'pending'
+    FAILED = 'failed'
+    STATES = (
+        (PENDING, 'Ожидает'),
+        (FAILED, 'Не выполнена'),
+    )
+
+    name = models.CharField('Задача', max_length=100)
+    payload = JSONTextField('Данные', default=dict)
+    key = models.CharField(
+        'Ключ идемпотентности',
+        max_length=200,
+        blank=True,
+        null=True
+    )
+    state = models.CharField(
+        'Состояние',
+        max_length=10,
+        choices=STATES,
+        default=PENDING
+    )
+    attempts = models.PositiveIntegerField('Попыток', default=0)
+    run_at = models.DateTimeField('Выполнить после', default=timezone.now)
+    locked_by = models.CharField(max_length=32, blank=True)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Дата создания', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Задача'
+        verbose_name_plural = 'Задачи'
+        constraints = [
+            UniqueConstraint(
+                fields=['name', 'key'],
+                name='unique_task_key'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['state', 'run_at', 'id'],
+                name='task_due_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
@@ -0,0 +1,156 @@
+"""Очередь фоновых задач в базе данных, без внешнего брокера.
+
+Задача — строка Task с именем обработчика и JSON-данными. Она пишется
+в той же транзакции, что и изменение, которое её породило: откат
+запроса отменяет и задачу, а закоммиченная запись всегда дождётся
+своих побочных эффектов. Воркер (manage.py run_tasks) забирает пакет
+готовых задач с одним именем, ставит на них аренду и вызывает
+обработчик один раз на весь пакет; обработчик и удаление выполненных
+задач идут в одной транзакции, поэтому повтор после сбоя ничего не
+применяет дважды.
+
+Упавший пакет перезапускается по одной задаче, чтобы одна плохая
+задача не держала остальные. Упавшая задача откладывается с
+экспоненциальной задержкой, после TASKS_MAX_ATTEMPTS попыток она
+помечается failed и ждёт retry_failed(). Ключ идемпотентности
+схлопывает одинаковые ожидающие задачи: пока задача с ключом не
+взята воркером, повторная постановка ничего не добавляет.
+
+При TASKS_EAGER (по умолчанию в DEBUG и тестах) обработчик вызывается
+сразу при постановке, как будто воркер уже отработал.
+"""
+import logging
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_handlers = {}
+
+
+def task(name):
+    """Регистрирует обработчик: handler(payloads) получает список данных."""
+    def decorator(handler):
+        _handlers[name] = handler
+        return handler
+    return decorator
+
+
+def enqueue(name, payload, key=None, delay=0):
+    """Ставит задачу в очередь текущей транзакции."""
+    enqueue_many(name, [(payload, key)], delay=delay)
+
+
+def enqueue_many(name, items, delay=0):
+    """Ставит пакет задач одним INSERT; items — пары (данные, ключ)."""
+    if name not in _handlers:
+        raise LookupError(f'Нет обработчика задачи {name}')
+    if not items:
+        return
+    if settings.TASKS_EAGER:
+        _handlers[name]([payload for payload, _ in items])
+        return
+    run_at = timezone.now() + timedelta(seconds=delay)
+    Task.objects.bulk_create([
+        Task(name=name, payload=payload, key=key, run_at=run_at)
+        for payload, key in items
+    ], ignore_conflicts=True)
+
+
+def _due(now):
+    return Task.objects.filter(
+        Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+        state=Task.PENDING,
+        run_at__lte=now,
+    )
+
+
+def _claim(batch_size):
+    """Арендует до batch_size готовых задач с именем самой старой.
+
+    Аренда ставится условным UPDATE: из двух воркеров, выбравших одни
+    и те же строки, её получит только первый. Ключ снимается, чтобы
+    изменения, пришедшие во время выполнения, поставили новую задачу.
+    """
+    now = timezone.now()
+    oldest = _due(now).order_by('id').values_list('name', flat=True).first()
+    if oldest is None:
+        return []
+    ids = list(_due(now).filter(name=oldest).order_by('id').values_list(
+        'pk', flat=True)[:batch_size])
+    token = uuid.uuid4().hex
+    _due(now).filter(pk__in=ids).update(
+        locked_by=token,
+        locked_until=now + timedelta(seconds=settings.TASKS_LEASE),
+        key=None,
+    )
+    return list(Task.objects.filter(locked_by=token).order_by('id'))
+
+
+def _execute(name, tasks):
+    handler = _handlers.get(name)
+    if handler is None:
+        raise LookupError(f'Нет обработчика задачи {name}')
+    with transaction.atomic():
+        handler([item.payload for item in tasks])
+        Task.objects.filter(pk__in=[item.pk for item in tasks]).delete()
+
+
+def _fail(item, error):
+    item.attempts += 1
+    item.error = error
+    item.locked_by = ''
+    item.locked_until = None
+    if item.attempts >= settings.TASKS_MAX_ATTEMPTS:
+        item.state = Task.FAILED
+    else:
+        item.run_at = timezone.now() + timedelta(
+            seconds=settings.TASKS_RETRY_DELAY * 2 ** (item.attempts - 1))
+    item.save(update_fields=[
+        'attempts', 'error', 'locked_by', 'locked_until', 'state', 'run_at'])
+
+
+def run_batch(batch_size=None):
+    """Выполняет один пакет задач, возвращает число взятых задач."""
+    tasks = _claim(batch_size or settings.TASKS_BATCH_SIZE)
+    if not tasks:
+        return 0
+    name = tasks[0].name
+    try:
+        _execute(name, tasks)
+    except Exception:
+        if len(tasks) == 1:
+            logger.exception('Задача %s не выполнена', tasks[0])
+            _fail(tasks[0], traceback.format_exc())
+            return 1
+        for item in tasks:
+            try:
+                _execute(name, [item])
+            except Exception:
+                logger.exception('Задача %s не выполнена', item)
+                _fail(item, traceback.format_exc())
+    return len(tasks)
+
+
+def run_pending(batch_size=None):
+    """Выполняет все готовые задачи, возвращает их число."""
+    total = 0
+    while True:
+        done = run_batch(batch_size)
+        if not done:
+            return total
+        total += done
+
+
+def retry_failed():
+    """Возвращает в очередь задачи, исчерпавшие попытки."""
+    return Task.objects.filter(state=Task.FAILED).update(
+        state=Task.PENDING, attempts=0, run_at=timezone.now())
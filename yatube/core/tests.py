@@ -0,0 +1,421 @@
+import asyncio
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from posts.tests.utils import clear_caches
+
+from . import tasks
+from .asgi import ASGIHandler, _environ, async_view, sync_to_async
+from .cache_backends import SQLiteCache
+from .metrics import Histogram, Registry, Sample, registry
+from .models import Task
+
+User = get_user_model()
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = SQLiteCache(self.path, {})
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_set_get_delete(self):
+        """Значение сохраняется, читается и удаляется."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expiry(self):
+        """Просроченная запись не возвращается."""
+        self.cache.set('key', 'value', timeout=0.01)
+        time.sleep(0.02)
+        self.assertEqual(self.cache.get('key', 'default'), 'default')
+        self.cache.set('forever', 'value', timeout=None)
+        self.assertTrue(self.cache.has_key('forever'))
+
+    def test_add_and_incr(self):
+        """add не перезаписывает ключ, incr увеличивает значение."""
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 10))
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_many(self):
+        """Пакетные операции работают и на больших наборах ключей."""
+        data = {f'key-{i}': i for i in range(1200)}
+        self.cache.set_many(data)
+        self.assertEqual(self.cache.get_many(list(data)), data)
+        self.cache.delete_many(list(data)[:600])
+        self.assertEqual(len(self.cache.get_many(list(data))), 600)
+        self.cache.clear()
+        self.assertEqual(self.cache.get_many(list(data)), {})
+
+    def test_shared_between_instances(self):
+        """Разные экземпляры (процессы) видят одни и те же записи."""
+        other = SQLiteCache(self.path, {})
+        self.cache.set('shared', 'value')
+        self.assertEqual(other.get('shared'), 'value')
+
+    def test_cull(self):
+        """При переполнении лишние записи вытесняются."""
+        small = SQLiteCache(
+            self.path, {'OPTIONS': {'MAX_ENTRIES': 10, 'CULL_FREQUENCY': 2}})
+        for i in range(200):
+            small.set(f'key-{i}', i)
+        self.assertLessEqual(
+            len(small.get_many([f'key-{i}' for i in range(200)])), 110)
+
+
+class HistogramTest(SimpleTestCase):
+    def test_cumulative_buckets(self):
+        """Корзины накопленные, +Inf равна числу наблюдений."""
+        histogram = Histogram('latency', 'Время.', (1, 5))
+        for value in (0.5, 3, 10):
+            histogram.observe((('view', 'index'),), value)
+        samples = {
+            (name, labels[-1][1] if name.endswith('bucket') else None): value
+            for name, labels, value in histogram.samples()
+        }
+        self.assertEqual(samples['latency_bucket', 1], 1)
+        self.assertEqual(samples['latency_bucket', 5], 2)
+        self.assertEqual(samples['latency_bucket', '+Inf'], 3)
+        self.assertEqual(samples['latency_sum', None], 13.5)
+        self.assertEqual(samples['latency_count', None], 3)
+
+    def test_render(self):
+        """render() отдаёт HELP, TYPE и серии с экранированными метками."""
+        metrics = Registry()
+        sample = Sample()
+        sample.queries = 2
+        sample.cache_hits = 1
+        metrics.record('posts:"index"', 200, sample)
+        text = metrics.render()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      text)
+        self.assertIn(
+            'yatube_requests_total{view="posts:\\"index\\"",status="200"} 1',
+            text)
+        self.assertIn(
+            'yatube_db_queries_bucket{view="posts:\\"index\\"",le="2"} 1',
+            text)
+        self.assertIn('result="hit"} 1', text)
+        self.assertNotIn('result="miss"', text)
+
+
+@override_settings(DEBUG=False)
+class MetricsMiddlewareTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        clear_caches()
+        registry.clear()
+
+    def series(self, metric, view):
+        return metric.series[(('view', view),)]
+
+    def test_view_timings(self):
+        """Запрос к ленте даёт время, SQL-запросы и рендер шаблонов."""
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(registry.requests.series[
+            (('view', 'posts:index'), ('status', '200'))], 1)
+        counts, total, observed = self.series(
+            registry.db_queries, 'posts:index')
+        self.assertEqual(observed, 1)
+        self.assertGreater(total, 0)
+        self.assertEqual(
+            self.series(registry.template_duration, 'posts:index')[2], 1)
+        self.assertGreater(
+            self.series(registry.duration, 'posts:index')[1], 0)
+
+    def test_cache_hits(self):
+        """Повторный запрос ленты попадает в кэш."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        hits = registry.cache.series.get(
+            (('view', 'posts:index'), ('result', 'hit')), 0)
+        misses = registry.cache.series.get(
+            (('view', 'posts:index'), ('result', 'miss')), 0)
+        self.assertGreater(hits, 0)
+        self.assertGreater(misses, 0)
+
+    def test_cache_outside_request(self):
+        """Чтения кэша вне запроса не учитываются и не ломаются."""
+        cache.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
+        self.assertEqual(cache.get('missing', 'default'), 'default')
+        self.assertEqual(cache.get_many(['key', 'missing']), {'key': 'value'})
+
+    def test_unmatched(self):
+        """Неизвестный адрес попадает в серию unmatched."""
+        self.client.get('/no/such/page/')
+        self.assertEqual(registry.requests.series[
+            (('view', 'unmatched'), ('status', '404'))], 1)
+
+    def test_endpoint(self):
+        """/metrics/ отдаёт текст Prometheus только разрешённым адресам."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertContains(response, 'view="posts:index"')
+        response = self.client.get(
+            reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 404)
+
+    def test_endpoint_behind_proxy(self):
+        """За прокси разрешённый адрес не открывает /metrics/."""
+        response = self.client.get(
+            reverse('metrics'), HTTP_X_FORWARDED_FOR='203.0.113.1')
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_token(self):
+        """С METRICS_TOKEN метрики отдаются только по токену."""
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.assertEqual(self.client.get(
+            url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 404)
+        response = self.client.get(
+            url, HTTP_AUTHORIZATION='Bearer secret',
+            HTTP_X_FORWARDED_FOR='203.0.113.1', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 200)
+
+    def test_sample_threads(self):
+        """Прибавления из нескольких потоков не теряются."""
+        sample = Sample()
+
+        def add():
+            for _ in range(1000):
+                sample.add(queries=1, cache_hits=2)
+
+        threads = [threading.Thread(target=add) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual((sample.queries, sample.cache_hits), (4000, 8000))
+
+
+calls = []
+
+
+@tasks.task('core.tests.record')
+def record(payloads):
+    calls.append([payload['value'] for payload in payloads])
+    if any(payload['value'] == 'плохая' for payload in payloads):
+        raise ValueError('плохая задача')
+
+
+@override_settings(TASKS_EAGER=False, TASKS_MAX_ATTEMPTS=2)
+class TaskQueueTest(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_batch(self):
+        """Готовые задачи одного имени выполняются одним пакетом."""
+        for value in ('a', 'b', 'c'):
+            tasks.enqueue('core.tests.record', {'value': value})
+        self.assertEqual(calls, [])
+        self.assertEqual(tasks.run_pending(), 3)
+        self.assertEqual(calls, [['a', 'b', 'c']])
+        self.assertFalse(Task.objects.exists())
+
+    def test_idempotency_key(self):
+        """Ожидающая задача с тем же ключом не дублируется."""
+        tasks.enqueue('core.tests.record', {'value': 'a'}, key='1')
+        tasks.enqueue('core.tests.record', {'value': 'b'}, key='1')
+        self.assertEqual(Task.objects.count(), 1)
+        tasks.run_pending()
+        tasks.enqueue('core.tests.record', {'value': 'c'}, key='1')
+        tasks.run_pending()
+        self.assertEqual(calls, [['a'], ['c']])
+
+    def test_delay(self):
+        """Отложенная задача не выполняется раньше срока."""
+        tasks.enqueue('core.tests.record', {'value': 'a'}, delay=60)
+        self.assertEqual(tasks.run_pending(), 0)
+
+    def test_retries(self):
+        """Плохая задача отделяется от пакета и повторяется до лимита."""
+        tasks.enqueue('core.tests.record', {'value': 'плохая'})
+        tasks.enqueue('core.tests.record', {'value': 'a'})
+        tasks.run_pending()
+        self.assertIn(['a'], calls)
+        task = Task.objects.get()
+        self.assertEqual(task.attempts, 1)
+        self.assertIn('плохая задача', task.error)
+        self.assertEqual(tasks.run_pending(), 0)
+        Task.objects.update(run_at=task.created)
+        tasks.run_pending()
+        task.refresh_from_db()
+        self.assertEqual(task.state, Task.FAILED)
+        self.assertEqual(tasks.retry_failed(), 1)
+        self.assertEqual(Task.objects.get().state, Task.PENDING)
+
+    def test_command(self):
+        """run_tasks --once выполняет очередь и выходит."""
+        tasks.enqueue('core.tests.record', {'value': 'a'})
+        out = io.StringIO()
+        call_command('run_tasks', '--once', stdout=out)
+        self.assertIn('Выполнено задач: 1', out.getvalue())
+        self.assertEqual(calls, [['a']])
+
+
+def current_thread():
+    return threading.current_thread().name
+
+
+class AsyncViewTest(SimpleTestCase):
+    def test_pool(self):
+        """Вызовы из async-вида идут в пул и ждутся одновременно."""
+        @async_view
+        async def view(request):
+            return await asyncio.gather(
+                sync_to_async(current_thread)(),
+                sync_to_async(current_thread)(),
+            )
+        for name in view(None):
+            self.assertTrue(name.startswith('async'))
+
+    def test_pool_closes_old_connections(self):
+        """Вызов в пуле закрывает старые соединения до и после себя."""
+        conn = mock.Mock()
+
+        def closed():
+            return conn.close_if_unusable_or_obsolete.call_count
+
+        @async_view
+        async def view(request):
+            return await sync_to_async(closed)()
+
+        with mock.patch.object(connections, 'all', return_value=[conn]):
+            self.assertEqual(view(None), 1)
+        self.assertEqual(closed(), 2)
+
+    @override_settings(ASYNC_THREADS=0)
+    def test_inline(self):
+        """ASYNC_THREADS = 0 выполняет вызов в потоке вида."""
+        @async_view
+        async def view(request):
+            return await sync_to_async(current_thread)()
+        self.assertEqual(view(None), current_thread())
+
+
+class AtomicAsyncViewTest(TestCase):
+    def test_atomic_inline(self):
+        """Внутри транзакции вызов не уходит в другое соединение."""
+        @async_view
+        async def view(request):
+            return await sync_to_async(User.objects.count)()
+        User.objects.create_user(username='author')
+        self.assertEqual(view(None), 1)
+
+
+@override_settings(SSE_POLL_INTERVAL=None, SSE_MAX_DURATION=0)
+class ASGIHandlerTest(SimpleTestCase):
+    def setUp(self):
+        self.app = ASGIHandler()
+        self.addCleanup(self.app.close)
+
+    def request(self, path, method='GET', body=b''):
+        messages = [
+            {'type': 'http.request', 'body': body[:3], 'more_body': True},
+            {'type': 'http.request', 'body': body[3:]},
+        ]
+        sent = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.sleep(60)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.app({
+            'type': 'http',
+            'method': method,
+            'path': path,
+            'query_string': b'',
+            'headers': [(b'host', b'localhost')],
+        }, receive, send))
+        return sent
+
+    def test_page(self):
+        """Страница отдаётся одним сообщением с телом."""
+        start, body = self.request(reverse('about:author'))
+        self.assertEqual(start['status'], 200)
+        self.assertIn((b'content-type', b'text/html; charset=utf-8'),
+                      start['headers'])
+        self.assertIn(b'<html', body['body'])
+        start, body = self.request(reverse('about:author'), method='HEAD')
+        self.assertEqual(body['body'], b'')
+
+    def test_streaming(self):
+        """Потоковый ответ уходит кусками и закрывается пустым телом."""
+        start, *chunks = self.request(reverse('posts:index_events'))
+        self.assertEqual(start['status'], 200)
+        self.assertTrue(chunks[0]['body'].startswith(b'retry:'))
+        self.assertTrue(chunks[0]['more_body'])
+        self.assertEqual(chunks[-1], {'type': 'http.response.body',
+                                      'body': b''})
+
+    def test_lifespan(self):
+        """Запуск и остановка сервера подтверждаются."""
+        messages = [{'type': 'lifespan.startup'},
+                    {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(self.app({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete',
+                                'lifespan.shutdown.complete'])
+
+    def test_environ(self):
+        """Заголовки, путь и длина тела переходят в WSGI-окружение."""
+        environ = _environ({
+            'method': 'POST',
+            'path': '/группа/',
+            'query_string': b'page=2',
+            'headers': [
+                (b'content-type', b'text/plain'),
+                (b'x-forwarded-for', b'1.1.1.1'),
+                (b'x-forwarded-for', b'2.2.2.2'),
+            ],
+            'client': ('10.0.0.1', 5000),
+        }, io.BytesIO(b'body'), 4)
+        self.assertEqual(
+            environ['PATH_INFO'].encode('latin-1').decode(), '/группа/')
+        self.assertEqual(environ['QUERY_STRING'], 'page=2')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['CONTENT_LENGTH'], '4')
+        self.assertEqual(environ['HTTP_X_FORWARDED_FOR'], '1.1.1.1,2.2.2.2')
+        self.assertEqual(environ['REMOTE_ADDR'], '10.0.0.1')
+        self.assertIn('asgi.version', environ)
@@ -0,0 +1,232 @@
+"""JSON API: ленты, пост с комментариями и пакетная запись.
+
+Строки выбираются через values() одним запросом с JOIN автора и группы
+и превращаются в словари напрямую, без создания экземпляров моделей и
+дескрипторов полей. Пагинация курсорная (см. paginator): стоимость
+страницы не зависит от её глубины, а адреса соседних страниц приходят
+в next и previous. Условные GET и кэш анонимных страниц работают так
+же, как у HTML-лент: виды обёрнуты в generation_condition с теми же
+поколениями. unread_notifications отдаёт счётчик непрочитанных
+уведомлений одним запросом. Пакетная запись постов и комментариев —
+POST с JSON в bulk_posts и bulk_comments, работу делает bulk.
+"""
+import json
+
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from . import bulk, conditional, notifications, timeline
+from .models import Comment, Group, Post
+from .paginator import CursorPaginator, InvalidCursor
+from .storage import post_images
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 100
+
+POST_FIELDS = (
+    'id', 'text', 'pub_date', 'image', 'thumbnails', 'comments_count',
+    'author__username', 'author__first_name', 'author__last_name',
+    'group__slug', 'group__title',
+)
+COMMENT_FIELDS = (
+    'id', 'text', 'created', 'parent', 'replies_count',
+    'author__username', 'author__first_name', 'author__last_name',
+)
+COMMENTS_ORDERING = ('created', 'id')
+
+
+def _json(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def _error(message, status):
+    return _json({'detail': message}, status)
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        return DEFAULT_LIMIT
+    return min(max(limit, 1), MAX_LIMIT)
+
+
+def _author(row):
+    return {
+        'username': row['author__username'],
+        'first_name': row['author__first_name'],
+        'last_name': row['author__last_name'],
+    }
+
+
+def serialize_post(row):
+    image = row['image']
+    thumbnails = row['thumbnails'] or {}
+    ready = bool(image) and thumbnails.get('source') == image
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'pub_date': row['pub_date'].isoformat(),
+        'author': _author(row),
+        'group': {
+            'slug': row['group__slug'],
+            'title': row['group__title'],
+        } if row['group__slug'] else None,
+        'image': post_images.url(image) if image else None,
+        'thumbnails': {
+            name: size['url']
+            for name, size in thumbnails.get('sizes', {}).items()
+        } if ready else {},
+        'comments_count': row['comments_count'],
+    }
+
+
+def serialize_comment(row):
+    return {
+        'id': row['id'],
+        'text': row['text'],
+        'created': row['created'].isoformat(),
+        'parent': row['parent'],
+        'replies_count': row['replies_count'],
+        'author': _author(row),
+    }
+
+
+def _page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri('?' + query.urlencode())
+
+
+def _paginate(request, rows, serializer, ordering=('-pub_date', '-id')):
+    """Страница строк values() в виде {'results', 'next', 'previous'}."""
+    paginator = CursorPaginator(rows, _limit(request), ordering=ordering)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return None
+    return {
+        'results': [serializer(row) for row in page.object_list],
+        'next': _page_url(request, page.next_cursor),
+        'previous': _page_url(request, page.previous_cursor),
+    }
+
+
+def _feed(request, rows):
+    return _paginate(request, rows.values(*POST_FIELDS), serialize_post)
+
+
+def _invalid_cursor():
+    return _error('Некорректный курсор.', 400)
+
+
+@conditional.generation_condition(conditional.index_generations)
+def post_list(request):
+    data = _feed(request, Post.objects.all())
+    if data is None:
+        return _invalid_cursor()
+    return _json(data)
+
+
+@conditional.generation_condition(conditional.group_generations)
+def group_posts(request, slug):
+    data = _feed(request, Post.objects.filter(group__slug=slug))
+    if data is None:
+        return _invalid_cursor()
+    # Группу проверяем, только если лента пуста: у непустой она есть.
+    if not data['results'] and not Group.objects.filter(slug=slug).exists():
+        return _error('Группа не найдена.', 404)
+    return _json(data)
+
+
+@conditional.generation_condition(conditional.profile_generations)
+def profile_posts(request, username):
+    names, _ = conditional.generation_state(request)
+    if not names:
+        return _error('Автор не найден.', 404)
+    data = _feed(request, Post.objects.filter(author__username=username))
+    if data is None:
+        return _invalid_cursor()
+    return _json(data)
+
+
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        return _error('Нужна авторизация.', 401)
+    return _follow_posts(request)
+
+
+@conditional.generation_condition(conditional.follow_generations)
+def _follow_posts(request):
+    data = _feed(request, timeline.follow_feed(
+        request.user, conditional.pulled_author_ids(request)))
+    if data is None:
+        return _invalid_cursor()
+    return _json(data)
+
+
+def unread_notifications(request):
+    """Число непрочитанных уведомлений: дешевле, чем опрашивать ленту."""
+    if not request.user.is_authenticated:
+        return _error('Нужна авторизация.', 401)
+    return _json({'unread': notifications.unread_count(request.user)})
+
+
+@conditional.generation_condition(conditional.post_generations)
+def post_detail(request, post_id):
+    names, _ = conditional.generation_state(request)
+    row = names and Post.objects.filter(pk=post_id).values(
+        *POST_FIELDS).first()
+    if not row:
+        return _error('Пост не найден.', 404)
+    comments = _paginate(
+        request,
+        Comment.objects.filter(post_id=post_id).values(*COMMENT_FIELDS),
+        serialize_comment,
+        ordering=COMMENTS_ORDERING
+    )
+    if comments is None:
+        return _invalid_cursor()
+    data = serialize_post(row)
+    data['comments'] = comments
+    return _json(data)
+
+
+def _bulk_write(request, key, create, serialize):
+    if not request.user.is_authenticated:
+        return _error('Нужна авторизация.', 401)
+    try:
+        items = json.loads(request.body.decode()).get(key)
+    except (ValueError, AttributeError):
+        return _error('Ожидается JSON-объект.', 400)
+    try:
+        objects = create(request.user, items)
+    except bulk.BatchInvalid as error:
+        return _json({'errors': error.errors}, 400)
+    return _json({'results': serialize([obj.pk for obj in objects])}, 201)
+
+
+def _posts_by_ids(ids):
+    rows = Post.objects.filter(pk__in=ids).order_by('id')
+    return [serialize_post(row) for row in rows.values(*POST_FIELDS)]
+
+
+def _comments_by_ids(ids):
+    rows = Comment.objects.filter(pk__in=ids).order_by('id')
+    return [serialize_comment(row) for row in rows.values(*COMMENT_FIELDS)]
+
+
+@require_POST
+def bulk_posts(request):
+    """{"posts": [{"text": ..., "group": id}, ...]} — создаёт посты."""
+    return _bulk_write(request, 'posts', bulk.create_posts, _posts_by_ids)
+
+
+@require_POST
+def bulk_comments(request):
+    """{"comments": [{"post": id, "text": ...}, ...]} — комментарии."""
+    return _bulk_write(
+        request, 'comments', bulk.create_comments, _comments_by_ids)
@@ -0,0 +1,288 @@
+"""Замеры задержки и числа запросов для видов posts.urls.
+
+Каждый GET-вид вызывается через тестовый Client со всем стеком
+middleware, но с DEBUG=False, как в продакшене: без debug toolbar и с
+кэшем анонимных страниц. Адреса подбираются по данным в базе с
+перекосом в худшую сторону: самая большая группа, самый плодовитый
+автор, самый комментируемый пост, пользователь с наибольшим числом
+подписок. Для каждого вида сохраняются перцентили времени ответа и
+число SQL-запросов; результаты пишутся в JSON с хэшем коммита, чтобы
+сравнивать их между коммитами (compare).
+
+throughput сравнивает пропускную способность WSGI и ASGI (core.asgi) на
+лентах и странице поста при высокой конкурентности. Сервера нет: WSGI-
+приложение вызывается из concurrency потоков, как в потоковом
+WSGI-сервере, а ASGI-приложение — из concurrency корутин одного цикла.
+Запросы идут с cookie сессии, поэтому кэш анонимных страниц не
+срабатывает и каждую страницу строит вид. Генератор нагрузки делит GIL
+с приложением, так что цифры сравнимы между собой, но не с боевыми.
+"""
+import asyncio
+import statistics
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test import Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.asgi import ASGIHandler
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+PERCENTILES = (50, 90, 99)
+THROUGHPUT_VIEWS = (
+    'posts:index', 'posts:group_list', 'posts:profile', 'posts:post_detail',
+    'posts:follow_index',
+)
+HOST = 'localhost'
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = round(percent / 100 * (len(ordered) - 1))
+    return ordered[index]
+
+
+def targets():
+    """(имя, адрес, пользователь) для каждого GET-вида posts.urls."""
+    post = Post.objects.order_by('-comments_count', '-pk').first()
+    if post is None:
+        return []
+    group = Group.objects.order_by('-posts_count').first()
+    author = User.objects.order_by('-stats__posts_count').first()
+    reader = User.objects.order_by('-stats__following_count').first()
+    word = max(post.text.split(), key=len, default='')
+    items = [
+        ('posts:index', reverse('posts:index'), None),
+        ('posts:index?page=50', reverse('posts:index') + '?page=50', None),
+        ('posts:profile',
+         reverse('posts:profile', args=[author.username]), None),
+        ('posts:post_detail',
+         reverse('posts:post_detail', args=[post.pk]), None),
+        ('posts:comment_list',
+         reverse('posts:comment_list', args=[post.pk]), None),
+        ('posts:follow_index', reverse('posts:follow_index'), reader),
+        ('posts:post_search',
+         reverse('posts:post_search') + f'?q={word}', None),
+        ('posts:api_post_list', reverse('posts:api_post_list'), None),
+        ('posts:api_profile_posts',
+         reverse('posts:api_profile_posts', args=[author.username]), None),
+        ('posts:api_post_detail',
+         reverse('posts:api_post_detail', args=[post.pk]), None),
+        ('posts:api_follow_posts', reverse('posts:api_follow_posts'), reader),
+    ]
+    if group is not None:
+        items += [
+            ('posts:group_list',
+             reverse('posts:group_list', args=[group.slug]), None),
+            ('posts:api_group_posts',
+             reverse('posts:api_group_posts', args=[group.slug]), None),
+        ]
+    return items
+
+
+def _clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+def measure(client, url, repeat, cold=False):
+    """Время ответов в миллисекундах и число запросов к базе."""
+    timings, status = [], None
+    for _ in range(repeat):
+        if cold:
+            _clear_caches()
+        started = time.perf_counter()
+        response = client.get(url)
+        timings.append((time.perf_counter() - started) * 1000)
+        status = response.status_code
+    # Async-виды ходят в базу из пула потоков, а CaptureQueriesContext
+    # видит только соединение этого потока: запросы считаются отдельным
+    # прогоном с работой с базой на месте.
+    if cold:
+        _clear_caches()
+    with override_settings(ASYNC_THREADS=0):
+        with CaptureQueriesContext(connection) as captured:
+            client.get(url)
+    result = {
+        f'p{percent}': round(percentile(timings, percent), 2)
+        for percent in PERCENTILES
+    }
+    result.update({
+        'mean': round(statistics.mean(timings), 2),
+        'queries': len(captured),
+        'status': status,
+    })
+    return result
+
+
+@override_settings(DEBUG=False)
+def run(repeat=20, cold=False):
+    """Замеряет все виды и возвращает результаты для сохранения."""
+    results = {}
+    for name, url, user in targets():
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        # Первый запрос прогревает кэш и не учитывается.
+        client.get(url)
+        results[name] = dict(measure(client, url, repeat, cold), url=url)
+    return {
+        'revision': revision(),
+        'created': datetime.now(timezone.utc).isoformat(),
+        'repeat': repeat,
+        'cold': cold,
+        'rows': {
+            'users': User.objects.count(),
+            'posts': Post.objects.count(),
+            'comments': Comment.objects.count(),
+            'follows': Follow.objects.count(),
+        },
+        'results': results,
+    }
+
+
+def compare(current, previous):
+    """Строки отчёта: p50 и запросы сейчас против прошлого замера."""
+    lines = []
+    for name, result in current['results'].items():
+        before = previous['results'].get(name)
+        if before is None:
+            lines.append(f'{name}: p50 {result["p50"]} мс (новый)')
+            continue
+        change = (result['p50'] - before['p50']) / (before['p50'] or 1)
+        lines.append(
+            f'{name}: p50 {before["p50"]} → {result["p50"]} мс '
+            f'({change:+.0%}), запросов {before["queries"]} → '
+            f'{result["queries"]}'
+        )
+    return lines
+
+
+def _cookie(user):
+    client = Client()
+    client.force_login(user)
+    name = settings.SESSION_COOKIE_NAME
+    return f'{name}={client.cookies[name].value}'
+
+
+def _summary(timings, elapsed, statuses):
+    return {
+        'rps': round(len(timings) / elapsed, 1),
+        'p50': round(percentile(timings, 50), 2),
+        'p99': round(percentile(timings, 99), 2),
+        'errors': sum(status != 200 for status in statuses),
+    }
+
+
+def wsgi_throughput(app, url, cookie, requests, concurrency):
+    """Запросы к WSGI-приложению из concurrency потоков."""
+    factory = RequestFactory(SERVER_NAME=HOST, HTTP_HOST=HOST)
+
+    def call(_):
+        environ = factory.get(url, HTTP_COOKIE=cookie).environ
+        statuses = []
+        started = time.perf_counter()
+        response = app(environ, lambda status, headers: statuses.append(
+            int(status.split(' ', 1)[0])))
+        b''.join(response)
+        response.close()
+        return (time.perf_counter() - started) * 1000, statuses[0]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        timings, statuses = zip(*executor.map(call, range(requests)))
+    return _summary(timings, time.perf_counter() - started, statuses)
+
+
+async def _asgi_run(app, url, cookie, requests, concurrency):
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http',
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(b'host', HOST.encode()), (b'cookie', cookie.encode())],
+        'server': (HOST, 80),
+        'client': ('127.0.0.1', 0),
+    }
+    timings, statuses = [], []
+    remaining = iter(range(requests))
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def worker():
+        for _ in remaining:
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            started = time.perf_counter()
+            await app(dict(scope), receive, send)
+            timings.append((time.perf_counter() - started) * 1000)
+            statuses.append(sent[0]['status'])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return _summary(timings, time.perf_counter() - started, statuses)
+
+
+def asgi_throughput(app, url, cookie, requests, concurrency):
+    """Запросы к ASGI-приложению из concurrency корутин."""
+    return asyncio.run(_asgi_run(app, url, cookie, requests, concurrency))
+
+
+@override_settings(DEBUG=False)
+def throughput(requests=500, concurrency=100):
+    """Запросов в секунду и задержки WSGI и ASGI для лент и поста."""
+    reader = User.objects.order_by('-stats__following_count').first()
+    if reader is None:
+        return None
+    cookie = _cookie(reader)
+    wsgi, asgi = WSGIHandler(), ASGIHandler()
+    results = {}
+    try:
+        for name, url, _ in targets():
+            if name not in THROUGHPUT_VIEWS:
+                continue
+            results[name] = {'url': url}
+            for path, app, run_path in (
+                    ('wsgi', wsgi, wsgi_throughput),
+                    ('asgi', asgi, asgi_throughput)):
+                # Прогрев: фрагменты в кэше, соединения потоков открыты.
+                run_path(app, url, cookie, concurrency, concurrency)
+                results[name][path] = run_path(
+                    app, url, cookie, requests, concurrency)
+    finally:
+        asgi.close()
+    return {
+        'revision': revision(),
+        'created': datetime.now(timezone.utc).isoformat(),
+        'requests': requests,
+        'concurrency': concurrency,
+        'asgi_threads': settings.ASGI_THREADS,
+        'results': results,
+    }
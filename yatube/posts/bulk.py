@@ -0,0 +1,168 @@
+"""Пакетная запись постов и комментариев.
+
+Каждый элемент пакета проверяется той же PostForm или CommentForm, что
+и в обычных видах, но в базу пакет попадает через bulk_create в одной
+транзакции: либо весь, либо, если хоть один элемент не прошёл
+проверку, ничего. bulk_create не посылает сигналов, поэтому задачи,
+которые для одной строки ставит signals, — счётчики, ленты
+подписчиков, поисковый индекс, уведомления — ставятся здесь одним
+INSERT на пакет в той же транзакции и выполняются воркером (см.
+posts.tasks). Поколения страниц, как и в signals, сбрасываются сразу,
+ленты подписчиков — задачей раскладки. Картинки пакетом не
+загружаются: для них остаётся post_create.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from . import generations, tasks
+from .forms import CommentForm, PostForm
+from .models import Comment, Group, Post
+
+
+class BatchInvalid(Exception):
+    """Пакет отклонён; errors — ошибки полей по номеру элемента."""
+
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def _check_items(items):
+    if not isinstance(items, list) or not all(
+            isinstance(item, dict) for item in items):
+        raise BatchInvalid({'__all__': ['Ожидается список объектов.']})
+    if not items:
+        raise BatchInvalid({'__all__': ['Пустой пакет.']})
+    if len(items) > settings.BULK_WRITE_MAX_ITEMS:
+        raise BatchInvalid({'__all__': [
+            f'Не больше {settings.BULK_WRITE_MAX_ITEMS} элементов за раз.'
+        ]})
+
+
+def _id(value):
+    """id из JSON: целое число или строка цифр, иначе None.
+
+    true, 1.5 и 1e400 не id: int() превратил бы их в 1, 1 и OverflowError.
+    """
+    if type(value) is int:
+        return value
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        return int(value)
+    return None
+
+
+def _ids(values):
+    return {_id(value) for value in values} - {None}
+
+
+def _known_ids(model, values):
+    """Существующие id из values одним запросом; мусор пропускается."""
+    return set(model.objects.filter(
+        pk__in=_ids(values)).values_list('pk', flat=True))
+
+
+def _messages(form):
+    return {
+        field: [error['message'] for error in field_errors]
+        for field, field_errors in form.errors.get_json_data().items()
+    }
+
+
+def _as_id(value, known):
+    value = _id(value)
+    return value if value in known else None
+
+
+def _check_text(form, item):
+    # Форма приняла бы и список, сохранив его как строку "['a']".
+    if 'text' in item and not isinstance(item['text'], str):
+        form.add_error('text', 'Ожидается строка.')
+
+
+def _insert(model, objects):
+    model.objects.bulk_create(
+        objects, batch_size=settings.BULK_WRITE_BATCH_SIZE)
+    if objects[0].pk is not None:
+        return
+    # SQLite в Django 2.2 не возвращает id из bulk_create. Внутри
+    # транзакции первая вставка блокирует базу для других писателей,
+    # поэтому последние len(objects) id — наши, в порядке вставки.
+    ids = model.objects.order_by('-pk').values_list(
+        'pk', flat=True)[:len(objects)]
+    for obj, pk in zip(objects, reversed(list(ids))):
+        obj.pk = pk
+
+
+def create_posts(author, items):
+    """Создаёт посты author из списка данных формы, возвращает их."""
+    _check_items(items)
+    groups = _known_ids(
+        Group, (item.get('group') for item in items if item.get('group')))
+    posts, errors = [], {}
+    for index, item in enumerate(items):
+        # Группа проверяется по заранее загруженным id, а не запросом
+        # ModelChoiceField на каждый элемент.
+        group = item.get('group')
+        form = PostForm(data={
+            key: value for key, value in item.items() if key != 'group'
+        })
+        form.is_valid()
+        _check_text(form, item)
+        if group not in (None, '') and _as_id(group, groups) is None:
+            form.add_error('group', form.fields['group'].error_messages[
+                'invalid_choice'])
+        if form.errors:
+            errors[index] = _messages(form)
+            continue
+        post = form.save(commit=False)
+        post.author = author
+        post.group_id = _as_id(group, groups)
+        posts.append(post)
+    if errors:
+        raise BatchInvalid(errors)
+    with transaction.atomic():
+        _insert(Post, posts)
+        tasks.posts_created(posts)
+    generations.bump(*generations.batch_names(posts, followers=False))
+    return posts
+
+
+def create_comments(author, items):
+    """Создаёт комментарии author; в каждом элементе post, text
+    и необязательный parent — комментарий того же поста."""
+    _check_items(items)
+    known = _known_ids(Post, (item.get('post') for item in items))
+    parents = dict(Comment.objects.filter(
+        pk__in=_ids(item.get('parent') for item in items)
+    ).values_list('pk', 'post_id'))
+    comments, errors = [], {}
+    for index, item in enumerate(items):
+        form = CommentForm(data=item)
+        form.is_valid()
+        _check_text(form, item)
+        post_id = _as_id(item.get('post'), known)
+        if post_id is None:
+            form.add_error(None, 'Пост не найден.')
+        parent_id = None
+        if item.get('parent') is not None:
+            parent_id = _as_id(item['parent'], parents)
+            if parent_id is None or parents[parent_id] != post_id:
+                form.add_error(None, 'Комментарий для ответа не найден.')
+        if form.errors:
+            errors[index] = _messages(form)
+            continue
+        comment = form.save(commit=False)
+        comment.author = author
+        comment.post_id = post_id
+        comment.parent_id = parent_id
+        comments.append(comment)
+    if errors:
+        raise BatchInvalid(errors)
+    with transaction.atomic():
+        _insert(Comment, comments)
+        tasks.comments_created(comments)
+    generations.bump(*(
+        generations.post(post_id)
+        for post_id in {comment.post_id for comment in comments}
+    ))
+    return comments
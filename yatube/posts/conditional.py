@@ -0,0 +1,120 @@
+"""Условные GET для лент и страницы поста.
+
+ETag страницы — хэш адреса с параметрами, пользователя и поколений
+срезов, которые она показывает; Last-Modified — время самого свежего
+из этих поколений (см. generations). Оба считаются по кэшу без
+запросов к ленте, поэтому на актуальную копию клиента отвечаем 304, не
+выполняя ни queryset, ни шаблон. Cache-Control: no-cache заставляет
+браузер перепроверять страницу при каждом показе, а не угадывать срок
+её свежести по Last-Modified.
+"""
+import hashlib
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from . import generations, timeline
+from .models import Post
+
+User = get_user_model()
+
+
+def generation_state(request):
+    """(имена, значения) поколений страницы, если вид их посчитал."""
+    return getattr(request, '_generation_state', None)
+
+
+def _state(request, names_func, args, kwargs):
+    """Имена и значения поколений страницы, один раз на запрос."""
+    state = getattr(request, '_generation_state', None)
+    if state is None:
+        names = names_func(request, *args, **kwargs)
+        values = generations.current(*names) if names else []
+        state = request._generation_state = (names, values)
+    return state
+
+
+def generation_condition(names_func):
+    """Декоратор вида: ETag и Last-Modified из поколений его срезов.
+
+    names_func(request, *args, **kwargs) возвращает имена поколений
+    страницы или None, если страницу нельзя проверить по ним.
+    """
+    def etag(request, *args, **kwargs):
+        names, values = _state(request, names_func, args, kwargs)
+        if not names:
+            return None
+        user = request.user.pk if request.user.is_authenticated else '-'
+        source = '|'.join([
+            request.get_full_path(),
+            str(user),
+            generations.token(*names, values=values),
+        ])
+        return hashlib.sha1(source.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        names, values = _state(request, names_func, args, kwargs)
+        if not names:
+            return None
+        return datetime.fromtimestamp(max(values) / 10 ** 6, timezone.utc)
+
+    def decorator(view):
+        conditional_view = condition(
+            etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            if response.has_header('ETag'):
+                patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+# Поколения страниц для generation_condition: лента, группа, автор,
+# пост и лента подписок.
+def index_generations(request):
+    return [generations.GLOBAL]
+
+
+def group_generations(request, slug):
+    return [generations.group(slug)]
+
+
+def profile_generations(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    if author_id is None:
+        return None
+    return [generations.author(author_id)]
+
+
+def post_generations(request, post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True).first()
+    if author_id is None:
+        return None
+    return [generations.post(post_id), generations.author(author_id)]
+
+
+def pulled_author_ids(request):
+    """Авторы, подмешиваемые в ленту подписок; считаются раз на запрос.
+
+    Их нужно знать и для поколений, и самому виду.
+    """
+    pulled = getattr(request, '_pulled_author_ids', None)
+    if pulled is None:
+        pulled = request._pulled_author_ids = timeline.pulled_author_ids(
+            request.user)
+    return pulled
+
+
+def follow_generations(request):
+    pulled = pulled_author_ids(request)
+    return [generations.follow(request.user.pk)] + [
+        generations.author(author_id) for author_id in pulled
+    ]
@@ -0,0 +1,155 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарным UPDATE ... SET x = x + n при создании и
+удалении объектов, поэтому страницы показывают числа без COUNT(*).
+recount() пересчитывает всё заново, если счётчики разошлись с данными
+(например, после bulk_create в обход сигналов).
+"""
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import (Comment, Follow, Group, Notification, Post,
+                     UserStats)
+
+User = get_user_model()
+
+
+def _change(queryset, **deltas):
+    changes = {}
+    for field, delta in deltas.items():
+        if delta > 0:
+            changes[field] = F(field) + delta
+        elif delta < 0:
+            changes[field] = Greatest(F(field) + delta, 0)
+    if not changes:
+        return 0
+    return queryset.update(**changes)
+
+
+def _change_user(user_id, **deltas):
+    updated = _change(UserStats.objects.filter(user_id=user_id), **deltas)
+    if not updated and any(delta > 0 for delta in deltas.values()):
+        recount_user(user_id)
+
+
+def _tally(objects, attr):
+    return Counter(
+        getattr(obj, attr) for obj in objects
+        if getattr(obj, attr) is not None
+    )
+
+
+def stats_for(user):
+    """Счётчики пользователя; создаёт их, если записи ещё нет."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def posts_created(posts, sign=1):
+    for author_id, number in _tally(posts, 'author_id').items():
+        _change_user(author_id, posts_count=sign * number)
+    group_posts_added(posts, sign=sign)
+
+
+def posts_deleted(posts):
+    posts_created(posts, sign=-1)
+
+
+def group_posts_added(posts, sign=1):
+    """Только счётчики групп: пост перенесли в группу или из неё."""
+    for group_id, number in _tally(posts, 'group_id').items():
+        _change(Group.objects.filter(pk=group_id), posts_count=sign * number)
+
+
+def comments_created(comments, sign=1):
+    for post_id, number in _tally(comments, 'post_id').items():
+        _change(Post.objects.filter(pk=post_id),
+                comments_count=sign * number)
+    for parent_id, number in _tally(comments, 'parent_id').items():
+        _change(Comment.objects.filter(pk=parent_id),
+                replies_count=sign * number)
+
+
+def comments_deleted(comments):
+    comments_created(comments, sign=-1)
+
+
+def follows_created(follows, sign=1):
+    for author_id, number in _tally(follows, 'author_id').items():
+        _change_user(author_id, followers_count=sign * number)
+    for user_id, number in _tally(follows, 'user_id').items():
+        _change_user(user_id, following_count=sign * number)
+
+
+def follows_deleted(follows):
+    follows_created(follows, sign=-1)
+
+
+def notifications_created(user_ids, sign=1):
+    """Каждому из user_ids прибавляет одно непрочитанное уведомление."""
+    _change(UserStats.objects.filter(user_id__in=user_ids),
+            unread_notifications=sign)
+
+
+def recount_unread(user_ids):
+    """Пересчитывает непрочитанные уведомления пользователей одним UPDATE."""
+    UserStats.objects.filter(user_id__in=user_ids).update(
+        unread_notifications=_count_of(
+            Notification, 'user', OuterRef('user'), is_read=False))
+
+
+def notifications_read(user_id, number):
+    _change_user(user_id, unread_notifications=-number)
+
+
+def recount_user(user_id):
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'posts_count': Post.objects.filter(author_id=user_id).count(),
+            'followers_count': Follow.objects.filter(
+                author_id=user_id).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id).count(),
+            'unread_notifications': Notification.objects.filter(
+                user_id=user_id, is_read=False).count(),
+        }
+    )
+    return stats
+
+
+def _count_of(model, field, value=OuterRef('pk'), **filters):
+    counted = (
+        model.objects.filter(**{field: value}, **filters)
+        .order_by()
+        .values(field)
+        .annotate(number=Count('pk'))
+        .values('number')
+    )
+    return Coalesce(Subquery(counted), 0)
+
+
+def recount():
+    """Пересчитывает все счётчики пакетными UPDATE с подзапросами."""
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in missing.iterator()],
+        batch_size=500,
+        ignore_conflicts=True
+    )
+    UserStats.objects.update(
+        posts_count=_count_of(Post, 'author', OuterRef('user')),
+        followers_count=_count_of(Follow, 'author', OuterRef('user')),
+        following_count=_count_of(Follow, 'user', OuterRef('user')),
+        unread_notifications=_count_of(
+            Notification, 'user', OuterRef('user'), is_read=False),
+    )
+    Group.objects.update(posts_count=_count_of(Post, 'group'))
+    Post.objects.update(comments_count=_count_of(Comment, 'post'))
+    Comment.objects.update(replies_count=_count_of(Comment, 'parent'))
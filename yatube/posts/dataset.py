@@ -0,0 +1,140 @@
+"""Синтетические данные для нагрузочных замеров лент.
+
+Распределения перекошены, как в живой соцсети: авторы, группы и
+получатели подписок выбираются по закону Ципфа, поэтому у немногих
+авторов тысячи постов и подписчиков (и они попадают в
+TIMELINE_FANOUT_MAX_FOLLOWERS), а у большинства — единицы. Комментарии
+тоже сосредоточены на свежих постах. Записи выдаются генератором в
+формате transfer и загружаются его же импортом: порциями, с обновлением
+поиска, лент и счётчиков и без хранения всего набора в памяти.
+"""
+import random
+from datetime import timedelta
+from itertools import accumulate
+
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from .models import Comment, Post
+
+PASSWORD = '!'  # Непригодный пароль: войти под такими пользователями нельзя.
+
+
+def zipf_weights(size, exponent):
+    """Накопленные веса рангов 1..size для random.choices."""
+    return list(accumulate(
+        1 / rank ** exponent for rank in range(1, size + 1)))
+
+
+def _record(model, pk, **fields):
+    return {'model': model, 'pk': pk, 'fields': fields}
+
+
+class Dataset:
+    def __init__(self, users=1000, groups=20, posts=10000, comments=20000,
+                 follows=5000, days=365, exponent=1.1, seed=None):
+        self.users = users
+        self.groups = groups
+        self.posts = posts
+        self.comments = comments
+        self.follows = follows
+        self.exponent = exponent
+        self.random = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.end = timezone.now()
+        self.start = self.end - timedelta(days=days)
+        # Посты и комментарии сохраняют id из записей: начинаем после
+        # уже существующих, чтобы импорт их не пропустил.
+        self.first_post = (
+            Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        self.first_comment = (
+            Comment.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    def _rank(self, weights):
+        """Номер 0..len-1, малые номера — самые частые."""
+        return self.random.choices(
+            range(len(weights)), cum_weights=weights)[0]
+
+    def _pub_date(self, index):
+        step = (self.end - self.start) / max(self.posts, 1)
+        return self.start + step * index
+
+    def _users(self):
+        for number in range(1, self.users + 1):
+            yield _record(
+                'auth.user', number,
+                username=f'{self.fake.user_name()}_{number}',
+                password=PASSWORD,
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                email=self.fake.email(),
+                is_staff=False,
+                is_active=True,
+                is_superuser=False,
+                last_login=None,
+                date_joined=self.start.isoformat(),
+            )
+
+    def _groups(self):
+        for number in range(1, self.groups + 1):
+            yield _record(
+                'posts.group', number,
+                title=self.fake.catch_phrase()[:200],
+                slug=f'{self.fake.slug()}-{number}'[:200],
+                description=self.fake.paragraph(),
+            )
+
+    def _posts(self):
+        authors = zipf_weights(self.users, self.exponent)
+        groups = zipf_weights(self.groups, self.exponent)
+        for index in range(self.posts):
+            group = None
+            if groups and self.random.random() < 0.7:
+                group = self._rank(groups) + 1
+            yield _record(
+                'posts.post', self.first_post + index,
+                text=self.fake.paragraph(
+                    nb_sentences=self.random.randint(1, 8)),
+                pub_date=self._pub_date(index).isoformat(),
+                author=self._rank(authors) + 1,
+                group=group,
+                image='',
+            )
+
+    def _comments(self):
+        if not self.posts:
+            return
+        # Ранг 0 — самый свежий пост: его комментируют чаще всего.
+        recent = zipf_weights(self.posts, self.exponent)
+        for index in range(self.comments):
+            post_index = self.posts - 1 - self._rank(recent)
+            created = self._pub_date(post_index) + timedelta(
+                minutes=self.random.randint(1, 60 * 24))
+            yield _record(
+                'posts.comment', self.first_comment + index,
+                post=self.first_post + post_index,
+                author=self.random.randint(1, self.users),
+                text=self.fake.sentence(),
+                created=min(created, self.end).isoformat(),
+            )
+
+    def _follows(self):
+        authors = zipf_weights(self.users, self.exponent)
+        for index in range(self.follows):
+            yield _record(
+                'posts.follow', index + 1,
+                user=self.random.randint(1, self.users),
+                author=self._rank(authors) + 1,
+            )
+
+    def records(self):
+        """Записи в порядке загрузки transfer."""
+        if not self.users:
+            return
+        yield from self._users()
+        yield from self._groups()
+        yield from self._posts()
+        yield from self._comments()
+        yield from self._follows()
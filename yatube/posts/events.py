@@ -0,0 +1,166 @@
+"""Общий на процесс рассыльщик событий о новых постах для SSE.
+
+Новые посты находит один опросчик на процесс: поток раз в
+SSE_POLL_INTERVAL секунд выбирает посты с id больше последнего
+увиденного (один запрос по первичному ключу) и рассылает их
+подписчикам по каналам global, group:<slug> и author:<id>. Поэтому
+события доходят и тогда, когда пост записан другим процессом или
+воркером очереди, а нагрузка на базу не растёт с числом открытых
+вкладок. Опросчик работает, только пока есть подписчики.
+
+У каждого подписчика своя ограниченная очередь. Если клиент не
+успевает читать и очередь переполнилась, подписка помечается
+overflowed: поток отправляет клиенту reset, и тот перезагружает
+страницу целиком. id события — id поста, так что он одинаков во всех
+процессах. Последние SSE_HISTORY событий хранятся, чтобы
+переподключившийся клиент получил пропущенное по Last-Event-ID; если
+история пропуск не покрывает, подписка сразу получает reset.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Max
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+GLOBAL = 'global'
+
+Message = namedtuple('Message', 'id channels event data')
+
+
+def group(slug):
+    return f'group:{slug}'
+
+
+def author(author_id):
+    return f'author:{author_id}'
+
+
+class Subscription:
+    def __init__(self, broadcaster, channels):
+        self.broadcaster = broadcaster
+        self.channels = frozenset(channels)
+        self.queue = queue.Queue(settings.SSE_QUEUE_SIZE)
+        self.overflowed = False
+
+    def offer(self, message):
+        if not message.channels & self.channels:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Следующее событие или None, если за timeout ничего не пришло."""
+        try:
+            return self.queue.get(timeout=max(timeout, 0))
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.broadcaster.unsubscribe(self)
+
+
+class Broadcaster:
+    def __init__(self, history=None):
+        self.lock = threading.Lock()
+        self.history = deque(maxlen=history or settings.SSE_HISTORY)
+        # События с id не больше floor могли не попасть в историю.
+        self.floor = 0
+        self.subscribers = set()
+        self.poller = None
+
+    def publish(self, id, channels, event, data):
+        """Рассылает событие; id должны возрастать."""
+        with self.lock:
+            message = Message(id, frozenset(channels), event, data)
+            if len(self.history) == self.history.maxlen:
+                self.floor = self.history[0].id
+            self.history.append(message)
+            # Под блокировкой: иначе событие могло бы обогнать пропущенные,
+            # которые subscribe() отдаёт новому подписчику.
+            for subscriber in self.subscribers:
+                subscriber.offer(message)
+        return message
+
+    def subscribe(self, channels, last_id=None):
+        """Подписка на каналы; с last_id — сначала пропущенные события."""
+        subscription = Subscription(self, channels)
+        seen = None
+        while True:
+            if seen is None and self._poller_stopped():
+                # Запрос к базе — до блокировки, чтобы publish() и другие
+                # подписки его не ждали.
+                seen = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+            with self.lock:
+                if self._poller_stopped():
+                    if seen is None:
+                        # Опросчик остановился, пока мы шли к блокировке.
+                        continue
+                    self._start_poller(seen)
+                if last_id is not None and last_id < self.floor:
+                    subscription.overflowed = True
+                elif last_id is not None:
+                    for message in self.history:
+                        if message.id > last_id:
+                            subscription.offer(message)
+                self.subscribers.add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.discard(subscription)
+
+    def _poller_stopped(self):
+        return bool(settings.SSE_POLL_INTERVAL) and self.poller is None
+
+    def _start_poller(self, seen):
+        # Посты, вышедшие, пока опросчик стоял, никому не разосланы.
+        self.floor = max(self.floor, seen)
+        self.poller = threading.Thread(
+            target=self._poll_loop, args=(seen,), name='sse-poller',
+            daemon=True)
+        self.poller.start()
+
+    def _poll_loop(self, seen):
+        try:
+            while True:
+                with self.lock:
+                    if not self.subscribers:
+                        self.poller = None
+                        return
+                try:
+                    seen = poll(self, seen)
+                except Exception:
+                    logger.exception('Опрос новых постов не удался')
+                time.sleep(settings.SSE_POLL_INTERVAL)
+        finally:
+            connections.close_all()
+
+
+def poll(broadcaster, seen):
+    """Рассылает посты с id больше seen, возвращает новый seen."""
+    rows = Post.objects.filter(pk__gt=seen).order_by('pk').values(
+        'pk', 'author_id', 'author__username', 'group__slug')
+    for row in rows[:settings.SSE_POLL_BATCH]:
+        channels = [GLOBAL, author(row['author_id'])]
+        if row['group__slug']:
+            channels.append(group(row['group__slug']))
+        broadcaster.publish(row['pk'], channels, 'post', {
+            'id': row['pk'],
+            'author': row['author__username'],
+            'group': row['group__slug'],
+        })
+        seen = row['pk']
+    return seen
+
+
+broadcaster = Broadcaster()
@@ -11,6 +11,22 @@ class PostForm(forms.ModelForm):
         fields = ('text', 'group', 'image')
         labels = {'text': _('Text post')}
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        image = self.files.get('image')
+        # Отказ выставил BoundedUploadHandler; такой файл ImageField
+        # разбирать не должен, ошибка добавляется в clean().
+        self.image_error = getattr(image, 'upload_error', None)
+        if self.image_error:
+            self.files = self.files.copy()
+            self.files.pop('image')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.image_error:
+            self.add_error('image', self.image_error)
+        return cleaned_data
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
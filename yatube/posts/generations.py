@@ -0,0 +1,177 @@
+"""Поколения кэша для лент, групп, авторов и постов.
+
+Каждому срезу контента соответствует счётчик поколения в кэше:
+общая лента, группа (по slug), автор, пост и лента подписок
+пользователя. Сигналы моделей увеличивают счётчики затронутых срезов,
+а закэшированные фрагменты, страницы и ETag строят ключи из их текущих
+значений. После изменения старые ключи просто перестают запрашиваться
+и вытесняются по таймауту, поэтому глобальный cache.clear() не нужен.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Follow, Group, Post
+from .paginator import CursorPaginator
+
+GENERATION_KEY = 'posts:generation:{}'
+GLOBAL = 'global'
+
+
+def key(kind, ident=None):
+    """Имя поколения: key('group', 'cats') -> 'group:cats'."""
+    if ident is None:
+        return kind
+    return f'{kind}:{ident}'
+
+
+def group(slug):
+    return key('group', slug)
+
+
+def author(author_id):
+    return key('author', author_id)
+
+
+def post(post_id):
+    return key('post', post_id)
+
+
+def follow(user_id):
+    return key('follow', user_id)
+
+
+def _seed():
+    # Значение — время в микросекундах, а не счётчик с единицы: если
+    # ключ вытеснен из кэша, новое поколение не совпадёт ни с одним
+    # прежним, а по максимуму значений строится Last-Modified.
+    return time.time_ns() // 1000
+
+
+def current(*names):
+    """Текущие значения поколений в порядке имён."""
+    keys = [GENERATION_KEY.format(name) for name in names]
+    found = cache.get_many(keys)
+    missing = {cache_key: _seed() for cache_key in keys
+               if cache_key not in found}
+    if missing:
+        cache.set_many(missing, timeout=settings.GENERATION_TIMEOUT)
+        found.update(missing)
+    return [found[cache_key] for cache_key in keys]
+
+
+def bump(*names):
+    """Начинает новое поколение для каждого из срезов."""
+    if len(names) == 1:
+        cache_key = GENERATION_KEY.format(names[0])
+        value = cache.get(cache_key)
+        if value is not None:
+            try:
+                # incr атомарен, а шаг подтягивает значение к текущему
+                # времени: поколение растёт строго и остаётся временем.
+                cache.incr(cache_key, max(_seed() - value, 1))
+                return
+            except ValueError:
+                pass
+    # Для многих срезов сразу — один set_many со свежим значением,
+    # которое всё равно больше любого прежнего поколения.
+    seed = _seed()
+    cache.set_many(
+        {GENERATION_KEY.format(name): seed for name in names},
+        timeout=settings.GENERATION_TIMEOUT
+    )
+
+
+def token(*names, values=None):
+    """Строка для ключа кэша: имена и значения поколений."""
+    if values is None:
+        values = current(*names)
+    return ';'.join(
+        f'{name}@{value}' for name, value in zip(names, values))
+
+
+def group_slugs(*group_ids):
+    ids = {group_id for group_id in group_ids if group_id is not None}
+    if not ids:
+        return []
+    return list(Group.objects.filter(pk__in=ids).values_list(
+        'slug', flat=True))
+
+
+def page_names(instance, old_group_id=None):
+    """Срезы поста без лент подписчиков: лента, автор, группы, пост."""
+    names = [GLOBAL, author(instance.author_id), post(instance.pk)]
+    if old_group_id is None and instance.group is not None:
+        names.append(group(instance.group.slug))
+    else:
+        names.extend(
+            group(slug)
+            for slug in group_slugs(instance.group_id, old_group_id)
+        )
+    return names
+
+
+def follower_names(*author_ids):
+    """Ленты подписок всех подписчиков авторов, одним запросом."""
+    followers = Follow.objects.filter(
+        author_id__in=author_ids
+    ).order_by().values_list('user_id', flat=True).distinct()
+    return [follow(user_id) for user_id in followers.iterator()]
+
+
+def post_names(instance, old_group_id=None):
+    """Срезы, в которых виден пост, включая ленты подписчиков автора."""
+    return (page_names(instance, old_group_id)
+            + follower_names(instance.author_id))
+
+
+def batch_names(posts, followers=True):
+    """Срезы, в которых видны новые посты пакета, без повторов.
+
+    Подписчики всех авторов пакета выбираются одним запросом; без
+    followers их ленты оставлены задаче раскладки posts.fan_out.
+    """
+    author_ids = {post.author_id for post in posts}
+    names = [GLOBAL]
+    names.extend(author(author_id) for author_id in author_ids)
+    names.extend(post(instance.pk) for instance in posts)
+    names.extend(
+        group(slug)
+        for slug in group_slugs(*(instance.group_id for instance in posts))
+    )
+    if followers:
+        names.extend(follower_names(*author_ids))
+    return names
+
+
+def fragment_key(request, *names):
+    """Часть ключа {% cache %}: курсор ленты и поколения её срезов.
+
+    Номер страницы в ключ не входит: шаблон добавляет page_obj.number,
+    уже приведённый пагинатором к существующей странице. Курсор
+    кодируется заново; некорректный даёт ключ первой страницы —
+    её get_page и показывает.
+    """
+    if 'cursor' in request.GET:
+        cursor = CursorPaginator(Post.objects.none(), 1).canonical_cursor(
+            request.GET['cursor'])
+        page = 'cursor=' + (cursor or '')
+    else:
+        page = 'page'
+    return f'{page}:{token(*names)}'
+
+
+def fragment_settings():
+    """Таймаут и алиас кэша для {% cache ... using=feed_cache_alias %}."""
+    return {
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'feed_cache_alias': settings.FRAGMENT_CACHE_ALIAS,
+    }
+
+
+def fragment_context(request, *names):
+    return {
+        'feed_cache_key': fragment_key(request, *names),
+        **fragment_settings(),
+    }
@@ -0,0 +1,111 @@
+"""Server-Sent Events: новые посты для открытых страниц лент.
+
+Вкладка с главной, группой или лентой подписок держит одно соединение
+EventSource и получает по нему только id новых постов, а не
+перезапрашивает страницу целиком. Каналы берутся из posts.events: все
+посты, посты группы или посты авторов, на которых подписан
+пользователь (список подписок читается один раз при подключении).
+
+Поток начинается с retry — через сколько миллисекунд браузеру
+переподключаться, — затем идут события post, а в тишине раз в
+SSE_HEARTBEAT секунд комментарий-пинг, чтобы прокси не закрыли
+соединение. Через SSE_MAX_DURATION секунд поток заканчивается, браузер
+переподключается с Last-Event-ID и получает пропущенное. Если клиент
+отстал и его очередь переполнилась, приходит reset: пропуски уже не
+восстановить, страницу нужно перезагрузить.
+
+Под WSGI каждое соединение занимает поток воркера на всё время
+потока, а браузер переподключается бесконечно. Поэтому поток включён
+только под ASGI (core.asgi) или с SSE_ENABLED; иначе страницы не
+подключаются к нему, а адреса потоков отвечают 404 — на ошибку
+EventSource больше не переподключается.
+"""
+import functools
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+
+from . import events
+from .models import Follow, Group
+
+
+def enabled(request):
+    """Подключать ли страницу к потоку событий."""
+    return settings.SSE_ENABLED or 'asgi.version' in request.META
+
+
+def _live_only(view):
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not enabled(request):
+            raise Http404('Поток событий отключён')
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _last_id(request):
+    try:
+        return int(request.META.get('HTTP_LAST_EVENT_ID', ''))
+    except ValueError:
+        return None
+
+
+def _format(message):
+    data = json.dumps(message.data, ensure_ascii=False)
+    return f'id: {message.id}\nevent: {message.event}\ndata: {data}\n\n'
+
+
+def _stream(subscription):
+    deadline = time.monotonic() + settings.SSE_MAX_DURATION
+    try:
+        yield f'retry: {settings.SSE_RETRY}\n\n'
+        while True:
+            if subscription.overflowed:
+                yield 'event: reset\ndata: {}\n\n'
+                return
+            remaining = deadline - time.monotonic()
+            message = subscription.get(
+                min(settings.SSE_HEARTBEAT, remaining))
+            if message is not None:
+                yield _format(message)
+            elif remaining <= 0:
+                return
+            else:
+                yield ': ping\n\n'
+    finally:
+        subscription.close()
+
+
+def _response(request, channels):
+    subscription = events.broadcaster.subscribe(
+        channels, last_id=_last_id(request))
+    response = StreamingHttpResponse(
+        _stream(subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx иначе копит ответ в буфере и события приходят пачками.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@_live_only
+def index_events(request):
+    return _response(request, [events.GLOBAL])
+
+
+@_live_only
+def group_events(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _response(request, [events.group(group.slug)])
+
+
+@login_required
+@_live_only
+def follow_events(request):
+    author_ids = Follow.objects.filter(
+        user=request.user).values_list('author_id', flat=True)
+    return _response(request, [
+        events.author(author_id) for author_id in author_ids])
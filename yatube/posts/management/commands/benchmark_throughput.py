@@ -0,0 +1,52 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность WSGI и ASGI на лентах и '
+            'странице поста при высокой конкурентности.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=500,
+            help='Сколько запросов отправлять на каждый адрес'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=100,
+            help='Сколько запросов выполняется одновременно'
+        )
+        parser.add_argument(
+            '--output', default=os.path.join(settings.BASE_DIR, '.benchmarks'),
+            help='Каталог для файлов с результатами'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError(
+                '--requests и --concurrency должны быть положительными')
+        current = benchmark.throughput(
+            options['requests'], options['concurrency'])
+        if not current or not current['results']:
+            raise CommandError('В базе нет постов: запустите generate_data')
+        for name, result in current['results'].items():
+            for path in ('wsgi', 'asgi'):
+                self.stdout.write(
+                    '{name} {path}: {rps} запросов/с, p50 {p50} мс, '
+                    'p99 {p99} мс, ошибок {errors}'.format(
+                        name=name, path=path, **result[path])
+                )
+        os.makedirs(options['output'], exist_ok=True)
+        path = os.path.join(
+            options['output'],
+            'throughput-{}-{}.json'.format(
+                current['created'][:19].replace(':', ''),
+                current['revision'])
+        )
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(current, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты сохранены в {path}')
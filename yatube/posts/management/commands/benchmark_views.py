@@ -0,0 +1,58 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Замеряет задержку и число запросов видов posts.urls и '
+            'сохраняет результаты для сравнения между коммитами.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Сколько раз запрашивать каждый адрес'
+        )
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кэши перед каждым запросом'
+        )
+        parser.add_argument(
+            '--output', default=os.path.join(settings.BASE_DIR, '.benchmarks'),
+            help='Каталог для файлов с результатами'
+        )
+        parser.add_argument(
+            '--compare', metavar='FILE',
+            help='Сравнить с результатами из файла'
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat должен быть положительным')
+        current = benchmark.run(options['repeat'], options['cold'])
+        if not current['results']:
+            raise CommandError('В базе нет постов: запустите generate_data')
+        for name, result in current['results'].items():
+            self.stdout.write(
+                '{name}: p50 {p50} мс, p90 {p90} мс, p99 {p99} мс, '
+                'запросов {queries}, статус {status}'.format(
+                    name=name, **result)
+            )
+        os.makedirs(options['output'], exist_ok=True)
+        path = os.path.join(
+            options['output'],
+            '{}-{}.json'.format(
+                current['created'][:19].replace(':', ''),
+                current['revision'])
+        )
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(current, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'Результаты сохранены в {path}')
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)
+            for line in benchmark.compare(current, previous):
+                self.stdout.write(line)
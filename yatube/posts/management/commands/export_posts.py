@@ -0,0 +1,31 @@
+import gzip
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Выгружает пользователей, группы, посты, комментарии и '
+            'подписки в NDJSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл (.gz — со сжатием); по умолчанию stdout'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк читать из базы за раз'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if path == '-':
+            written = transfer.dump(self.stdout, options['batch_size'])
+            self.stderr.write(f'Выгружено объектов: {written}')
+            return
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'wt', encoding='utf-8') as stream:
+            written = transfer.dump(stream, options['batch_size'])
+        self.stdout.write(f'Выгружено объектов: {written}')
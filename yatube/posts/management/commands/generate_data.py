@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+from posts.dataset import Dataset
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками с перекосом по Ципфу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=5000)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько дней распределить даты постов'
+        )
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель закона Ципфа: чем больше, тем сильнее перекос'
+        )
+        parser.add_argument(
+            '--scale', type=float, default=1,
+            help='Множитель для всех количеств'
+        )
+        parser.add_argument('--seed', type=int, default=None)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        scale = options['scale']
+        counts = {
+            name: int(options[name] * scale)
+            for name in ('users', 'groups', 'posts', 'comments', 'follows')
+        }
+        dataset = Dataset(
+            days=options['days'], exponent=options['skew'],
+            seed=options['seed'], **counts
+        )
+        importer = transfer.load_records(
+            dataset.records(), options['batch_size'])
+        for label, count in importer.counts.items():
+            self.stdout.write(f'{label}: {count}')
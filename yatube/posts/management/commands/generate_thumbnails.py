@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры и варианты картинок постов, где их ещё нет.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Перестроить миниатюры всех постов с картинками'
+        )
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image='').only(
+            'image', 'thumbnails', 'image_variants')
+        generated = 0
+        for post in posts.iterator():
+            ready = post.ready_thumbnails and post.ready_variants
+            if options['all'] or not ready:
+                thumbnails.generate(post.pk, reuse=not options['all'])
+                generated += 1
+        self.stdout.write(f'Миниатюры построены для постов: {generated}')
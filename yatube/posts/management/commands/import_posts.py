@@ -0,0 +1,36 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Загружает NDJSON, выгруженный export_posts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл (.gz — со сжатием) или - для stdin'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько объектов вставлять одной порцией'
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            if path == '-':
+                importer = transfer.load(sys.stdin, options['batch_size'])
+            else:
+                opener = gzip.open if path.endswith('.gz') else open
+                with opener(path, 'rt', encoding='utf-8') as stream:
+                    importer = transfer.load(stream, options['batch_size'])
+        except (OSError, ValueError) as error:
+            raise CommandError(error)
+        for label, count in importer.counts.items():
+            self.stdout.write(f'{label}: {count}')
+        if importer.skipped:
+            self.stdout.write(
+                f'Пропущено без автора или поста: {importer.skipped}')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Переиндексирует все посты для текущего SEARCH_BACKEND.'
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild()
+        backend = 'FTS5' if search.uses_fts() else 'SearchTerm'
+        self.stdout.write(f'Проиндексировано постов ({backend}): {indexed}')
@@ -0,0 +1,98 @@
+"""Кэш целых страниц для анонимных посетителей.
+
+Middleware стоит сразу после SecurityMiddleware. Анонимный GET без
+cookie сессии ищется в кэше по полному адресу; запись хранит ответ вместе с
+именами и значениями поколений, с которыми он был построен (их считает
+generation_condition вида). Если поколения не изменились, ответ
+отдаётся сразу — без сессий, аутентификации, CSRF, debug toolbar,
+запросов к базе и шаблонов, а совпавший If-None-Match получает 304.
+
+Cache-Control у таких ответов публичный: reverse proxy может держать
+страницу ANONYMOUS_PAGE_EDGE_TTL секунд и затем перепроверять её по
+ETag. Vary: Cookie не даёт прокси отдать анонимную копию вошедшему
+пользователю. При DEBUG страницы не сохраняются: в них встроен debug
+toolbar. Не кладутся и ответы на некорректные ?page= и ?cursor=.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import parse_http_date_safe
+
+from . import generations
+from .conditional import generation_state
+from .paginator import invalid_page
+
+PAGE_KEY = 'posts:page:{}'
+
+
+def _page_key(request):
+    # Схема и хост входят в ключ: в страницах и ответах API есть
+    # абсолютные адреса, чужой хост получил бы ссылки не на себя.
+    url = request.build_absolute_uri().encode()
+    return PAGE_KEY.format(hashlib.md5(url).hexdigest())
+
+
+def _anonymous_get(request):
+    return (
+        request.method in ('GET', 'HEAD')
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+    )
+
+
+class AnonymousPageCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cache = caches[settings.ANONYMOUS_PAGE_CACHE_ALIAS]
+
+    def __call__(self, request):
+        if not _anonymous_get(request):
+            return self.get_response(request)
+        response = self.cached_response(request)
+        if response is not None:
+            return response
+        response = self.get_response(request)
+        self.store(request, response)
+        return response
+
+    def cached_response(self, request):
+        entry = self.cache.get(_page_key(request))
+        if entry is None:
+            return None
+        names, values, response = entry
+        if generations.current(*names) != values:
+            return None
+        response['X-Page-Cache'] = 'hit'
+        return get_conditional_response(
+            request,
+            etag=response.get('ETag'),
+            last_modified=parse_http_date_safe(
+                response.get('Last-Modified', '')),
+            response=response
+        )
+
+    def store(self, request, response):
+        state = generation_state(request)
+        user = getattr(request, 'user', None)
+        if (settings.DEBUG or state is None or not state[0]
+                or response.status_code != 200
+                or response.streaming
+                or response.cookies
+                or invalid_page(request)
+                or user is None or user.is_authenticated):
+            return
+        names, values = state
+        # Заголовок заменяется целиком: private, no-cache от
+        # generation_condition запретили бы прокси держать страницу.
+        response['Cache-Control'] = (
+            'public, max-age=0, '
+            f's-maxage={settings.ANONYMOUS_PAGE_EDGE_TTL}, must-revalidate'
+        )
+        patch_vary_headers(response, ('Cookie',))
+        response['X-Page-Cache'] = 'miss'
+        self.cache.set(
+            _page_key(request),
+            (names, values, response),
+            settings.ANONYMOUS_PAGE_CACHE_TIMEOUT
+        )
@@ -0,0 +1,76 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:34
+
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.utils import OperationalError
+import django.db.models.deletion
+
+FTS_TABLE = 'posts_post_fts'
+
+
+def create_fts_table(schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    try:
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+            f'USING fts5(text)'
+        )
+    except OperationalError:
+        return False
+    return True
+
+
+def build_index(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    # Таблица FTS создаётся всегда, чтобы 'auto' мог её выбрать, но
+    # заполняется индекс того бэкенда, что настроен сейчас.
+    fts = create_fts_table(schema_editor)
+    if fts and getattr(settings, 'SEARCH_BACKEND', 'auto') != 'python':
+        schema_editor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) '
+            f'SELECT id, text FROM posts_post'
+        )
+        return
+    for post_id, text in Post.objects.values_list('id', 'text').iterator():
+        terms = Counter(
+            word[:64] for word in re.findall(r'\w+', text.lower())
+            if len(word) > 1
+        )
+        SearchTerm.objects.bulk_create([
+            SearchTerm(term=term, post_id=post_id, frequency=frequency)
+            for term, frequency in terms.items()
+        ])
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('frequency', models.PositiveIntegerField(default=1)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='searchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_search_term'),
+        ),
+        migrations.RunPython(build_index, drop_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:40
+
+import core.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0012_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_variants',
+            field=core.fields.JSONTextField(blank=True, default=dict, editable=False, verbose_name='Варианты картинки'),
+        ),
+    ]
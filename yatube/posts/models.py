@@ -2,6 +2,9 @@ from django.db import models
 from django.contrib.auth import get_user_model
 from django.db.models.constraints import UniqueConstraint
 
+from core.fields import JSONTextField
+from .storage import post_images
+
 User = get_user_model()
 Group = ''
 
@@ -10,11 +13,24 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
 
     def __str__(self):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def feed(self):
+        """Посты для лент и страницы поста: автор и группа одним JOIN."""
+        return self.select_related('author', 'group').only(
+            'text', 'pub_date', 'image', 'thumbnails', 'image_variants',
+            'comments_count',
+            'author', 'author__username',
+            'author__first_name', 'author__last_name',
+            'group', 'group__title', 'group__slug',
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
@@ -41,17 +57,83 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        storage=post_images,
+        blank=True,
+        db_index=True
+    )
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0
     )
+    thumbnails = JSONTextField(
+        'Миниатюры',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+    image_variants = JSONTextField(
+        'Варианты картинки',
+        default=dict,
+        blank=True,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
-        ordering = ['-pub_date']
+        ordering = ['-pub_date', '-id']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Каждая лента фильтрует по одному полю и сортирует по дате:
+        # индекс отдаёт страницу без сортировки всей таблицы.
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def ready_thumbnails(self):
+        """Готовые миниатюры текущей картинки: {'feed': {'url': ...}}."""
+        if not self.image or self.thumbnails.get('source') != self.image.name:
+            return {}
+        return self.thumbnails.get('sizes', {})
+
+    @property
+    def ready_variants(self):
+        """Манифест вариантов текущей картинки для <picture>."""
+        if (not self.image
+                or self.image_variants.get('source') != self.image.name):
+            return {}
+        return self.image_variants
+
+
+class CommentQuerySet(models.QuerySet):
+    def thread(self, post_id, parent_id=None):
+        """Комментарии к посту (parent_id=None) или ответы на комментарий.
+
+        Фильтр по post и parent совпадает с началом comment_thread_idx,
+        так что страница читается по индексу в порядке created, id.
+        """
+        return self.filter(
+            post_id=post_id, parent_id=parent_id
+        ).select_related('author').only(
+            'text', 'created', 'post', 'parent', 'replies_count',
+            'author', 'author__username',
+        )
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -59,6 +141,14 @@ class Comment(models.Model):
         on_delete=models.CASCADE,
         related_name='comments'
     )
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name='replies',
+        verbose_name='Ответ на'
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -72,6 +162,25 @@ class Comment(models.Model):
         'date_created',
         auto_now_add=True
     )
+    replies_count = models.PositiveIntegerField(
+        'Число ответов',
+        default=0
+    )
+
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+            models.Index(
+                fields=['post', 'parent', 'created', 'id'],
+                name='comment_thread_idx'
+            ),
+        ]
 
 
 class Follow(models.Model):
@@ -87,4 +196,144 @@ class Follow(models.Model):
     )
 
     class Meta:
-        UniqueConstraint(fields=['user', 'author'], name='unique_follower')
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follower'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0
+    )
+    following_count = models.PositiveIntegerField(
+        'Число подписок',
+        default=0
+    )
+    unread_notifications = models.PositiveIntegerField(
+        'Непрочитанных уведомлений',
+        default=0
+    )
+
+    def __str__(self):
+        return f'Счётчики {self.user}'
+
+
+class Notification(models.Model):
+    """Уведомление пользователя; серия однородных событий — одна строка.
+
+    Пока уведомление не прочитано, новые события того же вида
+    увеличивают count: новые посты — по автору (actor), комментарии —
+    по посту. Частичные уникальные ограничения держат не больше одной
+    непрочитанной строки на ключ.
+    """
+    POST = 1
+    COMMENT = 2
+    KINDS = (
+        (POST, 'Новые посты автора'),
+        (COMMENT, 'Комментарии к посту'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications'
+    )
+    kind = models.PositiveSmallIntegerField('Вид', choices=KINDS)
+    actor = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Последний автор'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Последний пост'
+    )
+    count = models.PositiveIntegerField('Событий', default=1)
+    is_read = models.BooleanField('Прочитано', default=False)
+    updated = models.DateTimeField('Последнее событие')
+
+    class Meta:
+        ordering = ['-updated', '-id']
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'actor'],
+                condition=models.Q(kind=1, is_read=False),
+                name='unique_unread_post_notification'
+            ),
+            UniqueConstraint(
+                fields=['user', 'post'],
+                condition=models.Q(kind=2, is_read=False),
+                name='unique_unread_comment_notification'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-updated', '-id'],
+                name='notification_user_updated_idx'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост автора у подписчика."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-pub_date']
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            # Порядок страницы ленты целиком: срез без сортировки.
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_feed_idx'
+            ),
+        ]
+
+
+class SearchTerm(models.Model):
+    """Инвертированный индекс постов для баз без SQLite FTS5."""
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms'
+    )
+    frequency = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['term', 'post'],
+                name='unique_search_term'
+            ),
+        ]
@@ -0,0 +1,141 @@
+"""Уведомления о новых постах авторов из подписок и о комментариях к
+своим постам.
+
+Строка уведомления компактна: получатель, вид, последний автор и пост,
+число событий. Пока уведомление не прочитано, события того же вида
+сливаются в него: серия постов автора или обсуждение под постом дают
+одну строку с растущим count, а не сотни строк. Число непрочитанных
+строк хранится в UserStats.unread_notifications и читается одним
+запросом по первичному ключу, без COUNT(*).
+
+Создаются уведомления задачами очереди (см. tasks). На автора пакета
+уходит один UPDATE уже непрочитанных строк подписчиков и вставка
+порциями для остальных, без запроса на каждого подписчика.
+"""
+from itertools import groupby
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from . import counters
+from .models import Follow, Notification, Post, UserStats
+
+
+def _insert(kind, user_ids, actor_id, post_id, number, updated):
+    # Параллельная вставка той же непрочитанной строки молча пропускается
+    # ignore_conflicts, поэтому счётчик не прибавляется, а пересчитывается.
+    Notification.objects.bulk_create([
+        Notification(
+            user_id=user_id, kind=kind, actor_id=actor_id, post_id=post_id,
+            count=number, updated=updated
+        )
+        for user_id in user_ids
+    ], ignore_conflicts=True)
+    counters.recount_unread(user_ids)
+
+
+def posts_published(posts):
+    """Уведомляет подписчиков авторов о новых постах."""
+    by_author = attrgetter('author_id')
+    for author_id, author_posts in groupby(sorted(posts, key=by_author),
+                                           key=by_author):
+        author_posts = list(author_posts)
+        latest = max(author_posts, key=attrgetter('pub_date', 'pk'))
+        followers = Follow.objects.filter(
+            author_id=author_id).values_list('user_id', flat=True)
+        unread = Notification.objects.filter(
+            kind=Notification.POST, actor_id=author_id, is_read=False)
+        unread.filter(user_id__in=followers).update(
+            count=F('count') + len(author_posts),
+            post_id=latest.pk,
+            updated=latest.pub_date
+        )
+        fresh = followers.exclude(user_id__in=unread.values('user_id'))
+        batch = []
+        for user_id in fresh.iterator():
+            batch.append(user_id)
+            if len(batch) >= settings.NOTIFICATION_BATCH_SIZE:
+                _insert(Notification.POST, batch, author_id, latest.pk,
+                        len(author_posts), latest.pub_date)
+                batch = []
+        if batch:
+            _insert(Notification.POST, batch, author_id, latest.pk,
+                    len(author_posts), latest.pub_date)
+
+
+def comments_added(comments):
+    """Уведомляет авторов постов о чужих комментариях к ним."""
+    authors = dict(Post.objects.filter(
+        pk__in={comment.post_id for comment in comments}
+    ).values_list('pk', 'author_id'))
+    by_post = attrgetter('post_id')
+    for post_id, post_comments in groupby(sorted(comments, key=by_post),
+                                          key=by_post):
+        author_id = authors.get(post_id)
+        post_comments = [
+            comment for comment in post_comments
+            if comment.author_id != author_id
+        ]
+        if author_id is None or not post_comments:
+            continue
+        latest = max(post_comments, key=attrgetter('created', 'pk'))
+        updated = Notification.objects.filter(
+            kind=Notification.COMMENT, user_id=author_id, post_id=post_id,
+            is_read=False
+        ).update(
+            count=F('count') + len(post_comments),
+            actor_id=latest.author_id,
+            updated=latest.created
+        )
+        if not updated:
+            _insert(Notification.COMMENT, [author_id], latest.author_id,
+                    post_id, len(post_comments), latest.created)
+
+
+def post_removed(post):
+    """Готовит уведомления к удалению поста.
+
+    Серия постов автора переходит на его предыдущий пост и теряет одно
+    событие, а не удаляется вместе с последним постом. Остальные
+    уведомления поста удаляются каскадом: здесь уменьшаются счётчики.
+    """
+    previous = Post.objects.filter(author_id=post.author_id).exclude(
+        pk=post.pk).order_by('-pub_date', '-id').first()
+    if previous is not None:
+        Notification.objects.filter(
+            kind=Notification.POST, post_id=post.pk, count__gt=1
+        ).update(
+            count=F('count') - 1,
+            post_id=previous.pk,
+            updated=previous.pub_date
+        )
+    user_ids = Notification.objects.filter(
+        post_id=post.pk, is_read=False).values_list('user_id', flat=True)
+    counters.notifications_created(list(user_ids), sign=-1)
+
+
+def unread_count(user):
+    return UserStats.objects.filter(user_id=user.pk).values_list(
+        'unread_notifications', flat=True).first() or 0
+
+
+def inbox(user):
+    return Notification.objects.filter(user=user).select_related(
+        'actor', 'post'
+    ).only(
+        'kind', 'count', 'is_read', 'updated', 'user',
+        'actor', 'actor__username', 'actor__first_name', 'actor__last_name',
+        'post', 'post__text',
+    )
+
+
+def mark_read(user, ids):
+    """Отмечает уведомления прочитанными, возвращает их число."""
+    with transaction.atomic():
+        number = Notification.objects.filter(
+            user=user, pk__in=ids, is_read=False).update(is_read=True)
+        if number:
+            counters.notifications_read(user.pk, number)
+    return number
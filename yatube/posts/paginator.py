@@ -0,0 +1,221 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по упорядоченному набору полей.
+
+    Вместо OFFSET/LIMIT страница выбирается условием по ключу
+    последней (или первой) записи предыдущей страницы, поэтому
+    стоимость запроса не зависит от глубины. COUNT(*) выполняется,
+    только если явно передан with_count=True.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-id'), with_count=False):
+        super().__init__(object_list.order_by(*ordering), per_page)
+        self.ordering = tuple(ordering)
+        self.with_count = with_count
+
+    @cached_property
+    def count(self):
+        if not self.with_count:
+            return None
+        return super().count
+
+    @cached_property
+    def num_pages(self):
+        if not self.with_count:
+            return None
+        return super().num_pages
+
+    @property
+    def page_range(self):
+        return range(0)
+
+    @property
+    def _fields(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def encode_cursor(self, obj, direction):
+        # isoformat() вместо DjangoJSONEncoder: тот обрезает микросекунды,
+        # и курсор перестаёт точно указывать на запись.
+        # obj — модель или строка values() из JSON API.
+        return self._encode(direction, [
+            obj[name] if isinstance(obj, dict) else getattr(obj, name)
+            for name in self._fields
+        ])
+
+    def _encode(self, direction, values):
+        values = [
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in values
+        ]
+        data = json.dumps([direction, values])
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def canonical_cursor(self, cursor):
+        """Курсор для ключа кэша: заново закодированный или None.
+
+        Разные записи одного ключа дают одну строку; некорректный
+        курсор — None, такая страница в кэш не кладётся.
+        """
+        if not cursor:
+            return ''
+        try:
+            return self._encode(*self.decode_cursor(cursor))
+        except InvalidCursor:
+            return None
+
+    def decode_cursor(self, cursor):
+        try:
+            data = base64.urlsafe_b64decode(cursor.encode())
+            direction, raw_values = json.loads(data.decode())
+            if direction not in (NEXT, PREVIOUS):
+                raise ValueError(direction)
+            if len(raw_values) != len(self.ordering):
+                raise ValueError(raw_values)
+            # null, списки и объекты не годятся для сравнения в _seek.
+            if not all(type(value) in (str, int, float)
+                       for value in raw_values):
+                raise ValueError(raw_values)
+            model = self.object_list.model
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self._fields, raw_values)
+            ]
+        except (TypeError, ValueError, UnicodeError,
+                binascii.Error, ValidationError):
+            raise InvalidCursor('Некорректный курсор')
+        return direction, values
+
+    def _seek(self, values, direction):
+        """Условие «строго после ключа» в выбранном направлении."""
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            field = name.lstrip('-')
+            descending = name.startswith('-')
+            if direction == PREVIOUS:
+                descending = not descending
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{field}__{lookup}': value})
+            equal[field] = value
+        return condition
+
+    def _reversed_ordering(self):
+        return [
+            name[1:] if name.startswith('-') else f'-{name}'
+            for name in self.ordering
+        ]
+
+    def page(self, cursor):
+        if not cursor:
+            direction, queryset = NEXT, self.object_list
+        else:
+            direction, values = self.decode_cursor(cursor)
+            queryset = self.object_list.filter(self._seek(values, direction))
+            if direction == PREVIOUS:
+                queryset = queryset.order_by(*self._reversed_ordering())
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, bool(cursor)
+        return CursorPage(rows, self, has_next, has_previous)
+
+    def get_page(self, cursor):
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page(None)
+
+
+class CursorPage(Page):
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self._has_next and bool(self.object_list)
+
+    def has_previous(self):
+        return self._has_previous and bool(self.object_list)
+
+    @property
+    def next_cursor(self):
+        if not self.has_next():
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], NEXT)
+
+    @property
+    def previous_cursor(self):
+        if not self.has_previous():
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], PREVIOUS)
+
+    def next_page_number(self):
+        raise InvalidPage('Курсорная страница не имеет номера')
+
+    def previous_page_number(self):
+        raise InvalidPage('Курсорная страница не имеет номера')
+
+    def start_index(self):
+        return None
+
+    def end_index(self):
+        return None
+
+
+def mark_invalid(request):
+    request._invalid_page = True
+
+
+def invalid_page(request):
+    """Запрошена некорректная страница: ответ не кладётся в кэш страниц.
+
+    Иначе каждый мусорный ?page= или ?cursor= заводил бы свою запись.
+    """
+    return getattr(request, '_invalid_page', False)
+
+
+def get_page(request, object_list, per_page, **cursor_options):
+    """Страница ленты: курсорная при ?cursor=, иначе номерная ?page=N.
+
+    Некорректное значение даёт первую (или последнюю существующую)
+    страницу и помечает запрос через mark_invalid.
+    """
+    cursor = request.GET.get('cursor')
+    if cursor is not None:
+        paginator = CursorPaginator(object_list, per_page, **cursor_options)
+        try:
+            return paginator.page(cursor)
+        except InvalidCursor:
+            mark_invalid(request)
+            return paginator.page(None)
+    number = request.GET.get('page')
+    page = Paginator(object_list, per_page).get_page(number)
+    if number is not None and number != str(page.number):
+        mark_invalid(request)
+    return page
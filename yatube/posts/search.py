@@ -0,0 +1,199 @@
+"""Полнотекстовый поиск по постам.
+
+На SQLite с FTS5 посты индексируются в виртуальной таблице
+posts_post_fts (rowid = id поста) и ранжируются по bm25. На других
+базах используется инвертированный индекс SearchTerm: термы поста с
+частотами, ранг — сумма частот, взвешенных редкостью терма. Индекс
+обновляется сигналами при сохранении и удалении поста, поэтому время
+поиска не растёт вместе с таблицей Post так, как LIKE '%...%'.
+
+Сигналы пишут только в индекс текущего бэкенда. После смены
+SEARCH_BACKEND индекс заполняет manage.py rebuild_search_index, а
+процессы нужно перезапустить: выбор 'auto' запоминается при первом
+поиске.
+"""
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+
+from .models import Post, SearchTerm
+
+FTS_TABLE = 'posts_post_fts'
+TERM_MAX_LENGTH = SearchTerm._meta.get_field('term').max_length
+WORD_RE = re.compile(r'\w+')
+# Два параметра на строку: в пределах лимита переменных старых SQLite.
+FTS_BATCH_SIZE = 400
+
+_fts_available = None
+
+
+def tokenize(text):
+    return [
+        word[:TERM_MAX_LENGTH]
+        for word in WORD_RE.findall(text.lower())
+        if len(word) > 1
+    ]
+
+
+def uses_fts():
+    global _fts_available
+    backend = getattr(settings, 'SEARCH_BACKEND', 'auto')
+    if backend != 'auto':
+        return backend == 'fts5'
+    if _fts_available is None:
+        _fts_available = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available
+
+
+def index_post(post):
+    index_posts([post])
+
+
+def index_posts(posts):
+    """Индексирует пакет постов: по запросу на порцию FTS_BATCH_SIZE.
+
+    Многострочный VALUES вместо executemany: executemany не умеют
+    обёртки курсора вроде SQL-панели debug toolbar.
+    """
+    if not posts:
+        return
+    ids = [post.pk for post in posts]
+    if uses_fts():
+        with connection.cursor() as cursor:
+            for start in range(0, len(posts), FTS_BATCH_SIZE):
+                batch = posts[start:start + FTS_BATCH_SIZE]
+                marks = ', '.join(['%s'] * len(batch))
+                cursor.execute(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({marks})',
+                    [post.pk for post in batch]
+                )
+                rows = ', '.join(['(%s, %s)'] * len(batch))
+                cursor.execute(
+                    f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES {rows}',
+                    [value for post in batch for value in (post.pk, post.text)]
+                )
+        return
+    SearchTerm.objects.filter(post_id__in=ids).delete()
+    SearchTerm.objects.bulk_create([
+        SearchTerm(term=term, post_id=post.pk, frequency=frequency)
+        for post in posts
+        for term, frequency in Counter(tokenize(post.text)).items()
+    ])
+
+
+def unindex_post(post_id):
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+    # Термы запасного индекса удаляются каскадом вместе с постом.
+
+
+def rebuild(batch_size=FTS_BATCH_SIZE):
+    """Индексирует все посты заново для текущего бэкенда."""
+    if uses_fts():
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    else:
+        SearchTerm.objects.all().delete()
+    indexed = last_id = 0
+    while True:
+        posts = list(Post.objects.filter(pk__gt=last_id).order_by(
+            'pk').only('text')[:batch_size])
+        if not posts:
+            return indexed
+        index_posts(posts)
+        indexed += len(posts)
+        last_id = posts[-1].pk
+
+
+class SearchResults:
+    """Ленивый список найденных постов в порядке ранга для Paginator."""
+
+    def __init__(self, query):
+        self.terms = list(dict.fromkeys(tokenize(query)))
+        self._count = None
+
+    def _fts_match(self):
+        return ' '.join('"{}"'.format(term) for term in self.terms)
+
+    def _ranked_terms(self):
+        frequencies = dict(
+            SearchTerm.objects.filter(term__in=self.terms)
+            .values_list('term')
+            .annotate(documents=Count('id'))
+        )
+        if len(frequencies) < len(self.terms):
+            return SearchTerm.objects.none()
+        weight = Case(
+            *[When(term=term, then=Value(1.0 / documents))
+              for term, documents in frequencies.items()],
+            output_field=FloatField()
+        )
+        return (
+            SearchTerm.objects.filter(term__in=self.terms)
+            .values('post_id')
+            .annotate(
+                matched=Count('term'),
+                score=Sum(F('frequency') * weight, output_field=FloatField())
+            )
+            .filter(matched=len(self.terms))
+            .order_by('-score', '-post_id')
+        )
+
+    def count(self):
+        if self._count is None:
+            self._count = self._fetch_count()
+        return self._count
+
+    def _fetch_count(self):
+        if not self.terms:
+            return 0
+        if uses_fts():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                    f'WHERE {FTS_TABLE} MATCH %s',
+                    [self._fts_match()]
+                )
+                return cursor.fetchone()[0]
+        return self._ranked_terms().count()
+
+    def __len__(self):
+        return self.count()
+
+    def _ids(self, offset, limit):
+        if uses_fts():
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT rowid FROM {FTS_TABLE} '
+                    f'WHERE {FTS_TABLE} MATCH %s '
+                    f'ORDER BY rank LIMIT %s OFFSET %s',
+                    [self._fts_match(), limit, offset]
+                )
+                return [row[0] for row in cursor.fetchall()]
+        return list(
+            self._ranked_terms()
+            .values_list('post_id', flat=True)[offset:offset + limit]
+        )
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.terms:
+            return []
+        start = index.start or 0
+        stop = self.count() if index.stop is None else index.stop
+        ids = self._ids(start, max(stop - start, 0))
+        posts = Post.objects.feed().in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def search(query):
+    return SearchResults(query)
@@ -0,0 +1,139 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (post_delete, post_init, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from . import generations, notifications, tasks, thumbnails
+from .models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_init, sender=Post)
+def remember_loaded_values(sender, instance, **kwargs):
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+    # Имя файла из базы; у нового поста с загрузкой прежней картинки нет.
+    image = instance.__dict__.get('image')
+    instance._loaded_image = image if isinstance(image, str) else ''
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, update_fields=None,
+               **kwargs):
+    if raw:
+        return
+    old_group_id = None
+    if created:
+        tasks.count('post', instance)
+        tasks.fan_out(instance.pk)
+        tasks.notify_post(instance.pk)
+    else:
+        if instance.group_id != instance._loaded_group_id:
+            old_group_id = instance._loaded_group_id
+            if old_group_id is not None:
+                tasks.count(
+                    'group_post', Post(group_id=old_group_id), sign=-1)
+            if instance.group_id is not None:
+                tasks.count('group_post', instance)
+        tasks.refresh_followers(instance.author_id)
+    generations.bump(*generations.page_names(instance, old_group_id))
+    tasks.index(instance.pk)
+    image_saved = update_fields is None or 'image' in update_fields
+    image_changed = (
+        image_saved and instance.image.name != instance._loaded_image)
+    if image_changed and instance.image:
+        thumbnails.schedule(instance)
+    if image_changed and instance._loaded_image:
+        thumbnails.release_later(instance._loaded_image)
+    instance._loaded_group_id = instance.group_id
+    if image_saved:
+        instance._loaded_image = instance.image.name
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    notifications.post_removed(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    tasks.count('post', instance, sign=-1)
+    generations.bump(*generations.page_names(instance))
+    tasks.refresh_followers(instance.author_id)
+    tasks.index(instance.pk)
+    if instance.image:
+        thumbnails.release_later(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        tasks.count('comment', instance)
+        tasks.notify_comment(instance.pk)
+    generations.bump(generations.post(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    tasks.count('comment', instance, sign=-1)
+    generations.bump(generations.post(instance.post_id))
+
+
+def _follow_names(follow):
+    return [
+        generations.follow(follow.user_id),
+        generations.author(follow.author_id),
+        generations.author(follow.user_id),
+    ]
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        tasks.count('follow', instance)
+        tasks.sync_timeline(instance)
+        generations.bump(*_follow_names(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    tasks.count('follow', instance, sign=-1)
+    tasks.sync_timeline(instance)
+    generations.bump(*_follow_names(instance))
+
+
+@receiver(post_init, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    instance._loaded_slug = instance.__dict__.get('slug')
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    slugs = {instance.slug, instance._loaded_slug} - {None}
+    generations.bump(
+        generations.GLOBAL,
+        *(generations.group(slug) for slug in slugs)
+    )
+    instance._loaded_slug = instance.slug
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    # Посты группы остаются без группы: меняются и страницы их авторов.
+    authors = Post.objects.filter(group=instance).order_by().values_list(
+        'author_id', flat=True).distinct()
+    generations.bump(
+        generations.GLOBAL,
+        generations.group(instance.slug),
+        *(generations.author(author_id) for author_id in authors)
+    )
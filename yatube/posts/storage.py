@@ -0,0 +1,46 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл сохраняется под именем из SHA-256 его содержимого:
+posts/ab/ab12...ef.png. Одинаковые картинки, загруженные разными
+пользователями или повторно при редактировании поста, занимают один
+файл, а значит, и одни миниатюры и варианты srcset: sorl и variants
+строят их по имени исходника. Число ссылок на файл — это число постов
+с таким image, его отдаёт индексированный запрос, поэтому счётчик не
+может разойтись с данными. Когда ссылок не остаётся, thumbnails.release()
+удаляет исходник вместе с миниатюрами и вариантами.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def _save(self, name, content):
+        digest = content_hash(content)
+        _, extension = os.path.splitext(name)
+        name = os.path.join(
+            os.path.dirname(name), digest[:2], digest + extension.lower())
+        if self.exists(name):
+            return name
+        # При гонке двух одинаковых загрузок FileSystemStorage даст второй
+        # копии имя с суффиксом: файл сохранится, просто без дедупликации.
+        return super()._save(name, content)
+
+
+post_images = ContentAddressedStorage()
@@ -0,0 +1,181 @@
+"""Фоновые задачи posts: побочные эффекты записи постов, комментариев
+и подписок (см. core.tasks).
+
+В запросе остаются только сама запись и сброс поколений страниц,
+которые должны сразу показать изменение автору. Счётчики, раскладка
+по лентам подписчиков, поисковый индекс, сброс их лент и уведомления
+уходят в очередь. Обработчики получают пакет задач и читают текущее
+состояние базы, а не данные из задачи, поэтому порядок выполнения и
+повторы не важны: например, подписка и отписка в любом порядке дают
+ленту по тому, есть ли Follow сейчас. Исключение — счётчики и
+уведомления: они прибавляют к уже записанному, зато в одной транзакции
+с удалением задачи.
+"""
+from collections import Counter
+
+from core import tasks
+
+from . import counters, generations, notifications, search, timeline
+from .models import Comment, Follow, Post
+
+# Модель, функция счётчиков и поколения, где эти счётчики видны.
+COUNTED = {
+    'post': (Post, counters.posts_created,
+             lambda obj: [generations.author(obj.author_id)]),
+    'group_post': (Post, counters.group_posts_added, lambda obj: []),
+    'comment': (Comment, counters.comments_created,
+                lambda obj: [generations.post(obj.post_id)]),
+    'follow': (Follow, counters.follows_created,
+               lambda obj: [generations.author(obj.author_id),
+                            generations.author(obj.user_id)]),
+}
+COUNTED_FIELDS = {
+    'post': ('author_id', 'group_id'),
+    'group_post': ('group_id',),
+    'comment': ('post_id', 'parent_id'),
+    'follow': ('user_id', 'author_id'),
+}
+
+
+@tasks.task('posts.counters')
+def _update_counters(payloads):
+    # Дельты с одинаковыми полями сокращаются, а прибавления идут раньше
+    # вычитаний: счётчик не уходит ниже нуля, иначе его обрезал бы
+    # Greatest и создание с удалением до воркера дали бы не ноль.
+    deltas = Counter()
+    for payload in payloads:
+        fields = tuple(sorted(payload['fields'].items()))
+        deltas[payload['kind'], fields] += payload['sign']
+    names = set()
+    for sign in (1, -1):
+        for kind, (model, change, shown_in) in COUNTED.items():
+            objects = [
+                model(**dict(fields))
+                for (counted, fields), delta in deltas.items()
+                if counted == kind and delta * sign > 0
+                for _ in range(abs(delta))
+            ]
+            if objects:
+                change(objects, sign=sign)
+                names.update(name for obj in objects for name in shown_in(obj))
+    generations.bump(*names)
+
+
+@tasks.task('posts.index')
+def _index_posts(payloads):
+    ids = {payload['post'] for payload in payloads}
+    posts = list(Post.objects.filter(pk__in=ids).only('text'))
+    search.index_posts(posts)
+    for post_id in ids - {post.pk for post in posts}:
+        search.unindex_post(post_id)
+
+
+@tasks.task('posts.fan_out')
+def _fan_out(payloads):
+    posts = list(Post.objects.filter(
+        pk__in={payload['post'] for payload in payloads}
+    ).only('author', 'pub_date'))
+    timeline.fan_out(posts)
+    generations.bump(*generations.follower_names(
+        *{post.author_id for post in posts}))
+
+
+@tasks.task('posts.notify_posts')
+def _notify_posts(payloads):
+    notifications.posts_published(list(Post.objects.filter(
+        pk__in={payload['post'] for payload in payloads}
+    ).only('author', 'pub_date')))
+
+
+@tasks.task('posts.notify_comments')
+def _notify_comments(payloads):
+    notifications.comments_added(list(Comment.objects.filter(
+        pk__in={payload['comment'] for payload in payloads}
+    ).only('post', 'author', 'created')))
+
+
+@tasks.task('posts.follower_pages')
+def _follower_pages(payloads):
+    generations.bump(*generations.follower_names(
+        *{payload['author'] for payload in payloads}))
+
+
+@tasks.task('posts.timeline')
+def _sync_timelines(payloads):
+    pairs = {(payload['user'], payload['author']) for payload in payloads}
+    following = pairs & set(Follow.objects.filter(
+        user_id__in={user_id for user_id, _ in pairs},
+        author_id__in={author_id for _, author_id in pairs},
+    ).values_list('user_id', 'author_id'))
+    timeline.backfill_many([
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id, author_id in following
+    ])
+    for user_id, author_id in pairs - following:
+        timeline.prune(user_id, author_id)
+    changed = timeline.sync_authors({author_id for _, author_id in pairs})
+    generations.bump(
+        *{generations.follow(user_id) for user_id, _ in pairs},
+        *generations.follower_names(*changed)
+    )
+
+
+def count(kind, instance, sign=1):
+    count_many(kind, [instance], sign=sign)
+
+
+def count_many(kind, instances, sign=1):
+    tasks.enqueue_many('posts.counters', [
+        ({'kind': kind, 'sign': sign, 'fields': {
+            name: getattr(instance, name) for name in COUNTED_FIELDS[kind]
+        }}, None)
+        for instance in instances
+    ])
+
+
+def index(post_id):
+    tasks.enqueue('posts.index', {'post': post_id}, key=str(post_id))
+
+
+def fan_out(post_id):
+    tasks.enqueue('posts.fan_out', {'post': post_id}, key=str(post_id))
+
+
+def notify_post(post_id):
+    tasks.enqueue('posts.notify_posts', {'post': post_id}, key=str(post_id))
+
+
+def notify_comment(comment_id):
+    tasks.enqueue(
+        'posts.notify_comments', {'comment': comment_id},
+        key=str(comment_id))
+
+
+def refresh_followers(author_id):
+    tasks.enqueue(
+        'posts.follower_pages', {'author': author_id}, key=str(author_id))
+
+
+def sync_timeline(follow):
+    tasks.enqueue(
+        'posts.timeline',
+        {'user': follow.user_id, 'author': follow.author_id},
+        key=f'{follow.user_id}:{follow.author_id}'
+    )
+
+
+def _by_id(objects, field):
+    return [({field: obj.pk}, str(obj.pk)) for obj in objects]
+
+
+def posts_created(posts):
+    """Задачи новых постов пакетом, как у post_saved для одного поста."""
+    count_many('post', posts)
+    for name in ('posts.fan_out', 'posts.notify_posts', 'posts.index'):
+        tasks.enqueue_many(name, _by_id(posts, 'post'))
+
+
+def comments_created(comments):
+    """Задачи новых комментариев пакетом, как у comment_created."""
+    count_many('comment', comments)
+    tasks.enqueue_many('posts.notify_comments', _by_id(comments, 'comment'))
@@ -0,0 +1,15 @@
+from django import template
+
+from posts import generations as cache_generations
+
+register = template.Library()
+
+
+@register.simple_tag
+def generation(kind, ident=None):
+    """Поколение среза для ключа {% cache %}.
+
+    {% generation 'group' group.slug as group_generation %}
+    """
+    name = cache_generations.key(kind, ident)
+    return cache_generations.token(name)
@@ -0,0 +1,9 @@
+"""Адреса проекта с debug toolbar, как при DEBUG = True."""
+import debug_toolbar
+from django.urls import include, path
+
+from yatube.urls import urlpatterns as project_urlpatterns
+
+urlpatterns = project_urlpatterns + [
+    path('__debug__/', include(debug_toolbar.urls)),
+]
@@ -0,0 +1,220 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from .utils import clear_caches
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='author', first_name='Лев', last_name='Толстой')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Пост {number}', group=cls.group)
+            for number in range(15)
+        ]
+        cls.post = cls.posts[-1]
+        for number in range(3):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Комментарий {number}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        clear_caches()
+        self.client = Client()
+
+    def test_post_fields(self):
+        """Пост в ленте сериализуется со всеми полями."""
+        response = self.client.get(reverse('posts:api_post_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        first = response.json()['results'][0]
+        self.assertEqual(first, {
+            'id': self.post.pk,
+            'text': self.post.text,
+            'pub_date': self.post.pub_date.isoformat(),
+            'author': {
+                'username': 'author',
+                'first_name': 'Лев',
+                'last_name': 'Толстой',
+            },
+            'group': {'slug': 'group', 'title': 'Группа'},
+            'image': None,
+            'thumbnails': {},
+            'comments_count': 3,
+        })
+
+    def test_cursor_pages(self):
+        """next и previous ведут по ленте без пропусков и повторов."""
+        url = reverse('posts:api_post_list') + '?limit=6'
+        seen = []
+        pages = 0
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(item['id'] for item in data['results'])
+            url = data['next']
+            pages += 1
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, [post.pk for post in reversed(self.posts)])
+        data = self.client.get(
+            reverse('posts:api_post_list') + '?limit=6').json()
+        second = self.client.get(data['next']).json()
+        back = self.client.get(second['previous']).json()
+        self.assertEqual(back['results'], data['results'])
+
+    def test_limit_is_bounded(self):
+        """limit ограничен сверху, мусор заменяется значением по умолчанию."""
+        url = reverse('posts:api_post_list')
+        self.assertEqual(
+            len(self.client.get(url + '?limit=1000').json()['results']), 15)
+        self.assertEqual(
+            len(self.client.get(url + '?limit=abc').json()['results']), 10)
+
+    def test_invalid_cursor(self):
+        """Испорченный курсор — 400, а не первая страница."""
+        response = self.client.get(
+            reverse('posts:api_post_list') + '?cursor=garbage')
+        self.assertEqual(response.status_code, 400)
+
+    def test_feeds(self):
+        """Группа, профиль и подписки отдают свои посты."""
+        urls = [
+            reverse('posts:api_group_posts', args=[self.group.slug]),
+            reverse('posts:api_profile_posts', args=[self.author.username]),
+            reverse('posts:api_follow_posts'),
+        ]
+        self.client.force_login(self.reader)
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response.json()['results'][0]['id'], self.post.pk)
+
+    def test_not_found(self):
+        """Несуществующие группа, автор и пост — 404 в JSON."""
+        urls = [
+            reverse('posts:api_group_posts', args=['missing']),
+            reverse('posts:api_profile_posts', args=['missing']),
+            reverse('posts:api_post_detail', args=[10 ** 6]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn('detail', response.json())
+
+    def test_follow_requires_login(self):
+        """Лента подписок без авторизации — 401."""
+        response = self.client.get(reverse('posts:api_follow_posts'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_post_detail_with_comments(self):
+        """Пост отдаётся с курсорной страницей комментариев."""
+        url = reverse('posts:api_post_detail', args=[self.post.pk])
+        data = self.client.get(url + '?limit=2').json()
+        self.assertEqual(data['id'], self.post.pk)
+        comments = data['comments']
+        self.assertEqual(
+            [item['text'] for item in comments['results']],
+            ['Комментарий 0', 'Комментарий 1'])
+        self.assertEqual(comments['results'][0]['author']['username'],
+                         'reader')
+        rest = self.client.get(comments['next']).json()['comments']
+        self.assertEqual(
+            [item['text'] for item in rest['results']], ['Комментарий 2'])
+        self.assertIsNone(rest['next'])
+
+    def test_query_budget(self):
+        """Лента — один запрос, пост с комментариями — три."""
+        clear_caches()
+        with self.assertNumQueries(1):
+            self.client.get(reverse('posts:api_post_list'))
+        with self.assertNumQueries(3):
+            self.client.get(
+                reverse('posts:api_post_detail', args=[self.post.pk]))
+
+    def test_conditional_get(self):
+        """API отвечает 304 на актуальный ETag."""
+        url = reverse('posts:api_post_list')
+        response = self.client.get(url)
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+
+class BulkApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        clear_caches()
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def post_json(self, name, data):
+        return self.client.post(
+            reverse(name), json.dumps(data), content_type='application/json')
+
+    def test_bulk_posts(self):
+        """Пакет постов создаётся и возвращается сериализованным."""
+        response = self.post_json('posts:api_bulk_posts', {'posts': [
+            {'text': 'Первый'}, {'text': 'Второй'}]})
+        self.assertEqual(response.status_code, 201)
+        results = response.json()['results']
+        self.assertEqual(
+            [item['text'] for item in results], ['Первый', 'Второй'])
+        self.assertEqual(results[0]['author']['username'], 'author')
+        self.assertEqual(Post.objects.count(), 3)
+
+    def test_bulk_comments(self):
+        """Пакет комментариев создаётся одним запросом."""
+        response = self.post_json('posts:api_bulk_comments', {'comments': [
+            {'post': self.post.pk, 'text': 'Раз'},
+            {'post': self.post.pk, 'text': 'Два'}]})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            Comment.objects.filter(post=self.post).count(), 2)
+
+    def test_bulk_errors(self):
+        """Ошибки возвращаются по номеру элемента, пакет не пишется."""
+        response = self.post_json('posts:api_bulk_posts', {'posts': [
+            {'text': 'Нормальный'}, {'text': ''}]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors']['1'])
+        self.assertEqual(Post.objects.count(), 1)
+        response = self.client.post(
+            reverse('posts:api_bulk_posts'), 'не json',
+            content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_huge_number(self):
+        """Число вне диапазона в id — ошибка 400, а не 500."""
+        response = self.client.post(
+            reverse('posts:api_bulk_comments'),
+            '{"comments": [{"post": 1e400, "text": "Х"}]}',
+            content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('__all__', response.json()['errors']['0'])
+
+    def test_bulk_requires_login_and_post(self):
+        """Без авторизации — 401, GET — 405."""
+        self.assertEqual(
+            self.client.get(reverse('posts:api_bulk_posts')).status_code, 405)
+        self.client.logout()
+        response = self.post_json(
+            'posts:api_bulk_posts', {'posts': [{'text': 'Пост'}]})
+        self.assertEqual(response.status_code, 401)
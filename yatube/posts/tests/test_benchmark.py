@@ -0,0 +1,100 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase
+
+from .. import benchmark, transfer
+from ..dataset import Dataset
+from ..models import Comment, Follow, Post, TimelineEntry
+from .utils import clear_caches
+
+User = get_user_model()
+
+
+class DatasetTests(TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_generate(self):
+        """Набор загружается целиком, у авторов заметный перекос."""
+        dataset = Dataset(users=30, groups=3, posts=300, comments=200,
+                          follows=60, seed=1)
+        importer = transfer.load_records(dataset.records(), batch_size=50)
+        self.assertEqual(importer.counts['auth.user'], 30)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 200)
+        self.assertTrue(Follow.objects.exists())
+        by_author = Counter(Post.objects.values_list('author', flat=True))
+        (_, top), = by_author.most_common(1)
+        self.assertGreater(top, 300 / 30 * 3)
+        dates = list(Post.objects.order_by('pk').values_list(
+            'pub_date', flat=True))
+        self.assertEqual(dates, sorted(dates))
+
+    def test_timelines_are_backfilled(self):
+        """Подписки из набора попадают в материализованные ленты."""
+        dataset = Dataset(users=10, groups=0, posts=50, comments=0,
+                          follows=20, seed=2)
+        transfer.load_records(dataset.records())
+        expected = sum(
+            Post.objects.filter(author_id=author_id).count()
+            for author_id in Follow.objects.values_list(
+                'author_id', flat=True)
+        )
+        self.assertEqual(TimelineEntry.objects.count(), expected)
+
+    def test_second_run_appends(self):
+        """Повторная генерация добавляет посты после существующих."""
+        transfer.load_records(Dataset(
+            users=5, groups=1, posts=10, comments=5, follows=0,
+            seed=3).records())
+        transfer.load_records(Dataset(
+            users=5, groups=1, posts=10, comments=5, follows=0,
+            seed=4).records())
+        self.assertEqual(Post.objects.count(), 20)
+        self.assertEqual(Comment.objects.count(), 10)
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_run_and_compare(self):
+        """Все виды отвечают, результаты сравниваются с прошлым замером."""
+        transfer.load_records(Dataset(
+            users=10, groups=2, posts=40, comments=20, follows=15,
+            seed=5).records())
+        current = benchmark.run(repeat=2, cold=True)
+        self.assertIn('posts:follow_index', current['results'])
+        for name, result in current['results'].items():
+            with self.subTest(name=name):
+                self.assertEqual(result['status'], 200)
+                self.assertGreater(result['queries'], 0)
+        self.assertEqual(current['rows']['posts'], 40)
+        lines = benchmark.compare(current, current)
+        self.assertEqual(len(lines), len(current['results']))
+        self.assertIn('(+0%)', lines[0])
+
+    def test_percentile(self):
+        """Перцентиль берётся по ближайшему рангу."""
+        self.assertEqual(benchmark.percentile([3, 1, 2], 50), 2)
+        self.assertEqual(benchmark.percentile(list(range(101)), 99), 99)
+
+
+class ThroughputTests(TransactionTestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_wsgi_and_asgi(self):
+        """Оба пути отвечают без ошибок на ленты и страницу поста."""
+        transfer.load_records(Dataset(
+            users=10, groups=2, posts=40, comments=20, follows=15,
+            seed=6).records())
+        current = benchmark.throughput(requests=8, concurrency=4)
+        self.assertEqual(
+            set(current['results']), set(benchmark.THROUGHPUT_VIEWS))
+        for name, result in current['results'].items():
+            for path in ('wsgi', 'asgi'):
+                with self.subTest(name=name, path=path):
+                    self.assertEqual(result[path]['errors'], 0)
+                    self.assertGreater(result[path]['rps'], 0)
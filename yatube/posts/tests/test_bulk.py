@@ -0,0 +1,176 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core import tasks
+from core.models import Task
+
+from .. import bulk, generations, search
+from ..models import (Comment, Follow, Group, Notification, Post,
+                      TimelineEntry, UserStats)
+from .utils import clear_caches
+
+User = get_user_model()
+
+
+class BulkWriteTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        clear_caches()
+
+    def test_create_posts(self):
+        """Посты пакета создаются со счётчиками, лентами и поиском."""
+        posts = bulk.create_posts(self.author, [
+            {'text': 'Первый пакетный', 'group': self.group.pk},
+            {'text': 'Второй пакетный'},
+        ])
+        self.assertTrue(all(post.pk for post in posts))
+        self.assertEqual(
+            list(Post.objects.filter(
+                pk__in=[post.pk for post in posts]
+            ).order_by('id').values_list('text', 'group_id')),
+            [('Первый пакетный', self.group.pk), ('Второй пакетный', None)]
+        )
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.posts_count, 2)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(
+            {post.pk for post in search.search('пакетный')[:10]},
+            {post.pk for post in posts})
+        self.assertEqual(len(search.search('второй')), 1)
+
+    def test_side_effects_once_per_batch(self):
+        """Число запросов не зависит от размера пакета."""
+        counts = []
+        for size in (2, 50):
+            clear_caches()
+            # Непрочитанное уведомление прошлого пакета сливалось бы с
+            # новым без вставки: начинаем оба замера с одного состояния.
+            Notification.objects.update(is_read=True)
+            items = [{'text': f'Пост {number}'} for number in range(size)]
+            with CaptureQueriesContext(connection) as queries:
+                bulk.create_posts(self.author, items)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    @override_settings(TASKS_EAGER=False)
+    def test_side_effects_are_queued(self):
+        """Раскладка, поиск, счётчики и уведомления уходят в очередь."""
+        follow = generations.follow(self.reader.pk)
+        before = generations.current(follow)
+        with CaptureQueriesContext(connection) as queries:
+            posts = bulk.create_posts(self.author, [
+                {'text': 'Отложенный пакетный'} for _ in range(3)])
+        self.assertFalse(any(
+            TimelineEntry._meta.db_table in query['sql']
+            for query in queries))
+        self.assertEqual(Task.objects.filter(name='posts.fan_out').count(), 3)
+        self.assertFalse(TimelineEntry.objects.exists())
+        tasks.run_pending()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 3)
+        self.assertEqual(len(search.search('отложенный')), len(posts))
+        self.assertNotEqual(generations.current(follow), before)
+
+    def test_invalid_item_rejects_batch(self):
+        """Ошибка в одном элементе отклоняет весь пакет."""
+        with self.assertRaises(bulk.BatchInvalid) as raised:
+            bulk.create_posts(self.author, [
+                {'text': 'Нормальный'},
+                {'text': ''},
+                {'text': 'С чужой группой', 'group': 10 ** 6},
+            ])
+        self.assertEqual(set(raised.exception.errors), {1, 2})
+        self.assertIn('text', raised.exception.errors[1])
+        self.assertIn('group', raised.exception.errors[2])
+        self.assertFalse(Post.objects.exists())
+
+    def test_malformed_values(self):
+        """id только целые, текст только строка; мусор — ошибка элемента."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        for group in (True, 1.5, float('inf'), [self.group.pk]):
+            with self.subTest(group=group):
+                with self.assertRaises(bulk.BatchInvalid) as raised:
+                    bulk.create_posts(self.author, [
+                        {'text': 'Пост', 'group': group}])
+                self.assertIn('group', raised.exception.errors[0])
+        with self.assertRaises(bulk.BatchInvalid) as raised:
+            bulk.create_posts(self.author, [{'text': ['a']}])
+        self.assertIn('text', raised.exception.errors[0])
+        for item in ({'post': True, 'text': 'Х'},
+                     {'post': float(post.pk), 'text': 'Х'},
+                     {'post': post.pk, 'text': ['a']}):
+            with self.subTest(item=item):
+                with self.assertRaises(bulk.BatchInvalid):
+                    bulk.create_comments(self.reader, [item])
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertFalse(Comment.objects.exists())
+        bulk.create_posts(self.author, [
+            {'text': 'Строкой', 'group': str(self.group.pk)}])
+        self.assertTrue(Post.objects.filter(group=self.group).exists())
+
+    @override_settings(BULK_WRITE_MAX_ITEMS=2)
+    def test_batch_size_is_bounded(self):
+        """Пустой и слишком большой пакеты отклоняются."""
+        for items in ([], [{'text': 'Пост'}] * 3, 'не список'):
+            with self.subTest(items=items):
+                with self.assertRaises(bulk.BatchInvalid):
+                    bulk.create_posts(self.author, items)
+
+    def test_create_comments(self):
+        """Комментарии пакета обновляют счётчик и поколение поста."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        name = generations.post(post.pk)
+        before = generations.current(name)
+        comments = bulk.create_comments(self.reader, [
+            {'post': post.pk, 'text': 'Раз'},
+            {'post': post.pk, 'text': 'Два'},
+        ])
+        self.assertEqual(
+            [comment.text for comment in Comment.objects.filter(
+                pk__in=[comment.pk for comment in comments])],
+            ['Раз', 'Два'])
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.assertNotEqual(generations.current(name), before)
+
+    def test_comment_to_missing_post(self):
+        """Комментарий к несуществующему посту отклоняет пакет."""
+        with self.assertRaises(bulk.BatchInvalid) as raised:
+            bulk.create_comments(self.reader, [
+                {'post': 10 ** 6, 'text': 'Мимо'}])
+        self.assertIn('__all__', raised.exception.errors[0])
+        self.assertFalse(Comment.objects.exists())
+
+    def test_replies(self):
+        """Ответ пакетом возможен только на комментарий того же поста."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        other = Post.objects.create(author=self.author, text='Другой')
+        comment = Comment.objects.create(
+            post=post, author=self.author, text='Вопрос')
+        bulk.create_comments(self.reader, [
+            {'post': post.pk, 'parent': comment.pk, 'text': 'Ответ'}])
+        comment.refresh_from_db()
+        self.assertEqual(comment.replies_count, 1)
+        for parent in (comment.pk * 100, 'мусор'):
+            with self.subTest(parent=parent):
+                with self.assertRaises(bulk.BatchInvalid):
+                    bulk.create_comments(self.reader, [
+                        {'post': post.pk, 'parent': parent, 'text': 'Х'}])
+        with self.assertRaises(bulk.BatchInvalid):
+            bulk.create_comments(self.reader, [
+                {'post': other.pk, 'parent': comment.pk, 'text': 'Х'}])
@@ -1,12 +1,9 @@
 from django.urls import reverse
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
-from django.core.cache import cache
 
-from ..models import Post
-
-
-from ..models import Group, Post, User
+from ..models import Follow, Group, Post
+from .utils import clear_caches
 
 User = get_user_model()
 
@@ -16,6 +13,7 @@ class CacheViewsTest(TestCase):
     def setUpClass(cls):
         super().setUpClass()
         cls.author = User.objects.create_user(username='test_user')
+        cls.reader = User.objects.create_user(username='reader')
         cls.authorized_client = Client()
         cls.authorized_client.force_login(cls.author)
         cls.group = Group.objects.create(
@@ -23,6 +21,11 @@ class CacheViewsTest(TestCase):
             slug='test-slug',
             description='test_description'
         )
+        cls.other_group = Group.objects.create(
+            title='other_group',
+            slug='other-slug',
+            description='test_description'
+        )
         cls.post = Post.objects.create(
             text='test_post',
             group=cls.group,
@@ -30,27 +33,77 @@ class CacheViewsTest(TestCase):
         )
 
     def setUp(self):
-        cache.clear()
+        clear_caches()
+
+    def get_content(self, url):
+        return CacheViewsTest.authorized_client.get(url).content
 
     def test_cache_index(self):
         """Проверка хранения и очищения кэша для index."""
-        response = CacheViewsTest.authorized_client.get(reverse('posts:index'))
-        posts = response.content
-        Post.objects.create(
-            text='test_new_post',
-            author=CacheViewsTest.author,
-        )
-        response_old = CacheViewsTest.authorized_client.get(
-            reverse('posts:index')
-        )
-        old_posts = response_old.content
+        posts = self.get_content(reverse('posts:index'))
+        Post.objects.filter(pk=self.post.pk).update(text='changed_post')
+        old_posts = self.get_content(reverse('posts:index'))
         self.assertEqual(
             old_posts,
             posts,
             'Не возвращает кэшированную страницу.'
         )
-        cache.clear()
-        response_new = CacheViewsTest.authorized_client.get(
-            reverse('posts:index'))
-        new_posts = response_new.content
+        clear_caches()
+        new_posts = self.get_content(reverse('posts:index'))
         self.assertNotEqual(old_posts, new_posts, 'Нет сброса кэша.')
+
+    def test_new_post_invalidates_index(self):
+        """Новый пост сразу появляется на главной странице."""
+        self.get_content(reverse('posts:index'))
+        Post.objects.create(text='test_new_post', author=self.author)
+        self.assertIn(
+            'test_new_post',
+            self.get_content(reverse('posts:index')).decode()
+        )
+
+    def test_pages_are_cached_separately(self):
+        """Разные страницы ленты кэшируются под разными ключами."""
+        Post.objects.bulk_create([
+            Post(text=f'bulk_post_{i}', author=self.author)
+            for i in range(10)
+        ])
+        first = self.get_content(reverse('posts:index'))
+        second = self.get_content(reverse('posts:index') + '?page=2')
+        self.assertNotEqual(first, second)
+        self.assertIn('test_post', second.decode())
+
+    def test_junk_page_values_share_fragments(self):
+        """Мусорные ?page= и ?cursor= не заводят своих фрагментов."""
+        index = reverse('posts:index')
+        self.get_content(index)
+        self.get_content(index + '?cursor=')
+        Post.objects.filter(pk=self.post.pk).update(text='changed_post')
+        for query in ('?page=abc', '?page=999', '?page=01',
+                      '?cursor=junk', '?cursor=W10='):
+            with self.subTest(query=query):
+                self.assertIn(
+                    'test_post', self.get_content(index + query).decode())
+
+    def test_group_change_invalidates_both_groups(self):
+        """Перенос поста в другую группу сбрасывает кэш обеих групп."""
+        old_url = reverse('posts:group_list', args=[self.group.slug])
+        new_url = reverse('posts:group_list', args=[self.other_group.slug])
+        self.get_content(old_url)
+        self.get_content(new_url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = self.other_group
+        post.save()
+        self.assertNotIn('test_post', self.get_content(old_url).decode())
+        self.assertIn('test_post', self.get_content(new_url).decode())
+
+    def test_follow_feed_is_cached_per_user(self):
+        """Лента подписок кэшируется отдельно для каждого пользователя."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        reader_feed = reader_client.get(
+            reverse('posts:follow_index')).content.decode()
+        author_feed = self.get_content(
+            reverse('posts:follow_index')).decode()
+        self.assertIn('test_post', reader_feed)
+        self.assertNotIn('test_post', author_feed)
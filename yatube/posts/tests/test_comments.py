@@ -0,0 +1,118 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Post
+from ..views import COMMENTS_PER_PAGE
+from .utils import clear_caches
+
+User = get_user_model()
+
+
+class CommentThreadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+        cls.other_post = Post.objects.create(
+            author=cls.author, text='Другой пост')
+        cls.comment = Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Первый комментарий')
+
+    def setUp(self):
+        clear_caches()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def add(self, text, parent=None, post=None):
+        return Comment.objects.create(
+            post=post or self.post, author=self.reader, text=text,
+            parent=parent)
+
+    def test_reply(self):
+        """Ответ сохраняется с parent и обновляет счётчики."""
+        self.client.post(
+            reverse('posts:add_comment', args=[self.post.pk]),
+            {'text': 'Ответ', 'parent': self.comment.pk})
+        reply = Comment.objects.get(text='Ответ')
+        self.assertEqual(reply.parent, self.comment)
+        comment = Comment.objects.get(pk=self.comment.pk)
+        self.assertEqual(comment.replies_count, 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comments_count, 2)
+        reply.delete()
+        comment.refresh_from_db()
+        self.assertEqual(comment.replies_count, 0)
+
+    def test_reply_to_other_post(self):
+        """Ответить на комментарий другого поста нельзя."""
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.other_post.pk]),
+            {'text': 'Чужой ответ', 'parent': self.comment.pk})
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(Comment.objects.filter(text='Чужой ответ').exists())
+
+    def test_reply_form(self):
+        """?reply= подставляет комментарий в форму ответа."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]),
+            {'reply': self.comment.pk})
+        self.assertEqual(response.context['reply_to'], self.comment)
+        self.assertContains(
+            response, f'name="parent" value="{self.comment.pk}"')
+
+    def test_first_page(self):
+        """На странице поста первая страница веток, ответы не раскрыты."""
+        reply = self.add('Скрытый ответ', parent=self.comment)
+        for number in range(COMMENTS_PER_PAGE):
+            self.add(f'Комментарий {number}')
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        comments = list(response.context['comments'])
+        self.assertEqual(len(comments), COMMENTS_PER_PAGE)
+        self.assertEqual(comments[0], self.comment)
+        self.assertNotIn(reply, comments)
+        self.assertContains(response, 'Ответов: 1')
+        self.assertContains(
+            response, reverse('posts:comment_list', args=[self.post.pk]))
+
+    def test_next_pages(self):
+        """Эндпоинт отдаёт следующую страницу и ответы по курсору."""
+        comments = [self.comment] + [
+            self.add(f'Комментарий {number}')
+            for number in range(COMMENTS_PER_PAGE)
+        ]
+        reply = self.add('Ответ', parent=self.comment)
+        url = reverse('posts:comment_list', args=[self.post.pk])
+        first = self.client.get(url)
+        self.assertEqual(list(first.context['comments']),
+                         comments[:COMMENTS_PER_PAGE])
+        second = self.client.get(
+            url, {'cursor': first.context['comments'].next_cursor})
+        self.assertEqual(list(second.context['comments']), comments[-1:])
+        self.assertNotContains(second, 'Показать ещё')
+        replies = self.client.get(url, {'parent': self.comment.pk})
+        self.assertEqual(list(replies.context['comments']), [reply])
+
+    def test_missing_post_is_404(self):
+        """Комментарии несуществующего поста — 404, как у самого поста."""
+        url = reverse('posts:comment_list', args=[self.post.pk + 100])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_page_cost_is_constant(self):
+        """Число запросов страницы поста не зависит от комментариев."""
+        counts = []
+        for size in (2, 3 * COMMENTS_PER_PAGE):
+            Comment.objects.bulk_create([
+                Comment(post=self.post, author=self.reader, text='Ещё')
+                for _ in range(size)
+            ])
+            clear_caches()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(
+                    reverse('posts:post_detail', args=[self.post.pk]))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
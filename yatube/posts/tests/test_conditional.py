@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Post
+from .utils import clear_caches
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        clear_caches()
+        self.client = Client()
+
+    def revalidate(self, url, response, **headers):
+        return self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'], **headers)
+
+    def test_feeds_send_validators(self):
+        """Ленты и страница поста отдают ETag, Last-Modified и no-cache.
+
+        Анонимам кэш страниц заменяет Cache-Control на публичный, см.
+        test_page_cache.
+        """
+        self.client.force_login(self.author)
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertTrue(response.has_header('ETag'))
+                self.assertTrue(response.has_header('Last-Modified'))
+                self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_current_copy_gets_304_without_feed_queries(self):
+        """Актуальная копия: 304 без выборки ленты и рендера шаблона."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.revalidate(url, response)
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached['ETag'], response['ETag'])
+        cached = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_changes_and_page_params_change_etag(self):
+        """Новый пост, другая страница или пользователь меняют ETag."""
+        url = reverse('posts:index')
+        response = self.client.get(url)
+        other_page = self.client.get(url + '?page=2')
+        self.assertNotEqual(other_page['ETag'], response['ETag'])
+        self.client.force_login(self.author)
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+        self.client.logout()
+        Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
+
+    def test_comment_invalidates_post_detail(self):
+        """Новый комментарий делает копию страницы поста устаревшей."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        response = self.client.get(url)
+        self.assertEqual(self.revalidate(url, response).status_code, 304)
+        Comment.objects.create(
+            post=self.post, author=self.author, text='Комментарий')
+        self.assertEqual(self.revalidate(url, response).status_code, 200)
@@ -10,6 +10,7 @@ from django.contrib.auth import get_user_model
 from django.core.cache import cache
 
 from ..models import Follow, Group, Post, User
+from .utils import clear_caches
 
 User = get_user_model()
 
@@ -32,6 +33,7 @@ class PostCreateFormTests(TestCase):
         )
 
     def setUp(self):
+        clear_caches()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -147,6 +149,7 @@ class PostImageTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        clear_caches()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
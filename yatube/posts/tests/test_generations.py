@@ -0,0 +1,131 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.template import Context, Template
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import generations
+from ..models import Comment, Follow, Group, Post
+from .utils import clear_caches
+
+User = get_user_model()
+
+
+class GenerationsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание'
+        )
+        cls.other_group = Group.objects.create(
+            title='Другая группа',
+            slug='other-slug',
+            description='Тестовое описание'
+        )
+
+    def setUp(self):
+        clear_caches()
+
+    def assertBumped(self, names, action):
+        before = generations.current(*names)
+        action()
+        after = generations.current(*names)
+        for name, old, new in zip(names, before, after):
+            with self.subTest(name=name):
+                self.assertGreater(new, old)
+
+    def assertNotBumped(self, names, action):
+        before = generations.current(*names)
+        action()
+        self.assertEqual(generations.current(*names), before)
+
+    def test_bump_is_monotonic(self):
+        """Поколение только растёт, в том числе после вытеснения ключа."""
+        name = generations.group('slug')
+        first, = generations.current(name)
+        generations.bump(name)
+        second, = generations.current(name)
+        cache.delete(generations.GENERATION_KEY.format(name))
+        third, = generations.current(name)
+        self.assertLess(first, second)
+        self.assertLess(second, third)
+
+    def test_post_bumps_feeds(self):
+        """Новый пост меняет общую ленту, группу, автора и подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        names = [
+            generations.GLOBAL,
+            generations.group(self.group.slug),
+            generations.author(self.author.pk),
+            generations.follow(self.reader.pk),
+        ]
+        self.assertBumped(names, lambda: Post.objects.create(
+            author=self.author, group=self.group, text='Пост'))
+        self.assertNotBumped(
+            [generations.group(self.other_group.slug)],
+            lambda: Post.objects.create(
+                author=self.author, group=self.group, text='Пост')
+        )
+
+    def test_group_change_bumps_both_groups(self):
+        """Перенос поста меняет поколения старой и новой группы."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост')
+
+        def move():
+            post.group = self.other_group
+            post.save()
+
+        self.assertBumped(
+            [generations.group(self.group.slug),
+             generations.group(self.other_group.slug)],
+            move
+        )
+
+    def test_comment_bumps_post(self):
+        """Комментарий меняет поколение поста, но не ленты."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        comment = lambda: Comment.objects.create(  # noqa: E731
+            post=post, author=self.reader, text='Комментарий')
+        self.assertBumped([generations.post(post.pk)], comment)
+        self.assertNotBumped([generations.GLOBAL], comment)
+
+    def test_group_delete_bumps_authors(self):
+        """Удаление группы меняет страницы авторов её постов."""
+        group = Group.objects.create(
+            title='Удаляемая группа',
+            slug='deleted-slug',
+            description='Тестовое описание'
+        )
+        Post.objects.create(author=self.author, group=group, text='Пост')
+        self.assertBumped(
+            [generations.GLOBAL,
+             generations.group(group.slug),
+             generations.author(self.author.pk)],
+            group.delete
+        )
+
+    def test_generation_template_tag(self):
+        """Тег generation отдаёт текущее поколение среза."""
+        template = Template(
+            "{% load generations %}{% generation 'group' slug %}")
+        rendered = template.render(Context({'slug': self.group.slug}))
+        self.assertEqual(
+            rendered,
+            generations.token(generations.group(self.group.slug))
+        )
+
+    def test_new_comment_is_shown(self):
+        """Новый комментарий сразу виден на закэшированной странице."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        url = reverse('posts:post_detail', args=[post.pk])
+        client = Client()
+        client.get(url)
+        Comment.objects.create(
+            post=post, author=self.reader, text='Новый комментарий')
+        self.assertIn('Новый комментарий', client.get(url).content.decode())
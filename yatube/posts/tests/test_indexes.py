@@ -0,0 +1,85 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+
+from .. import timeline
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+from ..paginator import NEXT, CursorPaginator
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(?P<table>\w+)(?! USING)')
+# Сортировка во временном B-дереве читает все подходящие строки, а не
+# только страницу.
+TEMP_SORT = re.compile(r'USE TEMP B-TREE')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть в SQLite')
+class IndexUsageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост')
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий')
+
+    def slow_steps(self, queryset):
+        """Полные проходы по постам и комментариям и сортировки."""
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        return [
+            line for line in plan
+            if TEMP_SORT.search(line)
+            or FULL_SCAN.match(line)
+            and FULL_SCAN.match(line).group('table') in (
+                Post._meta.db_table, Comment._meta.db_table,
+                TimelineEntry._meta.db_table)
+        ]
+
+    def test_feed_queries_use_indexes(self):
+        """Страницы лент и комментарии читаются по индексу, без SCAN
+        и без сортировки."""
+        paginator = CursorPaginator(Post.objects.feed(), 10)
+        follow = timeline.follow_feed(self.reader, pulled=[])
+        pulled = timeline.follow_feed(
+            self.reader, pulled=[self.author.pk, self.reader.pk])
+        seek = paginator._seek([self.post.pub_date, self.post.pk], NEXT)
+        feeds = {
+            'index': Post.objects.feed(),
+            'group': Post.objects.feed().filter(group=self.group),
+            'profile': Post.objects.feed().filter(author=self.author),
+            'cursor': Post.objects.feed().filter(seek).order_by(
+                *paginator.ordering),
+            'follow posts': Post.objects.feed().filter(
+                pk__in=[1, 2]).order_by(),
+            'comments': Comment.objects.thread(self.post.pk).order_by(
+                'created', 'id'),
+            'replies': Comment.objects.thread(
+                self.post.pk, parent_id=1).order_by('created', 'id'),
+        }
+        sources = (
+            follow.sources() + pulled.sources()
+            + follow.filter(seek).sources() + pulled.filter(seek).sources()
+            + follow.order_by('pub_date', 'id').sources()
+        )
+        for number, queryset in enumerate(sources):
+            feeds[f'follow source {number}'] = queryset
+        for name, queryset in feeds.items():
+            with self.subTest(feed=name):
+                self.assertEqual(self.slow_steps(queryset[:10]), [])
+
+    def test_follow_pair_is_unique(self):
+        """Повторная подписка не создаёт вторую запись Follow."""
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.reader, author=self.author)
@@ -0,0 +1,145 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import events
+from ..models import Follow, Group, Post
+from ..views import POSTS_PER_PAGE
+from .utils import clear_caches
+
+User = get_user_model()
+
+
+def read(response):
+    return b''.join(response.streaming_content).decode()
+
+
+@override_settings(SSE_ENABLED=True, SSE_POLL_INTERVAL=None,
+                   SSE_MAX_DURATION=0)
+class LiveTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        clear_caches()
+        self.broadcaster = events.Broadcaster()
+        original, events.broadcaster = events.broadcaster, self.broadcaster
+        self.addCleanup(setattr, events, 'broadcaster', original)
+
+    def test_channels(self):
+        """Подписчик получает только события своих каналов."""
+        subscription = self.broadcaster.subscribe([events.group('group')])
+        self.broadcaster.publish(1, [events.GLOBAL], 'post', {})
+        self.broadcaster.publish(
+            2, [events.GLOBAL, events.group('group')], 'post', {})
+        self.assertEqual(subscription.get(0).id, 2)
+        self.assertIsNone(subscription.get(0))
+        subscription.close()
+        self.assertFalse(self.broadcaster.subscribers)
+
+    @override_settings(SSE_QUEUE_SIZE=1)
+    def test_overflow(self):
+        """Переполненная очередь помечает подписку, а не блокирует."""
+        subscription = self.broadcaster.subscribe([events.GLOBAL])
+        for number in (1, 2):
+            self.broadcaster.publish(number, [events.GLOBAL], 'post', {})
+        self.assertTrue(subscription.overflowed)
+
+    def test_replay(self):
+        """По last_id отдаются пропущенные события из истории."""
+        broadcaster = events.Broadcaster(history=2)
+        for number in (1, 2, 3):
+            broadcaster.publish(number, [events.GLOBAL], 'post', {})
+        subscription = broadcaster.subscribe([events.GLOBAL], last_id=2)
+        self.assertEqual(subscription.get(0).id, 3)
+        self.assertFalse(subscription.overflowed)
+        lost = broadcaster.subscribe([events.GLOBAL], last_id=0)
+        self.assertTrue(lost.overflowed)
+
+    @override_settings(SSE_POLL_INTERVAL=60)
+    def test_poller_query_outside_lock(self):
+        """Последний id поста читается до блокировки рассыльщика."""
+        locked = []
+
+        def check(execute, sql, params, many, context):
+            locked.append(self.broadcaster.lock.locked())
+            return execute(sql, params, many, context)
+
+        with mock.patch.object(self.broadcaster, '_start_poller') as start, \
+                connection.execute_wrapper(check):
+            self.broadcaster.subscribe([events.GLOBAL])
+        self.assertEqual(locked, [False])
+        start.assert_called_once_with(0)
+
+    def test_poll(self):
+        """Опрос рассылает новые посты по каналам группы и автора."""
+        subscription = self.broadcaster.subscribe(
+            [events.author(self.author.pk)])
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост')
+        seen = events.poll(self.broadcaster, 0)
+        self.assertEqual(seen, post.pk)
+        message = subscription.get(0)
+        self.assertEqual(message.id, post.pk)
+        self.assertEqual(message.data['group'], 'group')
+        self.assertIn(events.group('group'), message.channels)
+        self.assertEqual(events.poll(self.broadcaster, seen), seen)
+
+    def test_stream(self):
+        """Поток отдаёт пропущенные события после Last-Event-ID."""
+        self.broadcaster.publish(
+            1, [events.GLOBAL, events.group('group')], 'post', {'id': 1})
+        self.broadcaster.publish(2, [events.GLOBAL], 'post', {'id': 2})
+        response = self.client.get(
+            reverse('posts:group_events', args=['group']),
+            HTTP_LAST_EVENT_ID='0')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = read(response)
+        self.assertIn('id: 1\nevent: post\ndata: {"id": 1}\n\n', body)
+        self.assertNotIn('id: 2', body)
+        self.assertFalse(self.broadcaster.subscribers)
+
+    def test_follow_stream(self):
+        """Лента подписок слушает авторов, на которых подписан читатель."""
+        self.broadcaster.publish(
+            1, [events.author(self.author.pk)], 'post', {})
+        self.broadcaster.publish(
+            2, [events.author(self.reader.pk)], 'post', {})
+        url = reverse('posts:follow_events')
+        self.assertEqual(self.client.get(url).status_code, 302)
+        client = Client()
+        client.force_login(self.reader)
+        body = read(client.get(url, HTTP_LAST_EVENT_ID='0'))
+        self.assertIn('id: 1\n', body)
+        self.assertNotIn('id: 2\n', body)
+
+    def test_banner(self):
+        """Первая страница ленты подключается к потоку событий."""
+        Post.objects.bulk_create([
+            Post(author=self.author, text=f'Пост {number}')
+            for number in range(POSTS_PER_PAGE + 1)
+        ])
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, reverse('posts:index_events'))
+        response = self.client.get(reverse('posts:index') + '?page=2')
+        self.assertNotContains(response, reverse('posts:index_events'))
+
+    @override_settings(SSE_ENABLED=False)
+    def test_disabled_under_wsgi(self):
+        """Под WSGI без SSE_ENABLED страницы не открывают поток."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, reverse('posts:index_events'))
+        response = self.client.get(reverse('posts:index_events'))
+        self.assertEqual(response.status_code, 404)
+        clear_caches()
+        response = self.client.get(
+            reverse('posts:index'), **{'asgi.version': '3.0'})
+        self.assertContains(response, reverse('posts:index_events'))
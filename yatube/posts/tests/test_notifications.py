@@ -0,0 +1,123 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import counters, notifications
+from ..models import Comment, Follow, Notification, Post, UserStats
+from ..views import NOTIFICATIONS_PER_PAGE
+from .utils import clear_caches
+
+User = get_user_model()
+
+
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        clear_caches()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def unread(self, user):
+        return notifications.unread_count(user)
+
+    def test_posts_coalesce(self):
+        """Серия постов автора — одно непрочитанное уведомление."""
+        Post.objects.create(author=self.author, text='Первый')
+        latest = Post.objects.create(author=self.author, text='Второй')
+        notification = Notification.objects.get(user=self.reader)
+        self.assertEqual(notification.kind, Notification.POST)
+        self.assertEqual(notification.count, 2)
+        self.assertEqual(notification.post, latest)
+        self.assertEqual(self.unread(self.reader), 1)
+        notifications.mark_read(self.reader, [notification.pk])
+        self.assertEqual(self.unread(self.reader), 0)
+        Post.objects.create(author=self.author, text='Третий')
+        self.assertEqual(Notification.objects.filter(
+            user=self.reader, is_read=False).get().count, 1)
+        self.assertEqual(self.unread(self.reader), 1)
+
+    def test_comments_coalesce(self):
+        """Чужие комментарии к посту сливаются, свои не уведомляют."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.author, text='Сам')
+        self.assertFalse(Notification.objects.filter(
+            user=self.author).exists())
+        other = User.objects.create_user(username='other')
+        Comment.objects.create(post=post, author=self.reader, text='Раз')
+        Comment.objects.create(post=post, author=other, text='Два')
+        notification = Notification.objects.get(user=self.author)
+        self.assertEqual(notification.kind, Notification.COMMENT)
+        self.assertEqual(notification.count, 2)
+        self.assertEqual(notification.actor, other)
+        self.assertEqual(self.unread(self.author), 1)
+
+    def test_post_deleted(self):
+        """Удаление поста убирает уведомление и уменьшает счётчик."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(self.unread(self.reader), 1)
+        post.delete()
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(self.unread(self.reader), 0)
+
+    def test_latest_post_of_series_deleted(self):
+        """Удаление последнего поста серии оставляет её на предыдущем."""
+        first = Post.objects.create(author=self.author, text='Первый')
+        latest = Post.objects.create(author=self.author, text='Второй')
+        latest.delete()
+        notification = Notification.objects.get(user=self.reader)
+        self.assertEqual(notification.post, first)
+        self.assertEqual(notification.count, 1)
+        self.assertEqual(self.unread(self.reader), 1)
+
+    def test_conflicting_insert_is_not_counted(self):
+        """Пропущенная из-за конфликта вставка не растит счётчик."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertEqual(self.unread(self.reader), 1)
+        notifications._insert(
+            Notification.POST, [self.reader.pk], self.author.pk, post.pk,
+            1, post.pub_date)
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertEqual(self.unread(self.reader), 1)
+
+    def test_inbox(self):
+        """Входящие показывают уведомления постранично и читают их."""
+        authors = [
+            User.objects.create_user(username=f'author{number}')
+            for number in range(NOTIFICATIONS_PER_PAGE + 1)
+        ]
+        Follow.objects.bulk_create([
+            Follow(user=self.reader, author=author) for author in authors])
+        for author in authors:
+            Post.objects.create(author=author, text='Пост')
+        response = self.client.get(reverse('posts:notifications'))
+        page = response.context['page_obj']
+        self.assertEqual(len(page), NOTIFICATIONS_PER_PAGE)
+        self.assertFalse(page[0].is_read)
+        self.assertEqual(page[0].actor, authors[-1])
+        self.assertEqual(self.unread(self.reader), 1)
+        response = self.client.get(
+            reverse('posts:notifications'), {'cursor': page.next_cursor})
+        self.assertEqual(len(response.context['page_obj']), 1)
+        self.assertEqual(self.unread(self.reader), 0)
+
+    def test_unread_api(self):
+        """Счётчик непрочитанных доступен через API."""
+        url = reverse('posts:api_unread_notifications')
+        self.assertEqual(Client().get(url).status_code, 401)
+        Post.objects.create(author=self.author, text='Пост')
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.json(), {'unread': 1})
+
+    def test_recount(self):
+        """recount восстанавливает число непрочитанных."""
+        Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.update(unread_notifications=0)
+        counters.recount()
+        self.assertEqual(self.unread(self.reader), 1)
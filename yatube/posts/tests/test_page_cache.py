@@ -0,0 +1,98 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Post
+from .utils import clear_caches
+
+User = get_user_model()
+
+
+@override_settings(ANONYMOUS_PAGE_EDGE_TTL=30)
+class AnonymousPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        clear_caches()
+        self.client = Client()
+
+    def test_anonymous_page_is_served_from_cache(self):
+        """Повторный анонимный запрос не доходит до вида и базы."""
+        url = reverse('posts:profile', args=[self.author.username])
+        first = self.client.get(url)
+        self.assertEqual(first['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(second['X-Page-Cache'], 'hit')
+        self.assertEqual(second.content, first.content)
+        self.assertIsNone(second.context)
+
+    def test_edge_headers(self):
+        """Ответ можно держать в прокси, но не отдавать вошедшим."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(
+            response['Cache-Control'],
+            'public, max-age=0, s-maxage=30, must-revalidate')
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_key_includes_host_and_scheme(self):
+        """Страница другого хоста или схемы не берётся из кэша."""
+        url = reverse('posts:api_post_list')
+        self.client.get(url, HTTP_HOST='localhost')
+        for extra in ({'HTTP_HOST': '127.0.0.1'},
+                      {'HTTP_HOST': 'localhost', 'secure': True}):
+            with self.subTest(extra=extra):
+                response = self.client.get(url, **extra)
+                self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertEqual(
+            self.client.get(url, HTTP_HOST='localhost')['X-Page-Cache'],
+            'hit')
+
+    def test_invalid_page_values_are_not_stored(self):
+        """Некорректные ?page= и ?cursor= не попадают в кэш страниц."""
+        index = reverse('posts:index')
+        comments = reverse('posts:comment_list', args=[self.post.pk])
+        for url in (index + '?page=abc', index + '?page=999',
+                    index + '?cursor=junk', comments + '?cursor=junk'):
+            with self.subTest(url=url):
+                self.client.get(url)
+                self.assertFalse(
+                    self.client.get(url).has_header('X-Page-Cache'))
+        self.client.get(index + '?page=1')
+        self.assertEqual(
+            self.client.get(index + '?page=1')['X-Page-Cache'], 'hit')
+
+    def test_new_post_replaces_cached_page(self):
+        """Новый пост меняет поколение, и страница строится заново."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Свежий пост')
+
+    def test_cached_page_answers_conditional_get(self):
+        """Совпавший ETag получает 304 прямо из кэша страниц."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_sessions_bypass_cache(self):
+        """Вошедшие пользователи и клиенты с сессией получают свой рендер."""
+        url = reverse('posts:index')
+        self.client.get(url)
+        self.client.force_login(self.author)
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+        self.assertIn('private', response['Cache-Control'])
+        self.client.logout()
+        self.client.cookies[settings.SESSION_COOKIE_NAME] = 'stale'
+        self.assertFalse(self.client.get(url).has_header('X-Page-Cache'))
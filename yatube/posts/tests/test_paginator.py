@@ -1,3 +1,6 @@
+import base64
+import json
+
 from django.urls import reverse
 from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
@@ -6,6 +9,7 @@ from ..models import Post
 
 
 from ..models import Group, Post, User
+from .utils import clear_caches
 
 PAGINATOR_NUMB = 18
 PAGE_1 = 10
@@ -34,6 +38,7 @@ class PaginatorViewsTest(TestCase):
         ])
 
     def setUp(self):
+        clear_caches()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
@@ -119,3 +124,60 @@ class PaginatorViewsTest(TestCase):
             + '?page=2'
         )
         self.assertEqual(len(response.context['page_obj']), PAGE_2)
+
+    def test_cursor_pages_of_index(self):
+        """Проверка index: курсорные страницы обходят посты без повторов."""
+        response = self.client.get(reverse('posts:index') + '?cursor=')
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), PAGE_1)
+        self.assertFalse(first_page.has_previous())
+        self.assertIsNone(first_page.paginator.count)
+
+        response = self.client.get(
+            reverse('posts:index'),
+            {'cursor': first_page.next_cursor}
+        )
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), PAGE_2)
+        self.assertFalse(second_page.has_next())
+        ids = [post.pk for post in first_page] + [
+            post.pk for post in second_page]
+        self.assertEqual(
+            ids,
+            list(Post.objects.order_by('-pub_date', '-id')
+                 .values_list('pk', flat=True))
+        )
+
+        response = self.client.get(
+            reverse('posts:index'),
+            {'cursor': second_page.previous_cursor}
+        )
+        self.assertEqual(
+            [post.pk for post in response.context['page_obj']],
+            ids[:PAGE_1]
+        )
+
+    def test_cursor_pages_of_group_list(self):
+        """Проверка group_list: вторая курсорная страница содержит 8 постов."""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        first_page = self.client.get(url + '?cursor=').context['page_obj']
+        response = self.client.get(url, {'cursor': first_page.next_cursor})
+        self.assertEqual(len(response.context['page_obj']), PAGE_2)
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Некорректный курсор возвращает первую страницу."""
+        response = self.client.get(reverse('posts:index') + '?cursor=broken')
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), PAGE_1)
+        self.assertFalse(page_obj.has_previous())
+
+    def test_cursor_with_null_values(self):
+        """Курсор с null или списком вместо ключа — первая страница."""
+        for values in ([None, None], [['2020-01-01'], 1], [True, 1]):
+            with self.subTest(values=values):
+                cursor = base64.urlsafe_b64encode(
+                    json.dumps(['n', values]).encode()).decode()
+                response = self.client.get(
+                    reverse('posts:index'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.context['page_obj'].has_previous())
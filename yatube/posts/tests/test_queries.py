@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from .utils import clear_caches
+
+User = get_user_model()
+
+POSTS_NUMB = 15
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов страниц не зависит от числа постов на странице."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {i}',
+                slug=f'group-{i}',
+                description='Тестовое описание'
+            )
+            for i in range(3)
+        ]
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author_{i}',
+                first_name='Имя',
+                last_name=f'Фамилия {i}'
+            )
+            for i in range(3)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        for i in range(POSTS_NUMB):
+            Post.objects.create(
+                author=cls.authors[i % 3],
+                group=cls.groups[i % 3],
+                text=f'Тестовый пост {i}'
+            )
+        cls.post = Post.objects.create(
+            author=cls.authors[0],
+            group=cls.groups[0],
+            text='Пост с комментариями'
+        )
+        for author in cls.authors:
+            Comment.objects.create(
+                post=cls.post, author=author, text='Комментарий')
+
+    def setUp(self):
+        clear_caches()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def assertQueryBudget(self, client, url, budget):
+        with self.assertNumQueries(budget):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_index_queries(self):
+        """index: COUNT и одна выборка страницы."""
+        self.assertQueryBudget(self.client, reverse('posts:index'), 2)
+
+    def test_index_cursor_queries(self):
+        """index с курсором: только выборка страницы."""
+        self.assertQueryBudget(
+            self.client, reverse('posts:index') + '?cursor=', 1)
+
+    def test_group_list_queries(self):
+        """group_list: группа, COUNT и выборка страницы."""
+        url = reverse('posts:group_list', args=[self.groups[0].slug])
+        self.assertQueryBudget(self.client, url, 3)
+
+    def test_profile_queries(self):
+        """profile: id автора для ETag, автор, COUNT и выборка страницы."""
+        url = reverse('posts:profile', args=[self.authors[0].username])
+        self.assertQueryBudget(self.client, url, 4)
+
+    def test_post_detail_queries(self):
+        """post_detail: автор для ETag, пост, счётчики и комментарии."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        self.assertQueryBudget(self.client, url, 4)
+
+    def test_follow_index_queries(self):
+        """follow_index: пользователь, авторы-исключения, число записей,
+        ключи страницы по индексу ленты и посты страницы.
+
+        Сессия читается из кэша sessions, а не из базы.
+        """
+        self.assertQueryBudget(
+            self.reader_client, reverse('posts:follow_index'), 5)
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0)
+    def test_follow_index_pulled_queries(self):
+        """follow_index с популярными авторами: их список читается один
+        раз на запрос — и для поколений, и для ленты.
+
+        Число записей и ключи страницы — по запросу на записи ленты и на
+        каждого из трёх авторов.
+        """
+        self.assertQueryBudget(
+            self.reader_client, reverse('posts:follow_index'), 12)
@@ -0,0 +1,106 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import search
+from ..models import Post, SearchTerm
+from .utils import clear_caches
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.cats = Post.objects.create(
+            author=cls.author, text='Кошки и снова кошки, кошки везде')
+        cls.both = Post.objects.create(
+            author=cls.author, text='Кошки и собаки живут вместе')
+        cls.dogs = Post.objects.create(
+            author=cls.author, text='Только собаки')
+
+    def setUp(self):
+        clear_caches()
+        self.client = Client()
+
+    def found(self, query):
+        response = self.client.get(
+            reverse('posts:post_search'), {'q': query})
+        return [post.pk for post in response.context['page_obj']]
+
+    def check_search(self):
+        self.assertEqual(self.found('кошки')[0], self.cats.pk)
+        self.assertCountEqual(
+            self.found('кошки'), [self.cats.pk, self.both.pk])
+        self.assertEqual(self.found('Собаки кошки'), [self.both.pk])
+        self.assertEqual(self.found('жирафы'), [])
+        self.assertEqual(self.found(''), [])
+
+    def check_incremental_update(self):
+        post = Post.objects.create(author=self.author, text='Только утки')
+        self.assertEqual(self.found('утки'), [post.pk])
+        post.text = 'Теперь про жирафов'
+        post.save()
+        self.assertEqual(self.found('жирафов'), [post.pk])
+        self.assertEqual(self.found('утки'), [])
+        post.delete()
+        self.assertEqual(self.found('жирафов'), [])
+
+    @override_settings(SEARCH_BACKEND='fts5')
+    def test_fts_search(self):
+        """FTS5 находит посты по всем словам и ранжирует по bm25."""
+        for post in Post.objects.all():
+            search.index_post(post)
+        self.check_search()
+        self.check_incremental_update()
+
+    @override_settings(SEARCH_BACKEND='python')
+    def test_inverted_index_search(self):
+        """Запасной индекс даёт те же результаты, что и FTS5."""
+        for post in Post.objects.all():
+            search.index_post(post)
+        self.assertTrue(SearchTerm.objects.filter(
+            term='кошки', post=self.cats, frequency=3).exists())
+        self.check_search()
+        self.check_incremental_update()
+        self.assertFalse(SearchTerm.objects.filter(term='жирафов').exists())
+
+    def test_rebuild_after_backend_switch(self):
+        """После смены бэкенда команда заполняет его индекс."""
+        with override_settings(SEARCH_BACKEND='python'):
+            self.assertEqual(self.found('собаки'), [])
+            out = StringIO()
+            call_command('rebuild_search_index', stdout=out)
+            self.assertIn('SearchTerm', out.getvalue())
+            self.check_search()
+
+    def test_search_paginates_with_query(self):
+        """Результаты поиска разбиты на страницы с сохранением запроса."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Сравнение {number}')
+            for number in range(12)
+        )
+        for post in Post.objects.filter(text__startswith='Сравнение'):
+            search.index_post(post)
+        url = reverse('posts:post_search')
+        response = self.client.get(url, {'q': 'сравнение'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertContains(response, '?q=%D1%81%D1%80')
+        response = self.client.get(url, {'q': 'сравнение', 'page': 2})
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+    @override_settings(DEBUG=True, SEARCH_BACKEND='fts5',
+                       ROOT_URLCONF='posts.tests.debug_urls')
+    def test_index_with_debug_toolbar(self):
+        """Индексация не ломает SQL-панель debug toolbar."""
+        self.client.force_login(self.author)
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Жирафы в саванне'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.found('жирафы'), [
+            Post.objects.get(text='Жирафы в саванне').pk])
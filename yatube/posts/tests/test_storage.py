@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import tasks
+from core.models import Task
+
+from .. import thumbnails
+from ..models import Post
+from .test_thumbnails import SMALL_GIF, uploaded, uploaded_png
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.other = User.objects.create_user(username='other')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create(self, image, author=None):
+        return Post.objects.create(
+            author=author or self.author, text='Пост', image=image)
+
+    def test_identical_uploads_share_one_file(self):
+        """Одинаковые картинки хранятся одним файлом с именем-хэшем."""
+        first = self.create(uploaded('first.gif'))
+        second = self.create(uploaded('second.gif'), author=self.other)
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(
+            first.image.name, r'^posts/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        self.assertEqual(
+            os.listdir(os.path.dirname(first.image.path)),
+            [os.path.basename(first.image.name)]
+        )
+        with open(first.image.path, 'rb') as stored:
+            self.assertEqual(stored.read(), SMALL_GIF)
+
+    def test_duplicate_reuses_thumbnails(self):
+        """Дубликат получает готовые миниатюры без повторной генерации."""
+        first = self.create(uploaded('first.gif'))
+        thumbnails.generate(first.pk)
+        second = self.create(uploaded('second.gif'))
+        with self.assertNumQueries(4):
+            thumbnails.generate(second.pk)
+        second.refresh_from_db()
+        first.refresh_from_db()
+        self.assertEqual(second.thumbnails, first.thumbnails)
+        self.assertEqual(second.image_variants, first.image_variants)
+
+    def test_file_is_released_with_last_reference(self):
+        """Файл и его миниатюры удаляются, когда на него не ссылаются."""
+        first = self.create(uploaded('first.gif'))
+        second = self.create(uploaded('second.gif'))
+        thumbnails.generate(first.pk)
+        first.refresh_from_db()
+        path = first.image.path
+        thumbnail = os.path.join(
+            TEMP_MEDIA_ROOT,
+            first.ready_thumbnails['feed']['url'][len(settings.MEDIA_URL):]
+        )
+        first.delete()
+        self.assertFalse(thumbnails.release(second.image))
+        self.assertTrue(os.path.exists(path))
+        second.image = uploaded_png((3, 3))
+        second.save()
+        self.assertTrue(thumbnails.release(first.image))
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(os.path.exists(thumbnail))
+
+    @override_settings(TASKS_EAGER=False)
+    def test_release_waits_and_rechecks_references(self):
+        """Удаление файла ждёт задержку и проверяет ссылки заново."""
+        first = self.create(uploaded('first.gif'))
+        path = first.image.path
+        first.delete()
+        task = Task.objects.get(name='posts.release_images')
+        self.assertGreater(task.run_at, timezone.now())
+        # Та же картинка загружена снова, пока удаление ждало.
+        second = self.create(uploaded('second.gif'))
+        Task.objects.update(run_at=timezone.now())
+        tasks.run_pending()
+        self.assertTrue(os.path.exists(path))
+        second.delete()
+        Task.objects.update(run_at=timezone.now())
+        tasks.run_pending()
+        self.assertFalse(os.path.exists(path))
@@ -0,0 +1,82 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from core import tasks
+from core.models import Task
+
+from .. import search
+from ..models import (Comment, Follow, Group, Post, TimelineEntry,
+                      UserStats)
+from .utils import clear_caches
+
+User = get_user_model()
+
+
+@override_settings(TASKS_EAGER=False)
+class DeferredSideEffectsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        clear_caches()
+
+    def test_post(self):
+        """Счётчики, лента подписчика и поиск обновляются воркером."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        tasks.run_pending()
+        post = Post.objects.create(author=self.author, text='Отложенный')
+        self.assertTrue(Task.objects.exists())
+        self.assertEqual(len(search.search('отложенный')), 0)
+        tasks.run_pending()
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(len(search.search('отложенный')), 1)
+        post.text = 'Исправленный'
+        post.save()
+        post.save()
+        self.assertEqual(Task.objects.filter(name='posts.index').count(), 1)
+        tasks.run_pending()
+        self.assertEqual(len(search.search('исправленный')), 1)
+
+    def test_group_change(self):
+        """Перенос поста в другую группу меняет счётчики воркером."""
+        first = Group.objects.create(title='Первая', slug='first')
+        second = Group.objects.create(title='Вторая', slug='second')
+        post = Post.objects.create(author=self.author, group=first, text='П')
+        tasks.run_pending()
+        post.group = second
+        post.save()
+        first.refresh_from_db()
+        self.assertEqual(first.posts_count, 1)
+        tasks.run_pending()
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.posts_count, second.posts_count), (0, 1))
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 1)
+
+    def test_comment(self):
+        """Число комментариев меняется после выполнения задач."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader, text='Да')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        tasks.run_pending()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_follow_then_unfollow(self):
+        """Подписка и отписка до воркера не оставляют ленту."""
+        Post.objects.create(author=self.author, text='Пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.filter(user=self.reader).get().delete()
+        tasks.run_pending()
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(stats.followers_count, 0)
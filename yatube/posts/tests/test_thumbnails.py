@@ -0,0 +1,170 @@
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from PIL import Image
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import thumbnails, variants
+from ..models import Post
+from .utils import clear_caches
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def uploaded(name='small.gif'):
+    return SimpleUploadedFile(name, SMALL_GIF, content_type='image/gif')
+
+
+def uploaded_png(size, name='photo.png'):
+    buffer = io.BytesIO()
+    Image.new('RGBA', size, (200, 30, 30, 255)).save(buffer, 'PNG')
+    return SimpleUploadedFile(
+        name, buffer.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        clear_caches()
+        self.client = Client()
+
+    def test_generate_records_sizes(self):
+        """Миниатюры записываются в пост вместе с размерами."""
+        post = Post.objects.create(
+            author=self.author, text='Пост', image=uploaded())
+        self.assertEqual(post.ready_thumbnails, {})
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        feed = post.ready_thumbnails['feed']
+        self.assertEqual((feed['width'], feed['height']), (960, 339))
+        self.assertTrue(feed['url'].startswith(settings.MEDIA_URL))
+
+    def test_saving_new_image_schedules_generation(self):
+        """Генерация ставится только когда у поста новая картинка."""
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            post = Post.objects.create(
+                author=self.author, text='Пост', image=uploaded())
+            self.assertEqual(schedule.call_count, 1)
+            post.text = 'Новый текст'
+            post.save()
+            Post.objects.get(pk=post.pk).save()
+            self.assertEqual(schedule.call_count, 1)
+            post.image = uploaded_png((4, 3))
+            post.save()
+            self.assertEqual(schedule.call_count, 2)
+            Post.objects.create(author=self.author, text='Без картинки')
+            self.assertEqual(schedule.call_count, 2)
+
+    def test_replaced_image_hides_old_thumbnails(self):
+        """Миниатюры старой картинки не показываются для новой."""
+        post = Post.objects.create(
+            author=self.author, text='Пост', image=uploaded())
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        post.image = uploaded_png((4, 3))
+        post.save()
+        self.assertEqual(post.ready_thumbnails, {})
+
+    def test_feed_does_not_touch_storage(self):
+        """Лента выводит готовую миниатюру без обращений к хранилищу."""
+        post = Post.objects.create(
+            author=self.author, text='Пост', image=uploaded())
+        thumbnails.generate(post.pk)
+        fallback = Post.objects.get(pk=post.pk).ready_variants['fallback']
+        storage = 'django.core.files.storage.FileSystemStorage'
+        with mock.patch(f'{storage}.exists') as exists, \
+                mock.patch(f'{storage}.open') as open_file:
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, fallback['url'])
+        self.assertContains(response, '<picture>')
+        exists.assert_not_called()
+        open_file.assert_not_called()
+
+    def test_thumbnail_without_variants(self):
+        """Без манифеста вариантов выводится миниатюра ленты."""
+        post = Post.objects.create(
+            author=self.author, text='Пост', image=uploaded())
+        thumbnails.generate(post.pk)
+        Post.objects.filter(pk=post.pk).update(image_variants={})
+        clear_caches()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'width="960" height="339"')
+        self.assertNotContains(response, '<picture>')
+
+
+@override_settings(
+    MEDIA_ROOT=TEMP_MEDIA_ROOT,
+    POST_IMAGE_WIDTHS=(320, 480, 960),
+    POST_IMAGE_FORMATS={'NOPE': 10, 'PNG': 90, 'JPEG': 80},
+)
+class VariantTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_manifest_lists_widths_and_formats(self):
+        """Варианты строятся для всех ширин и доступных форматов."""
+        with mock.patch.dict(variants.MIME_TYPES, {'PNG': 'image/png'}), \
+                mock.patch.dict(variants.EXTENSIONS, {'PNG': 'png'}):
+            post = Post.objects.create(
+                author=self.author, text='Пост',
+                image=uploaded_png((1200, 800)))
+            manifest = variants.build(post.image)
+        self.assertEqual(manifest['source'], post.image.name)
+        self.assertEqual(
+            [source['type'] for source in manifest['sources']],
+            ['image/png']
+        )
+        fallback = manifest['fallback']
+        self.assertEqual(fallback['type'], 'image/jpeg')
+        self.assertEqual((fallback['width'], fallback['height']), (960, 339))
+        self.assertEqual(fallback['srcset'].count('w, '), 2)
+        self.assertIn(' 320w', fallback['srcset'])
+        with Image.open(fallback['url'].replace(
+                settings.MEDIA_URL, TEMP_MEDIA_ROOT + '/', 1)) as image:
+            self.assertEqual(image.size, (960, 339))
+
+    def test_small_image_is_not_upscaled(self):
+        """Ширины больше исходника пропускаются."""
+        post = Post.objects.create(
+            author=self.author, text='Пост', image=uploaded_png((600, 400)))
+        manifest = variants.build(post.image)
+        widths = [
+            int(item.rsplit(' ', 1)[1][:-1])
+            for item in manifest['fallback']['srcset'].split(', ')
+        ]
+        self.assertEqual(widths, [320, 480, 600])
+        self.assertEqual(manifest['fallback']['width'], 600)
@@ -0,0 +1,104 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import timeline
+from ..models import Follow, Post, TimelineEntry
+from ..paginator import CursorPaginator
+from .utils import clear_caches
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки'
+        )
+
+    def setUp(self):
+        clear_caches()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту уже опубликованные посты автора."""
+        self.client.get(
+            reverse('posts:profile_follow', args=[self.author.username]))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        self.assertEqual(self.feed(), [self.old_post.pk])
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новый пост автора попадает в ленты его подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertEqual(self.feed(), [post.pk, self.old_post.pk])
+
+    def test_unfollow_prunes_timeline(self):
+        """Отписка убирает посты автора из ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.get(
+            reverse('posts:profile_unfollow', args=[self.author.username]))
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0)
+    def test_celebrity_posts_are_pulled_on_read(self):
+        """Посты популярных авторов не раскладываются, а читаются из Post."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        clear_caches()
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+        self.assertEqual(self.feed()[0], post.pk)
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1)
+    def test_author_below_threshold_again_keeps_posts(self):
+        """Автор, вернувшийся под порог, не теряет посты из лент."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(
+            post=self.old_post).exists())
+        post = Post.objects.create(author=self.author, text='Популярный')
+        self.assertEqual(self.feed(), [post.pk, self.old_post.pk])
+        Follow.objects.filter(user=other).delete()
+        self.assertEqual(TimelineEntry.objects.filter(
+            user=self.reader).count(), 2)
+        self.assertEqual(self.feed(), [post.pk, self.old_post.pk])
+        Follow.objects.create(user=other, author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_pages_merge_entries_and_pulled_posts(self):
+        """Страницы ленты сливают разложенные и прочитанные посты по дате."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=other)
+        posts = [
+            Post.objects.create(author=author, text=f'Пост {number}')
+            for number, author in enumerate([self.author, other] * 3)
+        ]
+        expected = [post.pk for post in reversed(posts)] + [self.old_post.pk]
+        feed = timeline.follow_feed(self.reader, pulled=[other.pk])
+        self.assertEqual(feed.count(), len(expected))
+        self.assertEqual([post.pk for post in feed[:4]], expected[:4])
+        self.assertEqual([post.pk for post in feed[4:]], expected[4:])
+        paginator = CursorPaginator(feed, 3)
+        page = paginator.page(None)
+        pages = [[post.pk for post in page]]
+        while page.has_next():
+            page = paginator.page(page.next_cursor)
+            pages.append([post.pk for post in page])
+        self.assertEqual(sum(pages, []), expected)
@@ -0,0 +1,144 @@
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import search, transfer
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserStats
+from .utils import clear_caches
+
+User = get_user_model()
+
+PUB_DATE = datetime(1854, 3, 14, 12, 30, 0, 123456, tzinfo=timezone.utc)
+
+
+def record(model, pk, **fields):
+    return json.dumps({'model': model, 'pk': pk, 'fields': fields})
+
+
+def source():
+    return '\n'.join([
+        record('auth.user', 7, username='leo', password='!',
+               first_name='Лев', last_name='Толстой', email='',
+               is_staff=False, is_active=True, is_superuser=False,
+               last_login=None, date_joined=PUB_DATE.isoformat()),
+        record('auth.user', 8, username='reader', password='!',
+               first_name='', last_name='', email='',
+               is_staff=False, is_active=True, is_superuser=False,
+               last_login=None, date_joined=PUB_DATE.isoformat()),
+        record('posts.group', 3, title='Дневники', slug='diaries',
+               description='Описание'),
+        record('posts.post', 41, text='Начинаю новую тетрадь дневника',
+               pub_date=PUB_DATE.isoformat(), author=7, group=3, image=''),
+        record('posts.post', 42, text='Без группы',
+               pub_date=PUB_DATE.isoformat(), author=7, group=None,
+               image=''),
+        record('posts.post', 43, text='Автора нет в файле',
+               pub_date=PUB_DATE.isoformat(), author=99, group=None,
+               image=''),
+        record('posts.comment', 5, post=41, author=8, text='Красиво',
+               created=PUB_DATE.isoformat()),
+        record('posts.follow', 1, user=8, author=7),
+    ]) + '\n'
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        clear_caches()
+
+    def test_load(self):
+        """Импорт переводит ссылки, сохраняет даты и id постов."""
+        User.objects.create_user(username='someone')
+        importer = transfer.load(io.StringIO(source()), batch_size=1)
+        self.assertEqual(importer.skipped, 1)
+        leo = User.objects.get(username='leo')
+        post = Post.objects.get(pk=41)
+        self.assertEqual(post.author, leo)
+        self.assertEqual(post.group.slug, 'diaries')
+        self.assertEqual(post.pub_date, PUB_DATE)
+        self.assertFalse(Post.objects.filter(pk=43).exists())
+        comment = Comment.objects.get(pk=5)
+        self.assertEqual(comment.author.username, 'reader')
+        self.assertEqual(comment.created, PUB_DATE)
+        self.assertTrue(Follow.objects.filter(
+            user__username='reader', author=leo).exists())
+
+    def test_side_effects(self):
+        """Счётчики, ленты подписок и поиск обновляются после импорта."""
+        transfer.load(io.StringIO(source()))
+        leo = User.objects.get(username='leo')
+        self.assertEqual(UserStats.objects.get(user=leo).posts_count, 2)
+        self.assertEqual(UserStats.objects.get(user=leo).followers_count, 1)
+        self.assertEqual(Post.objects.get(pk=41).comments_count, 1)
+        self.assertEqual(Group.objects.get().posts_count, 1)
+        self.assertEqual(TimelineEntry.objects.filter(
+            user__username='reader').count(), 2)
+        self.assertEqual(len(search.search('тетрадь')), 1)
+
+    def test_reload_is_idempotent(self):
+        """Повторный импорт того же файла ничего не дублирует."""
+        transfer.load(io.StringIO(source()))
+        transfer.load(io.StringIO(source()))
+        self.assertEqual(User.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка в пустую базу дают те же посты."""
+        transfer.load(io.StringIO(source()))
+        exported = io.StringIO()
+        self.assertEqual(transfer.dump(exported, batch_size=2), 7)
+        User.objects.all().delete()
+        Group.objects.all().delete()
+        transfer.load(io.StringIO(exported.getvalue()))
+        again = io.StringIO()
+        transfer.dump(again)
+
+        def posts(dumped):
+            records = [json.loads(line) for line in dumped.splitlines()]
+            return [
+                (item['pk'], item['fields']['text'],
+                 item['fields']['pub_date'])
+                for item in records if item['model'] == 'posts.post'
+            ]
+        self.assertEqual(posts(again.getvalue()), posts(exported.getvalue()))
+        self.assertEqual(len(posts(again.getvalue())), 2)
+
+    def test_bad_line(self):
+        """Испорченная строка останавливает импорт с номером строки."""
+        with self.assertRaisesMessage(ValueError, 'Строка 2'):
+            transfer.load(io.StringIO(source().replace('\n', '\n{', 1)))
+
+    def test_commands(self):
+        """export_posts и import_posts работают через файл."""
+        transfer.load(io.StringIO(source()))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dump.ndjson.gz')
+            call_command('export_posts', path, stdout=io.StringIO())
+            Post.objects.all().delete()
+            out = io.StringIO()
+            call_command('import_posts', path, stdout=out)
+        self.assertIn('posts.post: 2', out.getvalue())
+        self.assertEqual(Post.objects.count(), 2)
+
+    def test_replies(self):
+        """Ответы переносятся с parent; ответ без родителя пропускается."""
+        replies = '\n'.join([
+            record('posts.comment', 6, post=41, parent=5, author=7,
+                   text='Спасибо', created=PUB_DATE.isoformat()),
+            record('posts.comment', 7, post=41, parent=99, author=7,
+                   text='Сирота', created=PUB_DATE.isoformat()),
+        ]) + '\n'
+        importer = transfer.load(io.StringIO(source() + replies))
+        self.assertEqual(importer.skipped, 2)
+        self.assertEqual(Comment.objects.get(pk=6).parent_id, 5)
+        self.assertEqual(Comment.objects.get(pk=5).replies_count, 1)
+        exported = io.StringIO()
+        transfer.dump(exported)
+        self.assertIn('"parent": 5', exported.getvalue())
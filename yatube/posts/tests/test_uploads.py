@@ -0,0 +1,85 @@
+import io
+import os
+import shutil
+import tempfile
+
+from PIL import Image
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import thumbnails
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def image_file(size, name='photo.png', noise=False):
+    image = Image.new('RGB', size, (10, 120, 200))
+    if noise:
+        image = Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class UploadLimitTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def post_image(self, image):
+        return self.client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': image}
+        )
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=10 * 1024)
+    def test_too_large_file_is_rejected(self):
+        """Файл больше лимита отклоняется с ошибкой поля image."""
+        response = self.post_image(image_file((200, 200), noise=True))
+        self.assertFormError(
+            response, 'form', 'image', 'Файл больше 10,0\xa0КБ.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=10 ** 6)
+    def test_too_many_pixels_is_rejected(self):
+        """Картинка с числом пикселей больше лимита отклоняется."""
+        response = self.post_image(image_file((1001, 1000)))
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 1 мегапикселей.')
+        self.assertFalse(Post.objects.exists())
+
+    def test_image_within_limits_is_saved(self):
+        """Картинка в пределах лимитов сохраняется как раньше."""
+        self.post_image(image_file((300, 200)))
+        post = Post.objects.get()
+        self.assertEqual((post.image.width, post.image.height), (300, 200))
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_oversized_original_is_downsampled_in_background(self):
+        """Фоновая задача уменьшает исходник и удаляет прежний файл."""
+        self.post_image(image_file((300, 200)))
+        post = Post.objects.get()
+        original = post.image.path
+        thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        self.assertEqual((post.image.width, post.image.height), (100, 67))
+        self.assertFalse(os.path.exists(original))
+        self.assertTrue(post.ready_thumbnails)
+        self.assertTrue(post.ready_variants)
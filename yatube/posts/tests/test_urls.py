@@ -2,6 +2,7 @@ from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 
 from ..models import Group, Post
+from .utils import clear_caches
 
 
 User = get_user_model()
@@ -23,6 +24,7 @@ class PostURLTests(TestCase):
         )
 
     def setUp(self):
+        clear_caches()
         self.guest_client = Client()
         self.user = User.objects.create(username='NoName')
         self.authorized_client = Client()
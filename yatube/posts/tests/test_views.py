@@ -7,6 +7,7 @@ from ..models import Post, Comment
 
 
 from ..models import Group, Post, User
+from .utils import clear_caches
 
 User = get_user_model()
 
@@ -27,6 +28,7 @@ class PostPagesTests(TestCase):
         )
 
     def setUp(self):
+        clear_caches()
         self.guest_client = Client()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
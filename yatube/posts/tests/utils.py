@@ -0,0 +1,7 @@
+from django.core.cache import caches
+
+
+def clear_caches():
+    """Очищает все алиасы кэша: они могут жить в разных хранилищах."""
+    for cache in caches.all():
+        cache.clear()
@@ -0,0 +1,162 @@
+"""Фоновая генерация миниатюр картинок постов.
+
+Раньше {% thumbnail %} строил миниатюру при первом показе поста в ленте
+и обращался к хранилищу на каждом рендере. Теперь после сохранения
+поста с новой картинкой все размеры из POST_THUMBNAILS строятся в пуле
+потоков вместе с вариантами для srcset (см. variants), а их адреса и
+размеры записываются в Post.thumbnails и Post.image_variants. Шаблоны
+берут готовые данные из строки поста и хранилище не трогают. Здесь же
+уменьшается исходник, если он больше POST_IMAGE_MAX_SIDE. Посты с одним
+и тем же файлом (см. storage) делят миниатюры и варианты, а файл без
+ссылок удаляется release().
+
+Удаление откладывается задачей очереди на IMAGE_RELEASE_DELAY секунд:
+загрузка того же содержимого могла уже найти файл в хранилище, но ещё
+не закоммитить свой пост. Задача проверяет ссылки заново, когда такие
+запросы давно завершились.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections, transaction
+from sorl.thumbnail import delete as delete_thumbnails, get_thumbnail
+
+from core import tasks
+
+from . import generations, uploads, variants
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails'
+            )
+    return _executor
+
+
+def render(image):
+    """Строит все размеры картинки и возвращает данные для Post.thumbnails."""
+    sizes = {}
+    for name, (geometry, options) in settings.POST_THUMBNAILS.items():
+        thumbnail = get_thumbnail(image, geometry, **options)
+        sizes[name] = {
+            'url': thumbnail.url,
+            'width': thumbnail.width,
+            'height': thumbnail.height,
+        }
+    return {'source': image.name, 'sizes': sizes}
+
+
+def _shared(post):
+    """Готовые миниатюры и варианты другого поста с тем же файлом."""
+    siblings = Post.objects.filter(image=post.image.name).exclude(
+        pk=post.pk).only('image', 'thumbnails', 'image_variants')
+    for sibling in siblings[:10]:
+        if sibling.ready_thumbnails and sibling.ready_variants:
+            return sibling.thumbnails, sibling.image_variants
+    return None
+
+
+def _field_file(post, name):
+    field = Post._meta.get_field('image')
+    return field.attr_class(post, field, name)
+
+
+def generate(post_id, reuse=True):
+    post = Post.objects.select_related('group').filter(pk=post_id).first()
+    if post is None or not post.image:
+        return
+    source_name = post.image.name
+    downsampled = uploads.downsample(post.image)
+    if downsampled:
+        post.image.name = downsampled
+    shared = reuse and _shared(post)
+    if shared:
+        thumbnails, image_variants = shared
+    else:
+        thumbnails = render(post.image)
+        image_variants = variants.build(post.image)
+    # Картинку могли заменить, пока строились миниатюры: тогда
+    # запись пропускается, её сделает задача для новой картинки.
+    updated = Post.objects.filter(pk=post_id, image=source_name).update(
+        image=post.image.name,
+        thumbnails=thumbnails,
+        image_variants=image_variants
+    )
+    if downsampled:
+        release_later(source_name if updated else downsampled)
+    if updated:
+        # update() не шлёт сигналов, закэшированные ленты сбрасываем сами.
+        generations.bump(*generations.post_names(post))
+
+
+def _call(job, *args):
+    try:
+        job(*args)
+    except Exception:
+        logger.exception(
+            'Фоновая задача %s%r не выполнена', job.__name__, args)
+
+
+def _run(job, *args):
+    try:
+        _call(job, *args)
+    finally:
+        connections.close_all()
+
+
+def _submit_on_commit(job, *args):
+    # В режиме TASKS_EAGER, как и задачи очереди, работа выполняется
+    # сразу после коммита: иначе поток пула переживает запрос и пишет
+    # в хранилище, которое тесты уже удалили.
+    if settings.TASKS_EAGER:
+        transaction.on_commit(lambda: _call(job, *args))
+        return
+    transaction.on_commit(lambda: _pool().submit(_run, job, *args))
+
+
+def release(field_file):
+    """Удаляет файл картинки, если на него не ссылается ни один пост.
+
+    Вместе с исходником удаляются его миниатюры и варианты srcset.
+    """
+    name = field_file.name
+    if not name or Post.objects.filter(image=name).exists():
+        return False
+    delete_thumbnails(field_file, delete_file=False)
+    variants.delete(name)
+    field_file.storage.delete(name)
+    return True
+
+
+@tasks.task('posts.release_images')
+def _release_images(payloads):
+    for name in {payload['name'] for payload in payloads}:
+        release(_field_file(Post(), name))
+
+
+def release_later(name):
+    """Освобождает картинку задачей очереди через IMAGE_RELEASE_DELAY."""
+    if settings.TASKS_EAGER:
+        # Без воркера задержку не выдержать: файл освобождается сразу,
+        # как и другие задачи, а ошибка хранилища только пишется в лог.
+        _call(release, _field_file(Post(), name))
+        return
+    tasks.enqueue('posts.release_images', {'name': name},
+                  delay=settings.IMAGE_RELEASE_DELAY)
+
+
+def schedule(post):
+    """Ставит генерацию в пул, когда транзакция с постом закоммичена."""
+    _submit_on_commit(generate, post.pk)
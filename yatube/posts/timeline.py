@@ -0,0 +1,329 @@
+"""Ленты подписок с раскладкой постов при записи (fan-out-on-write).
+
+Новый пост сразу записывается в TimelineEntry каждого подписчика автора
+вместе с его pub_date, поэтому страница ленты — это срез TimelineEntry
+по индексу (user, -pub_date, -post) без JOIN и сортировки, а посты
+страницы читаются потом по id. Посты авторов, у которых подписчиков
+больше TIMELINE_FANOUT_MAX_FOLLOWERS, не раскладываются: такие авторы
+подмешиваются в ленту при чтении (fan-out-on-read) срезом по индексу
+автора, и срезы сливаются по ключу (pub_date, id).
+
+Когда автор переходит порог после подписки или отписки, sync_authors()
+сразу обновляет список популярных и переводит ленты его подписчиков:
+за порогом строки автора удаляются, а под порогом в ленты дописываются
+посты, которые он опубликовал, пока был популярным.
+"""
+from itertools import groupby
+from operator import attrgetter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.db.models import Count, Q
+
+from .models import Follow, Post, TimelineEntry
+
+CELEBRITIES_CACHE_KEY = 'posts:timeline:celebrities'
+CELEBRITIES_CACHE_TIMEOUT = 60 * 10
+
+
+def celebrity_ids():
+    """Авторы, чьи посты читаются из Post, а не из материализованных лент."""
+    cache = caches[settings.QUERY_CACHE_ALIAS]
+    ids = cache.get(CELEBRITIES_CACHE_KEY)
+    if ids is None:
+        ids = frozenset(
+            Follow.objects.values('author')
+            .annotate(followers=Count('id'))
+            .filter(followers__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS)
+            .values_list('author', flat=True)
+        )
+        cache.set(CELEBRITIES_CACHE_KEY, ids, CELEBRITIES_CACHE_TIMEOUT)
+    return ids
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def fan_out(posts):
+    """Раскладывает новые посты по лентам подписчиков их авторов."""
+    celebrities = celebrity_ids()
+    by_author = attrgetter('author_id')
+    for author_id, author_posts in groupby(sorted(posts, key=by_author),
+                                           key=by_author):
+        if author_id in celebrities:
+            continue
+        author_posts = list(author_posts)
+        followers = Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+        entries = []
+        for user_id in followers.iterator():
+            entries.extend(
+                TimelineEntry(
+                    user_id=user_id, post_id=post.id, pub_date=post.pub_date
+                )
+                for post in author_posts
+            )
+            if len(entries) >= settings.TIMELINE_BATCH_SIZE:
+                _bulk_insert(entries)
+                entries = []
+        _bulk_insert(entries)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    if author_id in celebrity_ids():
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('id', 'pub_date')
+    entries = []
+    for post_id, pub_date in posts.iterator():
+        entries.append(TimelineEntry(
+            user_id=user_id, post_id=post_id, pub_date=pub_date
+        ))
+        if len(entries) >= settings.TIMELINE_BATCH_SIZE:
+            _bulk_insert(entries)
+            entries = []
+    _bulk_insert(entries)
+
+
+def backfill_many(follows):
+    """backfill для пакета подписок одним INSERT ... SELECT.
+
+    Посты не проходят через Python. Условие по спискам пользователей и
+    авторов может захватить и другие их подписки: для них строки уже
+    есть или должны быть, и повторная вставка просто пропускается.
+    """
+    celebrities = celebrity_ids()
+    follows = [
+        follow for follow in follows if follow.author_id not in celebrities
+    ]
+    if not follows:
+        return
+    _insert_select(Follow.objects.filter(
+        user_id__in={follow.user_id for follow in follows},
+        author_id__in={follow.author_id for follow in follows},
+    ))
+
+
+def _insert_select(follows):
+    """Вставляет в ленты подписок follows все посты их авторов."""
+    select = follows.filter(
+        author__post__isnull=False
+    ).order_by().values_list(
+        'user_id', 'author__post__id', 'author__post__pub_date'
+    )
+    sql, params = select.query.sql_with_params()
+    ops = connection.ops
+    table = ops.quote_name(TimelineEntry._meta.db_table)
+    columns = ', '.join(
+        ops.quote_name(column) for column in ('user_id', 'post_id', 'pub_date')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'{ops.insert_statement(ignore_conflicts=True)} {table} '
+            f'({columns}) {sql} {ops.ignore_conflicts_suffix_sql(True)}',
+            params
+        )
+
+
+def prune(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def sync_authors(author_ids):
+    """Переводит ленты подписчиков авторов, перешедших порог популярности.
+
+    Признак перехода — строки последнего поста автора: у популярного их
+    быть не должно, у обычного их столько же, сколько подписчиков.
+    Возвращает авторов, чьи подписчики получили другие ленты.
+    """
+    followers = dict(
+        Follow.objects.filter(author_id__in=author_ids).values('author')
+        .annotate(followers=Count('id')).values_list('author', 'followers')
+    )
+    limit = settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    celebrities = {
+        author_id for author_id, number in followers.items() if number > limit
+    }
+    if celebrities != celebrity_ids() & set(author_ids):
+        caches[settings.QUERY_CACHE_ALIAS].delete(CELEBRITIES_CACHE_KEY)
+    changed = []
+    for author_id in author_ids:
+        latest = Post.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id').values_list('id', flat=True).first()
+        if latest is None:
+            continue
+        entries = TimelineEntry.objects.filter(post_id=latest)
+        if author_id in celebrities:
+            if entries.exists():
+                TimelineEntry.objects.filter(
+                    post__author_id=author_id).delete()
+                changed.append(author_id)
+        elif entries.count() < followers.get(author_id, 0):
+            _insert_select(Follow.objects.filter(author_id=author_id))
+            changed.append(author_id)
+    return changed
+
+
+def rebuild(user_id):
+    """Пересобирает ленту пользователя по его текущим подпискам."""
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    authors = Follow.objects.filter(
+        user_id=user_id
+    ).values_list('author_id', flat=True)
+    for author_id in authors:
+        backfill(user_id, author_id)
+
+
+def pulled_author_ids(user):
+    """Популярные авторы из подписок, чьи посты подмешиваются при чтении."""
+    celebrities = celebrity_ids()
+    if not celebrities:
+        return []
+    return list(Follow.objects.filter(
+        user=user, author_id__in=celebrities
+    ).values_list('author_id', flat=True))
+
+
+def _entry_q(condition):
+    """Условие по полям Post в условие по полям TimelineEntry."""
+    translated = Q()
+    translated.connector = condition.connector
+    translated.negated = condition.negated
+    for child in condition.children:
+        if isinstance(child, Q):
+            child = _entry_q(child)
+        else:
+            lookup, value = child
+            field, _, rest = lookup.partition('__')
+            field = 'post_id' if field in ('id', 'pk') else field
+            child = ('__'.join(filter(None, (field, rest))), value)
+        translated.children.append(child)
+    return translated
+
+
+class FollowFeed:
+    """Посты ленты подписок в порядке (-pub_date, -id).
+
+    Ведёт себя для Paginator и CursorPaginator как queryset Post:
+    count, order_by по этим двум полям, filter с условием курсора,
+    values и ленивые срезы. Срез читает ключи (pub_date, id) из
+    TimelineEntry и из постов подмешиваемых авторов — каждый источник
+    по своему индексу и не больше конца среза, — сливает их и загружает
+    посты страницы одним запросом по id.
+    """
+    model = Post
+    ordered = True
+
+    def __init__(self, user_id, pulled, posts=None, descending=True,
+                 conditions=(), limits=(0, None)):
+        self.user_id = user_id
+        self.pulled = list(pulled)
+        self.posts = Post.objects.feed() if posts is None else posts
+        self.descending = descending
+        self.conditions = tuple(conditions)
+        self.limits = limits
+        self._result = None
+
+    def _clone(self, **changes):
+        options = {
+            'posts': self.posts,
+            'descending': self.descending,
+            'conditions': self.conditions,
+            'limits': self.limits,
+            **changes
+        }
+        return FollowFeed(self.user_id, self.pulled, **options)
+
+    def _ordering(self, *fields):
+        return [f'-{name}' if self.descending else name for name in fields]
+
+    def sources(self):
+        """Запросы ключей (pub_date, id): лента и подмешиваемые авторы."""
+        entries = TimelineEntry.objects.filter(user_id=self.user_id)
+        if self.pulled:
+            # Старые строки авторов, ставших популярными, не дублируют
+            # их посты из второго источника.
+            entries = entries.exclude(post__author_id__in=self.pulled)
+        for condition in self.conditions:
+            entries = entries.filter(_entry_q(condition))
+        sources = [entries.order_by(
+            *self._ordering('pub_date', 'post_id')
+        ).values_list('pub_date', 'post_id')]
+        for author_id in self.pulled:
+            # По запросу на автора: IN по нескольким авторам SQLite
+            # сортирует во временном B-дереве.
+            posts = Post.objects.filter(author_id=author_id)
+            for condition in self.conditions:
+                posts = posts.filter(condition)
+            sources.append(posts.order_by(
+                *self._ordering('pub_date', 'id')
+            ).values_list('pub_date', 'id'))
+        return sources
+
+    def count(self):
+        return sum(source.count() for source in self.sources())
+
+    def order_by(self, *ordering):
+        ordering = tuple(ordering)
+        if ordering == ('-pub_date', '-id'):
+            return self._clone(descending=True)
+        if ordering == ('pub_date', 'id'):
+            return self._clone(descending=False)
+        raise ValueError(f'Лента подписок не сортируется по {ordering}')
+
+    def filter(self, *conditions):
+        return self._clone(conditions=self.conditions + conditions)
+
+    def values(self, *fields):
+        return self._clone(posts=self.posts.values(*fields))
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice) or key.step is not None:
+            raise TypeError('Ленту подписок можно только срезать')
+        start, stop = self.limits
+        key_start = key.start or 0
+        key_stop = stop if key.stop is None else start + key.stop
+        if stop is not None and key_stop is not None:
+            key_stop = min(key_stop, stop)
+        return self._clone(limits=(start + key_start, key_stop))
+
+    def _fetch(self):
+        start, stop = self.limits
+        keys = []
+        for source in self.sources():
+            keys.extend(source if stop is None else source[:stop])
+        keys.sort(reverse=self.descending)
+        ids = [post_id for _, post_id in keys[start:stop]]
+        # Порядок уже задан ключами: посты страницы читаются без сортировки.
+        rows = {
+            row['id'] if isinstance(row, dict) else row.pk: row
+            for row in self.posts.filter(pk__in=ids).order_by()
+        }
+        return [rows[post_id] for post_id in ids if post_id in rows]
+
+    def __iter__(self):
+        if self._result is None:
+            self._result = self._fetch()
+        return iter(self._result)
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+
+def follow_feed(user, pulled=None):
+    """Посты ленты подписок пользователя."""
+    if pulled is None:
+        pulled = pulled_author_ids(user)
+    return FollowFeed(user.pk, pulled)
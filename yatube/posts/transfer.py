@@ -0,0 +1,273 @@
+"""Потоковый экспорт и импорт данных в NDJSON.
+
+Одна строка файла — один объект в виде, близком к dumpdata:
+{"model": "posts.post", "pk": 2, "fields": {...}}. Порядок моделей
+фиксирован (пользователи, группы, посты, комментарии, подписки), поэтому
+при импорте каждая ссылка указывает на уже загруженный объект. В отличие
+от dumpdata и loaddata ни экспорт, ни импорт не держат данные в памяти
+целиком: строки читаются и пишутся порциями по batch_size, а вставка
+идёт пакетами.
+
+Пользователи и группы сопоставляются по username и slug: существующие
+не дублируются, а id из файла переводятся в id базы словарём, размер
+которого ограничен числом авторов и групп, а не постов. Посты и
+комментарии сохраняют id из файла, конфликтующие строки пропускаются,
+так что повторный импорт того же файла ничего не дублирует. Импорт
+рассчитан на пустую базу или базу, загруженную из того же источника.
+
+bulk_create не посылает сигналов: поисковый индекс, ленты подписок и
+поколения кэша обновляются здесь после каждой порции, а счётчики
+пересчитываются одним проходом в конце. Файлы картинок не переносятся,
+только их имена; миниатюры строит generate_thumbnails.
+"""
+import json
+from itertools import groupby
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import counters, generations, search, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+USER_FIELDS = (
+    'username', 'password', 'first_name', 'last_name', 'email',
+    'is_staff', 'is_active', 'is_superuser', 'last_login', 'date_joined',
+)
+DATETIME_FIELDS = ('last_login', 'date_joined', 'pub_date', 'created')
+RECORD_KEYS = {'model', 'pk', 'fields'}
+
+# Модель, её метка в файле и выгружаемые поля, в порядке загрузки.
+EXPORTS = (
+    (User, 'auth.user', USER_FIELDS),
+    (Group, 'posts.group', ('title', 'slug', 'description')),
+    (Post, 'posts.post', ('text', 'pub_date', 'author', 'group', 'image')),
+    (Comment, 'posts.comment',
+     ('post', 'parent', 'author', 'text', 'created')),
+    (Follow, 'posts.follow', ('user', 'author')),
+)
+
+
+def _default(value):
+    # isoformat() сохраняет микросекунды, в отличие от DjangoJSONEncoder.
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} не сериализуется в JSON')
+
+
+def dump(stream, batch_size=1000):
+    """Пишет все объекты в stream построчно, возвращает их число."""
+    written = 0
+    for model, label, fields in EXPORTS:
+        rows = model.objects.order_by('pk').values_list('pk', *fields)
+        for pk, *values in rows.iterator(chunk_size=batch_size):
+            record = {
+                'model': label,
+                'pk': pk,
+                'fields': dict(zip(fields, values)),
+            }
+            stream.write(json.dumps(
+                record, default=_default, ensure_ascii=False) + '\n')
+            written += 1
+    return written
+
+
+def _records(stream):
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            raise ValueError(f'Строка {number}: {error}')
+        if not isinstance(record, dict) or not RECORD_KEYS <= record.keys():
+            raise ValueError(f'Строка {number}: нет model, pk или fields')
+        yield record
+
+
+def _chunks(records, batch_size):
+    """Порции подряд идущих записей одной модели."""
+    for label, group in groupby(records, key=lambda record: record['model']):
+        chunk = []
+        for record in group:
+            chunk.append(record)
+            if len(chunk) >= batch_size:
+                yield label, chunk
+                chunk = []
+        if chunk:
+            yield label, chunk
+
+
+def _parse_dates(fields):
+    for name in DATETIME_FIELDS:
+        if isinstance(fields.get(name), str):
+            fields[name] = parse_datetime(fields[name])
+    return fields
+
+
+def _raw_insert(model, objects):
+    """Вставка с id из файла и без auto_now_add, как у loaddata (raw)."""
+    fields = model._meta.local_concrete_fields
+    size = max(connection.ops.bulk_batch_size(fields, objects), 1)
+    for start in range(0, len(objects), size):
+        model.objects._insert(
+            objects[start:start + size], fields=fields,
+            raw=True, ignore_conflicts=True
+        )
+
+
+class Importer:
+    """Загружает порции записей и переводит ссылки в id базы."""
+
+    def __init__(self):
+        self.ids = {'auth.user': {}, 'posts.group': {}}
+        self.counts = dict.fromkeys(
+            (label for _, label, _ in EXPORTS), 0)
+        self.skipped = 0
+
+    def _natural(self, model, label, key, chunk):
+        """Сопоставляет по key; недостающие объекты создаёт пакетом."""
+        by_key = {record['fields'][key]: record for record in chunk}
+        existing = dict(model.objects.filter(
+            **{f'{key}__in': by_key}).values_list(key, 'pk'))
+        model.objects.bulk_create([
+            model(**_parse_dates(dict(record['fields'])))
+            for value, record in by_key.items() if value not in existing
+        ])
+        existing.update(model.objects.filter(
+            **{f'{key}__in': set(by_key) - set(existing)}
+        ).values_list(key, 'pk'))
+        for value, record in by_key.items():
+            self.ids[label][record['pk']] = existing[value]
+        return len(by_key)
+
+    def _ref(self, label, value):
+        return self.ids[label].get(value) if value is not None else None
+
+    def users(self, chunk):
+        return self._natural(User, 'auth.user', 'username', chunk)
+
+    def groups(self, chunk):
+        loaded = self._natural(Group, 'posts.group', 'slug', chunk)
+        generations.bump(*(
+            generations.group(record['fields']['slug'])
+            for record in chunk
+        ))
+        return loaded
+
+    def posts(self, chunk):
+        posts = []
+        for record in chunk:
+            fields = _parse_dates(dict(record['fields']))
+            author_id = self._ref('auth.user', fields.pop('author'))
+            if author_id is None:
+                self.skipped += 1
+                continue
+            posts.append(Post(
+                pk=record['pk'],
+                author_id=author_id,
+                group_id=self._ref('posts.group', fields.pop('group')),
+                **fields
+            ))
+        if not posts:
+            return 0
+        _raw_insert(Post, posts)
+        search.index_posts(posts)
+        generations.bump(*generations.batch_names(posts))
+        return len(posts)
+
+    def comments(self, chunk):
+        post_ids = set(Post.objects.filter(
+            pk__in={record['fields']['post'] for record in chunk}
+        ).values_list('pk', flat=True))
+        # Ответ ссылается на комментарий из базы или из этой же порции:
+        # записи идут по возрастанию id, родитель всегда раньше.
+        parent_ids = set(Comment.objects.filter(
+            pk__in={record['fields'].get('parent') for record in chunk}
+        ).values_list('pk', flat=True))
+        comments = []
+        for record in chunk:
+            fields = _parse_dates(dict(record['fields']))
+            author_id = self._ref('auth.user', fields.pop('author'))
+            post_id = fields.pop('post')
+            parent_id = fields.pop('parent', None)
+            if (author_id is None or post_id not in post_ids
+                    or parent_id is not None and parent_id not in parent_ids):
+                self.skipped += 1
+                continue
+            parent_ids.add(record['pk'])
+            comments.append(Comment(
+                pk=record['pk'], author_id=author_id, post_id=post_id,
+                parent_id=parent_id, **fields
+            ))
+        if not comments:
+            return 0
+        _raw_insert(Comment, comments)
+        generations.bump(*(
+            generations.post(post_id)
+            for post_id in {comment.post_id for comment in comments}
+        ))
+        return len(comments)
+
+    def follows(self, chunk):
+        follows = []
+        for record in chunk:
+            user_id = self._ref('auth.user', record['fields']['user'])
+            author_id = self._ref('auth.user', record['fields']['author'])
+            if user_id is None or author_id is None or user_id == author_id:
+                self.skipped += 1
+                continue
+            follows.append(Follow(user_id=user_id, author_id=author_id))
+        if not follows:
+            return 0
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        timeline.backfill_many(follows)
+        generations.bump(*{
+            name for follow in follows
+            for name in (generations.follow(follow.user_id),
+                         generations.author(follow.author_id),
+                         generations.author(follow.user_id))
+        })
+        return len(follows)
+
+    def add(self, label, chunk):
+        handlers = {
+            'auth.user': self.users,
+            'posts.group': self.groups,
+            'posts.post': self.posts,
+            'posts.comment': self.comments,
+            'posts.follow': self.follows,
+        }
+        if label not in handlers:
+            raise ValueError(f'Неизвестная модель {label}')
+        with transaction.atomic():
+            self.counts[label] += handlers[label](chunk)
+
+    def finish(self):
+        # Посты и комментарии вставлены с явными id: последовательности
+        # нужно сдвинуть за них (в SQLite это делает сам AUTOINCREMENT).
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [Post, Comment])
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+        counters.recount()
+        generations.bump(generations.GLOBAL)
+
+
+def load_records(records, batch_size=1000):
+    """Загружает итератор записей, возвращает Importer со статистикой."""
+    importer = Importer()
+    for label, chunk in _chunks(records, batch_size):
+        importer.add(label, chunk)
+    importer.finish()
+    return importer
+
+
+def load(stream, batch_size=1000):
+    """Загружает NDJSON из stream, возвращает Importer со статистикой."""
+    return load_records(_records(stream), batch_size)
@@ -0,0 +1,110 @@
+"""Загрузка картинок постов с ограничениями по размеру.
+
+BoundedUploadHandler пишет загрузку во временный файл по мере прихода
+кусков, не держа её в памяти воркера. Когда файл превышает
+POST_IMAGE_MAX_UPLOAD_SIZE, остаток потока отбрасывается. Готовый файл
+проверяется по заголовку: Pillow читает только размеры без
+декодирования пикселей, поэтому «бомба распаковки» отклоняется до того,
+как ImageField формы начнёт её разбирать. Причина отказа сохраняется
+в upload_error загруженного файла, а PostForm показывает её как ошибку
+поля. Слишком большие по сторонам исходники принимаются и уменьшаются
+позже, в фоновом пуле миниатюр (см. downsample).
+"""
+import io
+import os
+import warnings
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+
+def image_size(file):
+    """Размеры картинки по заголовку или None, если это не картинка.
+
+    DecompressionBombError пробрасывается наружу.
+    """
+    file.seek(0)
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            with Image.open(file) as image:
+                return image.size
+    except Image.DecompressionBombError:
+        raise
+    except Exception:
+        return None
+    finally:
+        file.seek(0)
+
+
+def upload_error(file):
+    """Причина отказа для загруженного файла или None."""
+    if file.size > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+        return 'Файл больше {}.'.format(
+            filesizeformat(settings.POST_IMAGE_MAX_UPLOAD_SIZE))
+    too_many_pixels = 'Картинка больше {} мегапикселей.'.format(
+        settings.POST_IMAGE_MAX_PIXELS // 10 ** 6)
+    try:
+        size = image_size(file)
+    except Image.DecompressionBombError:
+        return too_many_pixels
+    if size is None:
+        # Не картинка: пусть об этом скажет ImageField формы.
+        return None
+    width, height = size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        return too_many_pixels
+    return None
+
+
+class BoundedUploadHandler(TemporaryFileUploadHandler):
+    """Потоковая загрузка во временный файл с ограничением размера."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            # Лишние байты не пишем на диск и не держим в памяти.
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.size = self.received
+        file.upload_error = upload_error(file)
+        return file
+
+
+def downsample(image):
+    """Уменьшает исходник больше POST_IMAGE_MAX_SIDE, возвращает новое имя.
+
+    Вызывается из фонового пула, а не в запросе. Если уменьшать не
+    нужно, возвращает None.
+    """
+    limit = settings.POST_IMAGE_MAX_SIDE
+    with image.open('rb') as source:
+        original = Image.open(source)
+        if max(original.size) <= limit:
+            return None
+        image_format = original.format
+        if image_format == 'JPEG':
+            # JPEG умеет декодироваться сразу в уменьшенном масштабе.
+            original.draft('RGB', (limit, limit))
+        original = ImageOps.exif_transpose(original)
+        original.thumbnail((limit, limit), Image.LANCZOS)
+    if image_format not in ('JPEG', 'PNG', 'WEBP'):
+        image_format = 'PNG'
+    if image_format == 'JPEG' and original.mode != 'RGB':
+        original = original.convert('RGB')
+    buffer = io.BytesIO()
+    original.save(buffer, image_format, quality=90, optimize=True)
+    stem, _ = os.path.splitext(image.name)
+    extension = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}[image_format]
+    return image.storage.save(
+        f'{stem}.{extension}', ContentFile(buffer.getvalue()))
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, live, views
 
 app_name = 'posts'
 
@@ -9,12 +9,33 @@ urlpatterns = [
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('posts/<int:post_id>/comments/',
+         views.comment_list, name='comment_list'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<post_id>/edit/',
          views.post_edit, name='post_edit'),
     path('posts/<int:post_id>/comment/',
          views.add_comment, name='add_comment'),
     path('follow/', views.follow_index, name='follow_index'),
+    path('notifications/', views.notification_list, name='notifications'),
+    path('search/', views.post_search, name='post_search'),
+    path('events/', live.index_events, name='index_events'),
+    path('events/group/<slug:slug>/',
+         live.group_events, name='group_events'),
+    path('events/follow/', live.follow_events, name='follow_events'),
+    path('api/v1/posts/', api.post_list, name='api_post_list'),
+    path('api/v1/posts/<int:post_id>/',
+         api.post_detail, name='api_post_detail'),
+    path('api/v1/group/<slug:slug>/',
+         api.group_posts, name='api_group_posts'),
+    path('api/v1/profile/<str:username>/',
+         api.profile_posts, name='api_profile_posts'),
+    path('api/v1/follow/', api.follow_posts, name='api_follow_posts'),
+    path('api/v1/posts/bulk/', api.bulk_posts, name='api_bulk_posts'),
+    path('api/v1/notifications/unread/',
+         api.unread_notifications, name='api_unread_notifications'),
+    path('api/v1/comments/bulk/',
+         api.bulk_comments, name='api_bulk_comments'),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -0,0 +1,165 @@
+"""Адаптивные варианты картинок постов для <picture> и srcset.
+
+Картинка один раз декодируется, кадрируется под пропорции ленты и
+сохраняется в нескольких ширинах (POST_IMAGE_WIDTHS) и форматах
+(POST_IMAGE_FORMATS): современные AVIF и WebP плюс JPEG как запасной
+вариант. Форматы, для которых в Pillow нет кодировщика, пропускаются.
+Манифест с адресами и строками srcset хранится в Post.image_variants,
+и браузер сам выбирает самый лёгкий подходящий файл.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+try:
+    import pillow_avif  # noqa: F401 — регистрирует кодировщик AVIF
+except ImportError:
+    pass
+
+FALLBACK_FORMAT = 'JPEG'
+MIME_TYPES = {
+    'AVIF': 'image/avif',
+    'WEBP': 'image/webp',
+    'JPEG': 'image/jpeg',
+}
+EXTENSIONS = {
+    'AVIF': 'avif',
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+}
+
+
+def supported_formats():
+    """Форматы из настроек, которые Pillow умеет сохранять."""
+    Image.init()
+    return [
+        image_format for image_format in settings.POST_IMAGE_FORMATS
+        if image_format in Image.SAVE and image_format in MIME_TYPES
+    ]
+
+
+def _feed_size():
+    geometry, _ = settings.POST_THUMBNAILS['feed']
+    width, height = geometry.split('x')
+    return int(width), int(height)
+
+
+def _widths(original_width):
+    """Ширины вариантов без увеличения исходника."""
+    widths = [
+        width for width in settings.POST_IMAGE_WIDTHS
+        if width <= original_width
+    ]
+    largest = min(original_width, max(settings.POST_IMAGE_WIDTHS))
+    if largest not in widths:
+        widths.append(largest)
+    return sorted(widths)
+
+
+def _encode(image, image_format):
+    quality = settings.POST_IMAGE_FORMATS[image_format]
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=quality, optimize=True)
+    return buffer.getvalue()
+
+
+def _save(storage, name, data):
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, ContentFile(data))
+
+
+def _load(image):
+    with image.open('rb') as source:
+        original = ImageOps.exif_transpose(Image.open(source))
+        original.load()
+    if original.mode not in ('RGB', 'RGBA'):
+        mode = 'RGBA' if 'A' in original.getbands() else 'RGB'
+        original = original.convert(mode)
+    return original
+
+
+def _resized(original, ratio):
+    """Кадрирует один раз в самой большой ширине и уменьшает до прочих."""
+    widths = _widths(original.width)
+    largest = ImageOps.fit(
+        original,
+        (widths[-1], max(round(widths[-1] * ratio), 1)),
+        Image.LANCZOS
+    )
+    for width in widths:
+        size = (width, max(round(width * ratio), 1))
+        yield largest.resize(size, Image.LANCZOS)
+
+
+def _closest(variants, width):
+    """Вариант для src у старых браузеров: не уже ленты, если такой есть."""
+    wide_enough = [item for item in variants if item['width'] >= width]
+    item = wide_enough[0] if wide_enough else variants[-1]
+    return {key: item[key] for key in ('url', 'width', 'height')}
+
+
+def _folder(name):
+    return 'posts/variants/{}'.format(
+        hashlib.sha1(name.encode()).hexdigest()[:16])
+
+
+def delete(name):
+    """Удаляет все варианты исходника с именем name."""
+    storage = default_storage
+    folder = _folder(name)
+    if not storage.exists(folder):
+        return
+    _, files = storage.listdir(folder)
+    for file_name in files:
+        storage.delete(f'{folder}/{file_name}')
+    storage.delete(folder)
+
+
+def build(image):
+    """Строит все варианты картинки и возвращает манифест."""
+    # Варианты лежат рядом с миниатюрами sorl в обычном хранилище:
+    # их имена и так производные от имени исходника.
+    storage = default_storage
+    folder = _folder(image.name)
+    formats = supported_formats()
+    if FALLBACK_FORMAT not in formats:
+        formats.append(FALLBACK_FORMAT)
+    feed_width, feed_height = _feed_size()
+    files = {image_format: [] for image_format in formats}
+    for variant in _resized(_load(image), feed_height / feed_width):
+        for image_format in formats:
+            name = _save(
+                storage,
+                '{}/{}.{}'.format(
+                    folder, variant.width, EXTENSIONS[image_format]),
+                _encode(variant, image_format)
+            )
+            files[image_format].append({
+                'url': storage.url(name),
+                'width': variant.width,
+                'height': variant.height,
+            })
+    manifest = {
+        'source': image.name,
+        'sizes': settings.POST_IMAGE_SIZES,
+        'sources': [],
+    }
+    for image_format, variants in files.items():
+        entry = {
+            'type': MIME_TYPES[image_format],
+            'srcset': ', '.join(
+                '{url} {width}w'.format(**item) for item in variants),
+        }
+        if image_format == FALLBACK_FORMAT:
+            manifest['fallback'] = dict(
+                entry, **_closest(variants, feed_width))
+        else:
+            manifest['sources'].append(entry)
+    return manifest
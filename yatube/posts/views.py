@@ -1,73 +1,175 @@
+import asyncio
+from urllib.parse import urlencode
+
 from django.core.paginator import Paginator
+from django.http import Http404
 from django.shortcuts import render, get_object_or_404, redirect
+from django.utils.functional import SimpleLazyObject
 from .forms import PostForm, CommentForm
 from django.contrib.auth.decorators import login_required
 
-from .models import Post, Group, User, Follow
+from core.asgi import async_view, sync_to_async
+from . import (conditional, counters, generations, live, notifications,
+               search, timeline)
+from .models import Comment, Post, Group, User, Follow
+from .paginator import CursorPaginator, get_page, mark_invalid
 
 POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+COMMENTS_ORDERING = ('created', 'id')
+NOTIFICATIONS_PER_PAGE = 20
 
 
-def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+@conditional.generation_condition(conditional.index_generations)
+@async_view
+async def index(request):
+    post_list = Post.objects.feed()
+    page_obj, fragments = await asyncio.gather(
+        sync_to_async(get_page)(request, post_list, POSTS_PER_PAGE),
+        sync_to_async(generations.fragment_context)(
+            request, generations.GLOBAL),
+    )
     context = {
         'page_obj': page_obj,
-        'post_list': post_list
+        'post_list': post_list,
+        'live_events': live.enabled(request),
+        **fragments
     }
     return render(request, 'posts/index.html', context)
 
 
-def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+@conditional.generation_condition(conditional.group_generations)
+@async_view
+async def group_posts(request, slug):
+    # Страница выбирается по slug, не дожидаясь самой группы.
+    post_list = Post.objects.feed().filter(group__slug=slug)
+    group, page_obj, fragments = await asyncio.gather(
+        sync_to_async(get_object_or_404)(Group, slug=slug),
+        sync_to_async(get_page)(request, post_list, POSTS_PER_PAGE),
+        sync_to_async(generations.fragment_context)(
+            request, generations.group(slug)),
+    )
     context = {
         'page_obj': page_obj,
         'group': group,
         'post_list': post_list,
+        'live_events': live.enabled(request),
+        **fragments
     }
     return render(request, 'posts/group_list.html', context)
 
 
-def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(author=author)
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    following = request.user.is_authenticated and \
-        Follow.objects.filter(
-            user=request.user,
-            author=author
-        ).exists()
+def _is_following(user, username):
+    return user.is_authenticated and Follow.objects.filter(
+        user=user,
+        author__username=username
+    ).exists()
+
+
+@conditional.generation_condition(conditional.profile_generations)
+@async_view
+async def profile(request, username):
+    post_list = Post.objects.feed().filter(author__username=username)
+    author, page_obj, following = await asyncio.gather(
+        sync_to_async(get_object_or_404)(
+            User.objects.select_related('stats'),
+            username=username
+        ),
+        sync_to_async(get_page)(request, post_list, POSTS_PER_PAGE),
+        sync_to_async(_is_following)(request.user, username),
+    )
     context = {
         'page_obj': page_obj,
         'author': author,
+        'author_stats': counters.stats_for(author),
         'post_list': post_list,
-        'following': following
+        'following': following,
+        **generations.fragment_context(
+            request, generations.author(author.pk))
     }
     return render(request, 'posts/profile.html', context)
 
 
-def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
-    author_posts = Post.objects.filter(author=post.author)
-    form = CommentForm()
-    comments = post.comments.all()
+def _comment_id(value):
+    return int(value) if value and value.isdigit() else None
+
+
+def _comment_page(request, post_id, parent_id):
+    """Курсор для ключа фрагмента и страница ветки.
+
+    Страница читается при первом обращении шаблона: пока фрагмент с
+    комментариями лежит в кэше, запроса к базе нет.
+    """
+    paginator = CursorPaginator(
+        Comment.objects.thread(post_id, parent_id), COMMENTS_PER_PAGE,
+        ordering=COMMENTS_ORDERING
+    )
+    cursor = paginator.canonical_cursor(request.GET.get('cursor', ''))
+    if cursor is None:
+        mark_invalid(request)
+        cursor = ''
+    return cursor, SimpleLazyObject(lambda: paginator.get_page(cursor))
+
+
+def _reply_to(post_id, reply_id):
+    if reply_id is None:
+        return None
+    return Comment.objects.filter(
+        pk=reply_id, post_id=post_id).select_related('author').first()
+
+
+@conditional.generation_condition(conditional.post_generations)
+@async_view
+async def post_detail(request, post_id):
+    post, reply_to = await asyncio.gather(
+        sync_to_async(get_object_or_404)(Post.objects.feed(), id=post_id),
+        sync_to_async(_reply_to)(
+            post_id, _comment_id(request.GET.get('reply'))),
+    )
+    cursor, comments = _comment_page(request, post.pk, None)
     context = {
-        'author_posts': author_posts,
+        'author_stats': counters.stats_for(post.author),
+        **generations.fragment_settings(),
         'post': post,
-        'form': form,
-        'comments': comments
+        'form': CommentForm(),
+        'reply_to': reply_to,
+        'cursor': cursor,
+        'comments': comments,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@conditional.generation_condition(conditional.post_generations)
+def comment_list(request, post_id):
+    """Следующая страница комментариев или ответов: HTML без обёртки."""
+    # post_generations уже искал автора поста: без поколений поста нет.
+    state = conditional.generation_state(request)
+    if state is None or not state[0]:
+        raise Http404('Пост не найден')
+    parent_id = _comment_id(request.GET.get('parent'))
+    cursor, comments = _comment_page(request, post_id, parent_id)
+    context = {
+        **generations.fragment_settings(),
+        'post_id': post_id,
+        'parent_id': parent_id,
+        'cursor': cursor,
+        'comments': comments,
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = Paginator(search.search(query), POSTS_PER_PAGE).get_page(
+        request.GET.get('page'))
+    context = {
+        'page_obj': page_obj,
+        'query': query,
+        'pagination_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -105,27 +207,58 @@ def post_edit(request, post_id):
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
+    # parent не входит в форму: ответ возможен только внутри того же поста.
+    parent = None
+    if request.POST.get('parent'):
+        parent = get_object_or_404(
+            Comment, pk=_comment_id(request.POST['parent']), post=post)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
+        comment.parent = parent
         comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
-def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, POSTS_PER_PAGE)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+@conditional.generation_condition(conditional.follow_generations)
+@async_view
+async def follow_index(request):
+    pulled = await sync_to_async(conditional.pulled_author_ids)(request)
+    post_list = timeline.follow_feed(request.user, pulled)
+    names = [generations.follow(request.user.pk)] + [
+        generations.author(author_id) for author_id in pulled
+    ]
+    page_obj, fragments = await asyncio.gather(
+        sync_to_async(get_page)(request, post_list, POSTS_PER_PAGE),
+        sync_to_async(generations.fragment_context)(request, *names),
+    )
     context = {
         'page_obj': page_obj,
-        'post_list': post_list
+        'post_list': post_list,
+        'live_events': live.enabled(request),
+        **fragments
     }
     return render(request, 'posts/follow.html', context)
 
 
+@login_required
+def notification_list(request):
+    paginator = CursorPaginator(
+        notifications.inbox(request.user), NOTIFICATIONS_PER_PAGE,
+        ordering=('-updated', '-id')
+    )
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    # Показанные уведомления становятся прочитанными; в шаблоне они ещё
+    # выделены как новые.
+    notifications.mark_read(request.user, [
+        notification.pk for notification in page_obj
+        if not notification.is_read
+    ])
+    return render(request, 'posts/notifications.html', {'page_obj': page_obj})
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
@@ -134,16 +267,9 @@ def profile_follow(request, username):
             'posts:profile',
             username=username
         )
-    follower = Follow.objects.filter(
-        user=request.user,
-        author=author
-    ).exists()
-    if follower is True:
-        return redirect(
-            'posts:profile',
-            username=username
-        )
-    Follow.objects.create(user=request.user, author=author)
+    # Уникальность пары гарантирует constraint unique_follower,
+    # get_or_create переживает гонку двух одновременных подписок.
+    Follow.objects.get_or_create(user=request.user, author=author)
     return redirect(
         'posts:profile',
         username=username
@@ -33,13 +33,15 @@ INSTALLED_APPS = [
     'about.apps.AboutConfig',
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
-    'posts',
+    'posts.apps.PostsConfig',
     'sorl.thumbnail',
     'debug_toolbar'
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'posts.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,7 +59,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.metrics.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -134,10 +136,154 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+# Кэш настраивается переменными окружения, чтобы воркеры одного узла
+# могли делить прогретый кэш. CACHE_BACKEND задаёт бэкенд для всех
+# алиасов, CACHE_<ALIAS>_BACKEND и CACHE_<ALIAS>_LOCATION — для одного:
+#   locmem — память процесса (по умолчанию, для разработки);
+#   file   — FileBasedCache в каталоге CACHE_DIR/<alias>;
+#   sqlite — core.cache_backends.SQLiteCache в CACHE_DIR/<alias>.sqlite3;
+#   любой путь к классу бэкенда Django, например
+#   django.core.cache.backends.memcached.MemcachedCache.
+CACHE_ALIASES = ('default', 'fragments', 'sessions', 'queries', 'pages')
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'sqlite': 'core.cache_backends.SQLiteCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
 }
+CACHE_DIR = os.getenv('CACHE_DIR', os.path.join(BASE_DIR, '.cache'))
+
+
+def cache_config(alias):
+    prefix = f'CACHE_{alias.upper()}_'
+    backend = os.getenv(
+        prefix + 'BACKEND', os.getenv('CACHE_BACKEND', 'locmem'))
+    default_locations = {
+        'locmem': 'yatube',
+        'file': os.path.join(CACHE_DIR, alias),
+        'sqlite': os.path.join(CACHE_DIR, f'{alias}.sqlite3'),
+    }
+    return {
+        'BACKEND': CACHE_BACKENDS.get(backend, backend),
+        'LOCATION': os.getenv(
+            prefix + 'LOCATION',
+            os.getenv('CACHE_LOCATION', default_locations.get(backend, ''))
+        ),
+        'KEY_PREFIX': alias,
+        'TIMEOUT': int(os.getenv(prefix + 'TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv(prefix + 'MAX_ENTRIES', 10000)),
+        },
+    }
+
+
+CACHES = {alias: cache_config(alias) for alias in CACHE_ALIASES}
+
+# Поколения лент (posts.generations) лежат в кэше default. В памяти
+# процесса смену поколения в другом воркере или в воркере задач здесь
+# не видно, поэтому и поколения, и кэш по ним живут недолго, как до
+# поколений; долгие сроки — только с общим для процессов бэкендом.
+SHARED_CACHE = CACHES['default']['BACKEND'] != CACHE_BACKENDS['locmem']
+LOCAL_CACHE_TIMEOUT = 20
+GENERATION_TIMEOUT = None if SHARED_CACHE else LOCAL_CACHE_TIMEOUT
+
+# Фрагменты шаблонов и результаты запросов кэшируются в своих алиасах.
+FRAGMENT_CACHE_ALIAS = 'fragments'
+QUERY_CACHE_ALIAS = 'queries'
+
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Авторы с большим числом подписчиков не раскладываются по лентам
+# при публикации: их посты подмешиваются в ленту при чтении.
+TIMELINE_FANOUT_MAX_FOLLOWERS = 1000
+TIMELINE_BATCH_SIZE = 500
+
+# Фрагменты лент сбрасываются сменой версии, а не по таймауту.
+FEED_CACHE_TIMEOUT = 60 * 60 * 24 if SHARED_CACHE else LOCAL_CACHE_TIMEOUT
+
+# Поиск: 'auto' — FTS5, если таблица posts_post_fts есть в SQLite,
+# иначе инвертированный индекс SearchTerm; 'fts5' или 'python' явно.
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'auto')
+
+# Миниатюры картинок постов: имя -> геометрия и опции sorl-thumbnail.
+# Строятся пулом потоков после сохранения поста, а не при показе ленты.
+POST_THUMBNAILS = {
+    'feed': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+# Файл без ссылок удаляется через столько секунд: дольше любого запроса,
+# который мог найти его при загрузке такой же картинки.
+IMAGE_RELEASE_DELAY = 10 * 60
+
+# Варианты картинок для srcset: ширины, форматы с качеством сжатия
+# (в порядке предпочтения, недоступные в Pillow пропускаются) и sizes.
+POST_IMAGE_WIDTHS = (320, 480, 720, 960, 1440)
+POST_IMAGE_FORMATS = {
+    'AVIF': 50,
+    'WEBP': 75,
+    'JPEG': 80,
+}
+POST_IMAGE_SIZES = '(min-width: 1200px) 1110px, 100vw'
+
+# Загрузки пишутся во временный файл потоком и ограничены по размеру;
+# картинки больше POST_IMAGE_MAX_SIDE уменьшаются в фоновом пуле.
+FILE_UPLOAD_HANDLERS = ['posts.uploads.BoundedUploadHandler']
+POST_IMAGE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+POST_IMAGE_MAX_SIDE = 4096
+
+# Целые страницы лент для анонимов: сбрасываются сменой поколений,
+# прокси может держать их ANONYMOUS_PAGE_EDGE_TTL секунд до проверки.
+ANONYMOUS_PAGE_CACHE_ALIAS = 'pages'
+ANONYMOUS_PAGE_CACHE_TIMEOUT = (
+    60 * 60 * 24 if SHARED_CACHE else LOCAL_CACHE_TIMEOUT)
+ANONYMOUS_PAGE_EDGE_TTL = int(os.getenv('ANONYMOUS_PAGE_EDGE_TTL', 60))
+
+# Пакетная запись через API: не больше BULK_WRITE_MAX_ITEMS элементов
+# за запрос, вставка bulk_create порциями по BULK_WRITE_BATCH_SIZE.
+BULK_WRITE_MAX_ITEMS = 500
+BULK_WRITE_BATCH_SIZE = 100
+
+# Метрики запросов по видам: время ответа, SQL, кэш и шаблоны. Отдаются
+# в формате Prometheus по /metrics/: с METRICS_TOKEN — по заголовку
+# Authorization: Bearer <токен>, без него — только напрямую (не через
+# прокси) адресам из METRICS_ALLOWED_IPS.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1').split(',')
+
+# Фоновая очередь core.tasks: воркер — manage.py run_tasks. В режиме
+# TASKS_EAGER (по умолчанию при DEBUG) задачи выполняются сразу.
+TASKS_EAGER = os.getenv('TASKS_EAGER', '1' if DEBUG else '0') == '1'
+TASKS_BATCH_SIZE = 100
+TASKS_MAX_ATTEMPTS = 5
+TASKS_RETRY_DELAY = 10
+TASKS_LEASE = 5 * 60
+TASKS_POLL_INTERVAL = 1
+
+# Уведомления создаются для подписчиков порциями по столько строк.
+NOTIFICATION_BATCH_SIZE = 1000
+
+# Server-Sent Events о новых постах (posts.live): общий на процесс
+# опросчик базы раз в SSE_POLL_INTERVAL секунд, пинг раз в SSE_HEARTBEAT,
+# поток закрывается через SSE_MAX_DURATION и браузер переподключается.
+# Под WSGI поток занимает воркер на SSE_MAX_DURATION секунд, поэтому
+# страницы подключаются к нему только под ASGI или с SSE_ENABLED=1.
+SSE_ENABLED = os.getenv('SSE_ENABLED', '0') == '1'
+SSE_POLL_INTERVAL = 2
+SSE_POLL_BATCH = 100
+SSE_HEARTBEAT = 15
+SSE_MAX_DURATION = 5 * 60
+SSE_RETRY = 3000
+SSE_HISTORY = 1000
+SSE_QUEUE_SIZE = 100
+
+# yatube/asgi.py: Django выполняется в пуле из ASGI_THREADS потоков,
+# потоковые ответы читаются в пуле ASGI_STREAM_THREADS. Async-виды
+# ждут работу с базой из пула ASYNC_THREADS (0 — выполнять на месте).
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', 16))
+ASGI_STREAM_THREADS = int(os.getenv('ASGI_STREAM_THREADS', 200))
+ASYNC_THREADS = int(os.getenv('ASYNC_THREADS', 8))